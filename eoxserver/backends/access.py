@@ -27,9 +27,10 @@
 #-------------------------------------------------------------------------------
 
 
-from os import makedirs, path
+import os
 import hashlib
 import logging
+import threading
 
 from eoxserver.backends.cache import get_cache_context
 from eoxserver.backends.component import BackendComponent, env
@@ -37,6 +38,28 @@ from eoxserver.backends.component import BackendComponent, env
 
 logger = logging.getLogger(__name__)
 
+
+# counters for the retrievals performed and the ones coalesced with a
+# concurrent retrieval of the same item
+_statistics = {"retrieved": 0, "coalesced": 0}
+_statistics_lock = threading.Lock()
+
+
+def _count(key):
+    with _statistics_lock:
+        _statistics[key] += 1
+
+
+def get_retrieval_statistics():
+    """ Returns a dictionary with the number of items that were actually
+        "retrieved" and the number of retrievals that were "coalesced", i.e:
+        that waited for a concurrent retrieval of the same item instead of
+        performing their own.
+    """
+    with _statistics_lock:
+        return dict(_statistics)
+
+
 def generate_hash(location, format, hash_impl="sha1"):
     h = hashlib.new(hash_impl)
     if format is not None:
@@ -53,14 +76,38 @@ def connect(data_item, cache=None):
     backend = BackendComponent(env)
 
     storage = data_item.storage
+    connection = None
 
     if storage:
-        component = backend.get_connected_storage_component(storage.storage_type)
-
-    if not storage or not component:
+        component = backend.get_connected_storage_component(
+            storage.storage_type
+        )
+        if component:
+            connection = component.connect(storage.url, data_item.location)
+
+    elif data_item.package:
+        connection = _connect_to_package(
+            backend, data_item, data_item.package, cache
+        )
+
+    if connection is None:
         return retrieve(data_item, cache)
 
-    return component.connect(storage.url, data_item.location)
+    return connection
+
+
+def _connect_to_package(backend, data_item, package, cache):
+    """ Helper function to get a connection string to a file within a package
+        without extracting it. Returns `None` if the package component does
+        not support this.
+    """
+    component = backend.get_package_component(package.format)
+    if not component or not hasattr(component, "connect"):
+        return None
+
+    # the package itself may be connected to as well, e.g: a ZIP file on an
+    # HTTP server
+    return component.connect(connect(package, cache), data_item.location)
 
 
 
@@ -83,20 +130,31 @@ def retrieve(data_item, cache=None):
         if item_id in cache:
             logger.debug("Item %s is already in the cache." % item_id)
             return path
-        
+
         if data_item.package is None and data_item.storage:
-            return _retrieve_from_storage(
-                backend, data_item, data_item.storage, item_id, path, cache
-            )
+            populate = _retrieve_from_storage
+            source = data_item.storage
 
         elif data_item.package:
-            return _extract_from_package(
-                backend, data_item, data_item.package, item_id, path, cache
-            )
+            populate = _extract_from_package
+            source = data_item.package
 
         else:
             return data_item.location
 
+        # only one caller retrieves the item, concurrent callers wait for it
+        # and use the result
+        with cache.lock(item_id):
+            if item_id in cache:
+                logger.debug(
+                    "Item %s was retrieved concurrently." % item_id
+                )
+                _count("coalesced")
+                return path
+
+            _count("retrieved")
+            return populate(backend, data_item, source, item_id, path, cache)
+
 
 
 def _retrieve_from_storage(backend, data_item, storage, item_id, path, cache):
@@ -108,15 +166,13 @@ def _retrieve_from_storage(backend, data_item, storage, item_id, path, cache):
         storage.storage_type
     )
 
-    actual_path = component.retrieve(
-        storage.url, data_item.location, path
+    return _populate(
+        cache, item_id,
+        lambda temporary_path: component.retrieve(
+            storage.url, data_item.location, temporary_path
+        )
     )
 
-    if actual_path and actual_path != path:
-        cache.add_mapping(actual_path, item_id)
-
-    return actual_path or path
-
 
 def _extract_from_package(backend, data_item, package, item_id, path, cache):
     """ Helper function to extract a file from a package.
@@ -134,14 +190,34 @@ def _extract_from_package(backend, data_item, package, item_id, path, cache):
         % (package_location, data_item.location, path)
     )
 
-    actual_path = component.extract(
-        package_location, data_item.location, path
+    return _populate(
+        cache, item_id,
+        lambda temporary_path: component.extract(
+            package_location, data_item.location, temporary_path
+        )
     )
 
-    if actual_path and actual_path != path:
-        cache.add_mapping(actual_path, item_id)
 
-    return actual_path or path
+def _populate(cache, item_id, write):
+    """ Helper function to populate the cache with an item. The `write`
+        callable shall store the item under the passed temporary path, which is
+        then atomically renamed to the final location in the cache. Components
+        that return a path to an already existing file instead are only
+        registered as a mapping.
+    """
+    temporary_path = cache.temporary_path(item_id)
+    try:
+        actual_path = write(temporary_path)
+
+        if actual_path and actual_path != temporary_path:
+            cache.add_mapping(actual_path, item_id)
+            return actual_path
+
+        return cache.commit(item_id, temporary_path)
+
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
 
 
 def open(data_item, cache_context=None):
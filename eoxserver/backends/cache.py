@@ -11,8 +11,8 @@
 # Permission is hereby granted, free of charge, to any person obtaining a copy
 # of this software and associated documentation files (the "Software"), to deal
 # in the Software without restriction, including without limitation the rights
-# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
-# copies of the Software, and to permit persons to whom the Software is 
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
 # furnished to do so, subject to the following conditions:
 #
 # The above copyright notice and this permission notice shall be included in all
@@ -34,8 +34,12 @@ import tempfile
 import errno
 import logging
 import threading
+import sqlite3
+import time
+import fcntl
+from contextlib import contextmanager
+from uuid import uuid4
 
-from eoxserver.core.config import get_eoxserver_config
 from eoxserver.backends.config import CacheConfigReader
 
 
@@ -45,25 +49,36 @@ logger = logging.getLogger(__name__)
 # global instance of the cache context
 cache_context_storage = threading.local()
 
+# fraction of the maximum size a cache is reduced to when it exceeds its
+# budget, so that not every subsequent commit requires an eviction
+EVICTION_TARGET = 0.9
+
+# in-process locks for cached items, shared by all cache contexts
+_item_locks = {}
+_item_locks_lock = threading.Lock()
+
 
 class CacheException(Exception):
     pass
 
 
 def setup_cache_session(config=None):
-    """ Initialize the cache context for this session. If a cache context was 
+    """ Initialize the cache context for this session. If a cache context was
         already present, an exception is raised.
     """
     if not config:
-        config = CacheConfigReader(get_eoxserver_config())
+        config = CacheConfigReader.from_config()
 
     set_cache_context(
-        CacheContext(config.retention_time, config.directory, True)
+        CacheContext(
+            config.retention_time, config.directory, True,
+            config.persistent, config.max_size, config.eviction
+        )
     )
 
 
 def shutdown_cache_session():
-    """ Shutdown the cache context for this session and trigger any pending 
+    """ Shutdown the cache context for this session and trigger any pending
         cleanup actions required.
     """
     try:
@@ -76,7 +91,7 @@ def shutdown_cache_session():
 
 
 def set_cache_context(cache_context):
-    """ Sets the cache context for this session. Raises an exception if there 
+    """ Sets the cache context for this session. Raises an exception if there
         was already a cache context associated.
     """
     if cache_context is not None:
@@ -100,10 +115,271 @@ def get_cache_context():
     return cache_context
 
 
+class CacheIndex(object):
+    """ On-disk index of a persistent cache directory. The index is stored as
+        an SQLite database within the cache directory and can thus be shared
+        between multiple threads and processes. Each entry is keyed by the
+        cache path of the item (usually the hash generated from its location
+        and format) and keeps track of its size, last access time and number
+        of hits, which are used for LRU or LFU eviction. The total size of all
+        entries is maintained incrementally, so that the budget can be checked
+        without scanning the index.
+
+        Accesses are collected in memory and written to the index with
+        :meth:`flush`. Use :func:`get_cache_index` to get the shared index of
+        a directory instead of creating new instances.
+    """
+
+    INDEX_FILENAME = ".eoxs_cache_index.sqlite"
+
+    def __init__(self, cache_directory, max_size=None, eviction="LRU",
+                 retention_time=None):
+        eviction = (eviction or "LRU").upper()
+        if eviction not in ("LRU", "LFU"):
+            raise CacheException(
+                "Invalid cache eviction strategy '%s'." % eviction
+            )
+
+        self._cache_directory = cache_directory
+        self._index_path = path.join(cache_directory, self.INDEX_FILENAME)
+        self._max_size = max_size
+        self._eviction = eviction
+        self._retention_time = retention_time
+        self._last_expiry = time.time()
+
+        self._accesses = {}
+        self._accesses_lock = threading.Lock()
+
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "  cache_path TEXT PRIMARY KEY,"
+                "  size INTEGER NOT NULL,"
+                "  last_access REAL NOT NULL,"
+                "  hits INTEGER NOT NULL"
+                ")"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS total ("
+                "  id INTEGER PRIMARY KEY CHECK (id = 0),"
+                "  size INTEGER NOT NULL"
+                ")"
+            )
+            connection.execute(
+                "INSERT OR IGNORE INTO total (id, size) "
+                "SELECT 0, COALESCE(SUM(size), 0) FROM entries"
+            )
+
+
+    def _connect(self):
+        try:
+            os.makedirs(self._cache_directory)
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        return sqlite3.connect(self._index_path, timeout=30)
+
+
+    def _remove_entry(self, connection, cache_path):
+        row = connection.execute(
+            "SELECT size FROM entries WHERE cache_path = ?", (cache_path,)
+        ).fetchone()
+        if row:
+            connection.execute(
+                "DELETE FROM entries WHERE cache_path = ?", (cache_path,)
+            )
+            connection.execute(
+                "UPDATE total SET size = size - ?", (row[0],)
+            )
+
+
+    def add(self, cache_path, size):
+        """ Add an entry to the index or update an existing one. Returns the
+            new total size of all entries.
+        """
+        with self._connect() as connection:
+            self._remove_entry(connection, cache_path)
+            connection.execute(
+                "INSERT INTO entries "
+                "(cache_path, size, last_access, hits) VALUES (?, ?, ?, 1)",
+                (cache_path, size, time.time())
+            )
+            connection.execute("UPDATE total SET size = size + ?", (size,))
+            return connection.execute(
+                "SELECT size FROM total"
+            ).fetchone()[0]
+
+
+    def touch(self, cache_path):
+        """ Mark an entry as accessed. The access is only recorded in memory
+            until the next :meth:`flush`.
+        """
+        with self._accesses_lock:
+            hits = self._accesses.get(cache_path, (0, 0))[1]
+            self._accesses[cache_path] = (time.time(), hits + 1)
+
+
+    def flush(self):
+        """ Write the recorded accesses to the index.
+        """
+        with self._accesses_lock:
+            accesses = self._accesses
+            self._accesses = {}
+
+        if not accesses:
+            return
+
+        with self._connect() as connection:
+            connection.executemany(
+                "UPDATE entries SET last_access = ?, hits = hits + ? "
+                "WHERE cache_path = ?", [
+                    (last_access, hits, cache_path)
+                    for cache_path, (last_access, hits) in accesses.items()
+                ]
+            )
+
+
+    def remove(self, cache_path):
+        """ Remove an entry from the index. The file itself is not deleted.
+        """
+        with self._connect() as connection:
+            self._remove_entry(connection, cache_path)
+
+
+    @property
+    def total_size(self):
+        """ Returns the accumulated size of all indexed entries in bytes.
+        """
+        with self._connect() as connection:
+            return connection.execute(
+                "SELECT size FROM total"
+            ).fetchone()[0]
+
+
+    def requires_eviction(self, total_size):
+        """ Checks whether the given total size exceeds the budget or expired
+            entries are due to be removed.
+        """
+        if self._max_size is not None and total_size > self._max_size:
+            return True
+
+        return (
+            self._retention_time is not None
+            and time.time() - self._last_expiry > self._retention_time
+        )
+
+
+    def evict(self, keep=()):
+        """ Delete expired entries and, if the cache exceeds its size budget,
+            the least recently (LRU) or least frequently (LFU) used entries
+            until the budget is met. Entries listed in `keep` are never
+            evicted. Returns the list of evicted cache paths.
+        """
+        self.flush()
+
+        keep = set(keep)
+        evicted = []
+
+        if self._eviction == "LFU":
+            order = "hits ASC, last_access ASC"
+        else:
+            order = "last_access ASC"
+
+        now = time.time()
+        self._last_expiry = now
+
+        with self._connect() as connection:
+            total_size = connection.execute(
+                "SELECT size FROM total"
+            ).fetchone()[0]
+            target_size = self._max_size
+            if target_size is not None and total_size > target_size:
+                target_size = int(target_size * EVICTION_TARGET)
+            entries = connection.execute(
+                "SELECT cache_path, size, last_access FROM entries "
+                "ORDER BY %s" % order
+            )
+
+            for cache_path, size, last_access in entries.fetchall():
+                if cache_path in keep:
+                    continue
+
+                expired = (
+                    self._retention_time is not None
+                    and now - last_access > self._retention_time
+                )
+                exceeded = (
+                    target_size is not None and total_size > target_size
+                )
+
+                if not expired and not exceeded:
+                    if self._retention_time is None:
+                        break
+                    continue
+
+                relative_path = path.join(self._cache_directory, cache_path)
+                try:
+                    os.remove(relative_path)
+                except OSError, e:
+                    if e.errno != errno.ENOENT:
+                        logger.warn(
+                            "Could not evict cached item '%s': %s"
+                            % (cache_path, e)
+                        )
+                        continue
+
+                _remove_lock_file(relative_path)
+                self._remove_entry(connection, cache_path)
+                total_size -= size
+                evicted.append(cache_path)
+
+        if evicted:
+            logger.debug("Evicted %d items from the cache." % len(evicted))
+
+        return evicted
+
+
+# shared cache indices of this process
+_indices = {}
+_indices_lock = threading.Lock()
+
+
+def get_cache_index(cache_directory, max_size=None, eviction="LRU",
+                    retention_time=None):
+    """ Returns the :class:`CacheIndex` of the cache directory with the given
+        settings. The index is created only once per process.
+    """
+    key = (cache_directory, max_size, eviction, retention_time)
+    with _indices_lock:
+        index = _indices.get(key)
+        if index is None:
+            index = CacheIndex(
+                cache_directory, max_size, eviction, retention_time
+            )
+            _indices[key] = index
+        return index
+
+
+def _remove_lock_file(relative_path):
+    try:
+        os.remove(relative_path + ".lock")
+    except OSError, e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
 class CacheContext(object):
     """ Context manager to manage cached files.
+
+        When `persistent` is set (and a `cache_directory` is given) the cached
+        files are kept across contexts, requests and processes. They are
+        tracked in a :class:`CacheIndex` and evicted when the `max_size` budget
+        in bytes is exceeded, using the configured `eviction` strategy ("LRU"
+        or "LFU"), or when they were not used for `retention_time` seconds.
     """
-    def __init__(self, retention_time=None, cache_directory=None, managed=False):
+    def __init__(self, retention_time=None, cache_directory=None, managed=False,
+                 persistent=False, max_size=None, eviction="LRU"):
         self._cached_objects = set()
 
         if not cache_directory:
@@ -119,6 +395,13 @@ class CacheContext(object):
 
         self._managed = managed
 
+        if persistent and not self._temporary_dir:
+            self._index = get_cache_index(
+                cache_directory, max_size, eviction, retention_time
+            )
+        else:
+            self._index = None
+
 
     @property
     def cache_directory(self):
@@ -127,6 +410,13 @@ class CacheContext(object):
         return self._cache_directory
 
 
+    @property
+    def persistent(self):
+        """ Returns whether or not cached files are kept across contexts.
+        """
+        return self._index is not None
+
+
     def relative_path(self, cache_path):
         """ Returns a path relative to the cache directory.
         """
@@ -142,12 +432,16 @@ class CacheContext(object):
 
 
     def add_path(self, cache_path):
-        """ Add a path to this cache context. Also creates necessary 
+        """ Add a path to this cache context. Also creates necessary
             sub-directories.
         """
         self._cached_objects.add(cache_path)
         relative_path = self.relative_path(cache_path)
+        self._makedirs(relative_path)
+        return relative_path
+
 
+    def _makedirs(self, relative_path):
         try:
             # create all necessary subdirectories
             os.makedirs(path.dirname(relative_path))
@@ -156,19 +450,102 @@ class CacheContext(object):
             if e.errno != errno.EEXIST:
                 raise
 
+
+    @contextmanager
+    def lock(self, cache_path):
+        """ Context manager to exclusively lock the given cache path, so that
+            only one thread or process populates it at a time. Within a process
+            the lock is shared by all cache contexts, other processes using
+            the same cache directory are synchronized via a lock file.
+        """
+        lock_path = self.relative_path(cache_path) + ".lock"
+
+        with _item_locks_lock:
+            entry = _item_locks.setdefault(lock_path, [threading.Lock(), 0])
+            entry[1] += 1
+
+        try:
+            with entry[0]:
+                self._makedirs(lock_path)
+                while True:
+                    lock_file = open(lock_path, "a")
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    # the lock file may have been removed along with its item
+                    # meanwhile, then the lock has to be acquired again
+                    try:
+                        if (os.fstat(lock_file.fileno()).st_ino
+                                == os.stat(lock_path).st_ino):
+                            break
+                    except OSError, e:
+                        if e.errno != errno.ENOENT:
+                            raise
+                    lock_file.close()
+
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    lock_file.close()
+        finally:
+            with _item_locks_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del _item_locks[lock_path]
+
+
+    def temporary_path(self, cache_path):
+        """ Returns a unique path next to the final location of `cache_path`.
+            Files shall be written to this path first and then be moved to
+            their final location using :meth:`commit`, so that other processes
+            never see partially written files.
+        """
+        relative_path = self.relative_path(cache_path)
+        self._makedirs(relative_path)
+        return "%s.%d.%s.tmp" % (relative_path, os.getpid(), uuid4().hex)
+
+
+    def commit(self, cache_path, temporary_path):
+        """ Atomically move a file written to a path obtained by
+            :meth:`temporary_path` to its final location and register it in
+            this context and the cache index. Evicts items from a persistent
+            cache if its budget is exceeded.
+        """
+        relative_path = self.relative_path(cache_path)
+        os.rename(temporary_path, relative_path)
+        self._cached_objects.add(cache_path)
+
+        if self._index is not None:
+            total_size = self._index.add(
+                cache_path, path.getsize(relative_path)
+            )
+            if self._index.requires_eviction(total_size):
+                # keep the items used within this context
+                self._index.evict(keep=self._cached_objects)
+
         return relative_path
 
 
     def cleanup(self):
         """ Perform cache cleanup.
         """
-        if self._retention_time and not self._temporary_dir:
+        if self._index is not None:
+            # items are only evicted when committing exceeds the budget
+            self._index.flush()
+            self._cached_objects.clear()
+
+        elif self._retention_time and not self._temporary_dir:
             # no cleanup required
             return
 
         elif not self._temporary_dir:
-            for path in self._cached_objects:
-                os.remove(path)
+            for cache_path in self._cached_objects:
+                relative_path = self.relative_path(cache_path)
+                try:
+                    os.remove(relative_path)
+                except OSError, e:
+                    if e.errno != errno.ENOENT:
+                        raise
+                _remove_lock_file(relative_path)
             self._cached_objects.clear()
 
         else:
@@ -179,6 +556,13 @@ class CacheContext(object):
     def contains(self, cache_path):
         """ Check whether or not the path is contained in this cache.
         """
+        if self._index is not None:
+            if path.exists(self.relative_path(cache_path)):
+                self._index.touch(cache_path)
+                self._cached_objects.add(cache_path)
+                return True
+            return False
+
         if cache_path in self._cached_objects:
             return True
 
@@ -189,7 +573,7 @@ class CacheContext(object):
         """
         return self.contains(cache_path)
 
-    
+
     def __enter__(self):
         """ Context manager protocol, for recursive use. Each time the a context
             is entered, the internal level is raised by one.
@@ -199,7 +583,7 @@ class CacheContext(object):
 
 
     def __exit__(self, etype=None, evalue=None, tb=None):
-        """ Exit of context manager protocol. Performs cache cleanup if 
+        """ Exit of context manager protocol. Performs cache cleanup if
             the level drops to zero.
         """
         self._level -= 1
@@ -74,7 +74,8 @@ class BackendComponent(Component):
         file_storage = self.get_file_storage_component(storage_type)
         connected_storage = self.get_connected_storage_component(storage_type)
 
-        if file_storage is not None and connected_storage is not None:
+        if (file_storage is not None and connected_storage is not None
+                and file_storage is not connected_storage):
             raise Exception("Ambigouus storage component")
 
         return file_storage or connected_storage
@@ -31,5 +31,22 @@ from eoxserver.core.decoders import config
 
 class CacheConfigReader(config.Reader):
     config.section("backends")
-    retention_time = config.Option() # TODO
+    retention_time = config.Option(type=int)
     directory = config.Option()
+    persistent = config.Option(type=bool, default=False)
+    max_size = config.Option(type=int)
+    eviction = config.Option(default="LRU")
+
+
+class ConnectionPoolConfigReader(config.Reader):
+    config.section("backends")
+    connection_idle_timeout = config.Option(type=int, default=60)
+    connection_pool_size = config.Option(type=int, default=4)
+
+
+class VSIConfigReader(config.Reader):
+    config.section("backends")
+    http_streaming = config.Option(type=bool, default=False)
+    vsi_cache = config.Option(type=bool, default=True)
+    vsi_cache_size = config.Option(type=int, default=25 * 1024 * 1024)
+    vsicurl_cache_size = config.Option(type=int)
@@ -63,7 +63,9 @@ class ConnectedStorageInterface(AbstractStorageInterface):
     
     def connect(self, url, location):
         """ Return a connection string for a remote dataset residing on a 
-            storage specified by the given `url` and `location`.
+            storage specified by the given `url` and `location`. Storages that
+            also implement the `FileStorageInterface` may return `None` to
+            indicate that the file shall be retrieved instead.
         """
 
 
@@ -79,6 +81,13 @@ class PackageInterface(object):
             given `path` specification.
         """
 
+    def connect(self, package_filename, location):
+        """ Optional: Return a connection string (e.g: a GDAL virtual file
+            system path) to access the file specified by the `location`
+            within the package without extracting it, or `None` if it must be
+            extracted.
+        """
+
     def list_contents(self, package_filename, location):
         """ Return a list of item locations under the specified location in the 
             given package.
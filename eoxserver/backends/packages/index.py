@@ -0,0 +1,80 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+
+
+"""\
+This module provides a process wide cache for the member indices of package
+files, so that the directory of a package does not need to be read each time
+a member is accessed.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class MemberIndexCache(object):
+    """ LRU cache of package member indices. The `read_index` callable is
+        passed the filename of the package and shall return a dictionary
+        mapping the member names to any information required to access them.
+        Indices are keyed by the filename, modification time and size of the
+        package, so that a changed package is automatically re-indexed.
+    """
+
+    def __init__(self, read_index, max_entries=64):
+        self._read_index = read_index
+        self._max_entries = max_entries
+        self._indices = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, package_filename):
+        """ Returns the member index of the given package file.
+        """
+        stat = os.stat(package_filename)
+        key = (os.path.abspath(package_filename), stat.st_mtime, stat.st_size)
+
+        with self._lock:
+            index = self._indices.pop(key, None)
+            if index is not None:
+                self._indices[key] = index
+                return index
+
+        index = self._read_index(package_filename)
+
+        with self._lock:
+            self._indices[key] = index
+            while len(self._indices) > self._max_entries:
+                self._indices.popitem(last=False)
+
+        return index
+
+
+    def clear(self):
+        with self._lock:
+            self._indices.clear()
@@ -27,9 +27,29 @@
 #-------------------------------------------------------------------------------
 
 
-from tarfile import TarFile
+import shutil
+import tarfile
+
 from eoxserver.core import Component, implements
 from eoxserver.backends.interfaces import PackageInterface
+from eoxserver.backends.packages.index import MemberIndexCache
+from eoxserver.backends.vsi import vsi_path, is_vsi_path
+
+
+def _read_index(package_filename):
+    with tarfile.open(package_filename, "r") as archive:
+        return dict(
+            (member.name, member) for member in archive.getmembers()
+        )
+
+
+_index_cache = MemberIndexCache(_read_index)
+
+
+def _is_compressed(package_filename):
+    with open(package_filename, "rb") as f:
+        magic = f.read(3)
+    return magic[:2] == "\x1f\x8b" or magic == "BZh"
 
 
 class TARPackage(Component):
@@ -39,10 +59,62 @@ class TARPackage(Component):
     name = "TAR"
 
     def extract(self, package_filename, location, path):
-        tarfile = TarFile(package_filename, "r")
-        tarfile.extract(location, path)
+        member = self._get_member(package_filename, location)
+
+        if _is_compressed(package_filename):
+            with tarfile.open(package_filename, "r") as archive:
+                infile = archive.extractfile(member)
+                with open(path, "wb") as outfile:
+                    shutil.copyfileobj(infile, outfile)
+            return
+
+        # read the member directly from its indexed offset, without
+        # scanning the archive
+        with open(package_filename, "rb") as infile, \
+                open(path, "wb") as outfile:
+            infile.seek(member.offset_data)
+            remaining = member.size
+            while remaining > 0:
+                chunk = infile.read(min(remaining, 64 * 1024))
+                if not chunk:
+                    raise IOError(
+                        "Unexpected end of TAR file '%s'." % package_filename
+                    )
+                remaining -= len(chunk)
+                outfile.write(chunk)
+
+
+    def connect(self, package_filename, location):
+        """ Returns a /vsitar/ path to access the file within the package
+            without extracting it.
+        """
+        if not is_vsi_path(package_filename):
+            self._get_member(package_filename, location)
+        return vsi_path("vsitar", package_filename, location)
 
     
     def list_files(self, package_filename):
-        tarfile = TarFile(package_filename, "r")
-        # TODO: get list
+        """ Returns the names of all members of the package.
+        """
+        return sorted(_index_cache.get(package_filename).keys())
+
+
+    def list_contents(self, package_filename, location):
+        """ Returns the names of all members of the package under the given
+            location.
+        """
+        prefix = location.rstrip("/") + "/" if location else ""
+        return [
+            name for name in self.list_files(package_filename)
+            if name.startswith(prefix)
+        ]
+
+
+    def _get_member(self, package_filename, location):
+        member = _index_cache.get(package_filename).get(location)
+        if member is None or not member.isfile():
+            raise IOError(
+                "No file member '%s' in TAR file '%s'."
+                % (location, package_filename)
+            )
+        return member
@@ -28,10 +28,26 @@
 
 
 import shutil
-from zipfile import ZipFile
+import struct
+import zlib
+from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED
 
 from eoxserver.core import Component, implements
 from eoxserver.backends.interfaces import PackageInterface
+from eoxserver.backends.packages.index import MemberIndexCache
+from eoxserver.backends.vsi import vsi_path, is_vsi_path
+
+
+# structure of the local file header of a member, see the ZIP specification
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+
+
+def _read_index(package_filename):
+    with ZipFile(package_filename, "r") as zipfile:
+        return dict((info.filename, info) for info in zipfile.infolist())
+
+
+_index_cache = MemberIndexCache(_read_index)
 
 
 class ZIPPackage(Component):
@@ -43,12 +59,88 @@ class ZIPPackage(Component):
     name = "ZIP"
 
     def extract(self, package_filename, location, path):
-        zipfile = ZipFile(package_filename, "r")
-        infile = zipfile.open(location)
-        with open(path, "wb") as outfile:
-            shutil.copyfileobj(infile, outfile)
+        info = self._get_info(package_filename, location)
+
+        if info.flag_bits & 0x1 or info.compress_type not in (
+                ZIP_STORED, ZIP_DEFLATED):
+            # encrypted or otherwise unsupported members are extracted
+            # using the zipfile module
+            zipfile = ZipFile(package_filename, "r")
+            infile = zipfile.open(location)
+            with open(path, "wb") as outfile:
+                shutil.copyfileobj(infile, outfile)
+            return
+
+        # read the member directly from its indexed offset, without
+        # re-reading the central directory
+        with open(package_filename, "rb") as infile, \
+                open(path, "wb") as outfile:
+            infile.seek(info.header_offset)
+            header = _LOCAL_HEADER.unpack(infile.read(_LOCAL_HEADER.size))
+            infile.seek(header[-2] + header[-1], 1)
+
+            if info.compress_type == ZIP_DEFLATED:
+                decompressor = zlib.decompressobj(-15)
+            else:
+                decompressor = None
+
+            crc = 0
+            remaining = info.compress_size
+            while remaining > 0:
+                chunk = infile.read(min(remaining, 64 * 1024))
+                if not chunk:
+                    raise IOError(
+                        "Unexpected end of ZIP file '%s'." % package_filename
+                    )
+                remaining -= len(chunk)
+                if decompressor:
+                    chunk = decompressor.decompress(chunk)
+                crc = zlib.crc32(chunk, crc)
+                outfile.write(chunk)
+
+            if decompressor:
+                chunk = decompressor.flush()
+                crc = zlib.crc32(chunk, crc)
+                outfile.write(chunk)
+
+            if crc & 0xffffffff != info.CRC:
+                raise IOError(
+                    "Bad CRC-32 for member '%s' in ZIP file '%s'."
+                    % (location, package_filename)
+                )
+
+
+    def connect(self, package_filename, location):
+        """ Returns a /vsizip/ path to access the file within the package
+            without extracting it.
+        """
+        if not is_vsi_path(package_filename):
+            self._get_info(package_filename, location)
+        return vsi_path("vsizip", package_filename, location)
+
 
-    
     def list_files(self, package_filename):
-        zipfile = ZipFile(package_filename, "r")
-        # TODO: get list
+        """ Returns the names of all members of the package.
+        """
+        return sorted(_index_cache.get(package_filename).keys())
+
+
+    def list_contents(self, package_filename, location):
+        """ Returns the names of all members of the package under the given
+            location.
+        """
+        prefix = location.rstrip("/") + "/" if location else ""
+        return [
+            name for name in self.list_files(package_filename)
+            if name.startswith(prefix)
+        ]
+
+
+    def _get_info(self, package_filename, location):
+        try:
+            return _index_cache.get(package_filename)[location]
+        except KeyError:
+            raise IOError(
+                "No member '%s' in ZIP file '%s'."
+                % (location, package_filename)
+            )
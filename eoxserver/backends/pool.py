@@ -0,0 +1,151 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+
+
+"""\
+This module provides a generic pool for persistent connections to remote
+storages, keyed by the host, port and user of the connection.
+"""
+
+import threading
+import logging
+from time import time
+from contextlib import contextmanager
+
+from eoxserver.backends.config import ConnectionPoolConfigReader
+
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool(object):
+    """ A thread safe pool of reusable connections.
+
+        New connections are created with the `connect` callable that is passed
+        the arguments given to :meth:`connection`. Idle connections are kept
+        for at most `idle_timeout` seconds and up to `max_idle` connections
+        per key. Before an idle connection is reused, it is verified by the
+        optional `check` callable, which shall return `False` or raise an
+        exception for broken connections. Connections are terminated using the
+        `close` callable.
+    """
+
+    def __init__(self, connect, close, check=None, idle_timeout=60,
+                 max_idle=4):
+        self._connect = connect
+        self._close = close
+        self._check = check
+        self._idle_timeout = idle_timeout
+        self._max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+
+    @contextmanager
+    def connection(self, key, *args):
+        """ Context manager to acquire a connection for the given key. The
+            connection is returned to the pool when the block exits normally
+            and discarded when an exception is raised.
+        """
+        connection = self._acquire(key, args)
+        try:
+            yield connection
+        except:
+            self._discard(connection)
+            raise
+        else:
+            self._release(key, connection)
+
+
+    def clear(self):
+        """ Close all idle connections.
+        """
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+
+        for connections in idle.values():
+            for connection, _ in connections:
+                self._discard(connection)
+
+
+    def _acquire(self, key, args):
+        while True:
+            with self._lock:
+                connections = self._idle.get(key)
+                if not connections:
+                    break
+                connection, last_used = connections.pop()
+
+            if time() - last_used > self._idle_timeout:
+                self._discard(connection)
+            elif self._is_healthy(connection):
+                logger.debug("Reusing connection for %s." % (key,))
+                return connection
+            else:
+                self._discard(connection)
+
+        logger.debug("Opening new connection for %s." % (key,))
+        return self._connect(*args)
+
+
+    def _release(self, key, connection):
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < self._max_idle:
+                connections.append((connection, time()))
+                return
+
+        self._discard(connection)
+
+
+    def _is_healthy(self, connection):
+        if self._check is None:
+            return True
+        try:
+            return self._check(connection) is not False
+        except Exception:
+            return False
+
+
+    def _discard(self, connection):
+        try:
+            self._close(connection)
+        except Exception, e:
+            logger.debug("Error when closing connection: %s" % e)
+
+
+def create_connection_pool(connect, close, check=None):
+    """ Create a :class:`ConnectionPool` configured by the options of the
+        ``backends`` section.
+    """
+    reader = ConnectionPoolConfigReader.from_config()
+    return ConnectionPool(
+        connect, close, check,
+        reader.connection_idle_timeout, reader.connection_pool_size
+    )
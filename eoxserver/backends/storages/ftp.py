@@ -28,6 +28,8 @@
 
 
 from os import path
+import threading
+import ftplib
 from ftplib import FTP
 from urlparse import urlparse
 
@@ -35,6 +37,7 @@ from django.core.exceptions import ValidationError
 
 from eoxserver.core import Component, implements
 from eoxserver.backends.interfaces import FileStorageInterface
+from eoxserver.backends.pool import create_connection_pool
 
 
 class FTPStorage(Component):
@@ -42,6 +45,9 @@ class FTPStorage(Component):
 
     name = "FTP"
 
+    _pool = None
+    _pool_lock = threading.Lock()
+
     def validate(self, url):
         parsed = urlparse(url)
         if not parsed.hostname:
@@ -58,36 +64,60 @@ class FTPStorage(Component):
             specified by its `url` and stores it under the `result_path`.
         """
         
-        ftp, parsed_url = self._open(url)
+        parsed_url = urlparse(url)
 
-        try:
+        with self._open(parsed_url) as ftp:
             cmd = "RETR %s" % path.join(parsed_url.path, location)
             with open(result_path, 'wb') as local_file:
                 ftp.retrbinary(cmd, local_file.write)
 
-        finally:
-            ftp.quit()
-
 
     def list_files(self, url, location):
-        ftp, parsed_url = self._open(url)
-
-        try:
-            return ftp.nlst(location)
-        except ftplib.error_perm, resp:
-            if str(resp).startswith("550"):
-                return []
-            else:
-                raise
-        finally:
-            ftp.quit()
+        parsed_url = urlparse(url)
 
+        with self._open(parsed_url) as ftp:
+            try:
+                return ftp.nlst(location)
+            except ftplib.error_perm, resp:
+                if str(resp).startswith("550"):
+                    return []
+                else:
+                    raise
 
-    def _open(self, url):
-        parsed_url = urlparse(url)
-        ftp = FTP()
-        ftp.connect(parsed_url.hostname, parsed_url.port)
-        # TODO: default username/password?
-        ftp.login(parsed_url.username, parsed_url.password)
 
-        return ftp, parsed_url
+    def _open(self, parsed_url):
+        """ Returns a context manager for a pooled FTP connection to the host
+            of the given parsed URL.
+        """
+        with self._pool_lock:
+            if FTPStorage._pool is None:
+                FTPStorage._pool = create_connection_pool(
+                    _connect, _close, _check
+                )
+
+        key = (parsed_url.hostname, parsed_url.port, parsed_url.username)
+        return self._pool.connection(
+            key, parsed_url.hostname, parsed_url.port, parsed_url.username,
+            parsed_url.password
+        )
+
+
+def _connect(hostname, port, username, password):
+    ftp = FTP()
+    ftp.connect(hostname, port)
+    # TODO: default username/password?
+    ftp.login(username, password)
+    return ftp
+
+
+def _check(ftp):
+    if ftp.sock is None:
+        return False
+    ftp.voidcmd("NOOP")
+
+
+def _close(ftp):
+    try:
+        ftp.quit()
+    except ftplib.all_errors:
+        ftp.close()
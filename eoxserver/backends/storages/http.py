@@ -26,21 +26,133 @@
 #-------------------------------------------------------------------------------
 
 
-from urllib import urlretrieve
-from urlparse import urljoin
+import threading
+import shutil
+import socket
+import select
+from base64 import b64encode
+from httplib import HTTPConnection, HTTPSConnection, HTTPException
+from urlparse import urljoin, urlparse
 
 from eoxserver.core import Component, implements
-from eoxserver.backends.interfaces import FileStorageInterface
+from eoxserver.backends.interfaces import (
+    FileStorageInterface, ConnectedStorageInterface
+)
+from eoxserver.backends.pool import create_connection_pool
+from eoxserver.backends.vsi import get_vsi_config, vsi_path
+
+
+# maximum number of redirects followed for a single request
+MAX_REDIRECTS = 5
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
 
 
 class HTTPStorage(Component):
     implements(FileStorageInterface)
+    implements(ConnectedStorageInterface)
 
 
     name = "HTTP"
 
+    _pool = None
+    _pool_lock = threading.Lock()
+
     def validate(self, url):
         pass
 
     def retrieve(self, url, location, path):
-        urlretrieve(urljoin(url, location), path)
+        def consume(response):
+            with open(path, "wb") as local_file:
+                shutil.copyfileobj(response, local_file)
+
+        self._request(urljoin(url, location), consume)
+
+    def connect(self, url, location):
+        """ Returns a /vsicurl/ path for the file when streaming is enabled,
+            so that GDAL only reads the required byte ranges. Otherwise `None`
+            is returned and the file is retrieved as usual.
+        """
+        reader = get_vsi_config()
+        if not reader.http_streaming:
+            return None
+
+        return vsi_path("vsicurl", urljoin(url, location))
+
+    def _request(self, url, consume, retry=True, redirects=MAX_REDIRECTS):
+        """ Performs a GET request on a pooled keep-alive connection and passes
+            the response to `consume`. The response has to be read completely
+            by `consume` so that the connection can be reused. Redirects are
+            followed up to `redirects` times, any other status outside of the
+            2xx range raises an :exc:`IOError`.
+        """
+        with self._pool_lock:
+            if HTTPStorage._pool is None:
+                HTTPStorage._pool = create_connection_pool(
+                    _connect, _close, _check
+                )
+
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.hostname, parsed.port, parsed.username)
+
+        request_headers = {}
+        if parsed.username is not None:
+            request_headers["Authorization"] = "Basic %s" % b64encode(
+                "%s:%s" % (parsed.username, parsed.password or "")
+            )
+
+        selector = parsed.path or "/"
+        if parsed.query:
+            selector += "?" + parsed.query
+
+        try:
+            with self._pool.connection(
+                    key, parsed.scheme, parsed.hostname, parsed.port) as conn:
+                conn.request("GET", selector, headers=request_headers)
+                response = conn.getresponse()
+
+                if 200 <= response.status < 300:
+                    return consume(response)
+
+                response.read()
+                location = response.getheader("location")
+
+                if response.status not in REDIRECT_STATUSES or not location:
+                    raise IOError(
+                        "HTTP request to '%s' failed with status %d."
+                        % (url, response.status)
+                    )
+
+        except (HTTPException, socket.error):
+            # a reused keep-alive connection may have been closed by the server
+            # in the meantime, so try again once with a fresh connection
+            if retry:
+                return self._request(url, consume, False, redirects)
+            raise
+
+        # follow the redirect after the connection was returned to the pool
+        if redirects <= 0:
+            raise IOError("Too many redirects for HTTP request to '%s'." % url)
+
+        return self._request(
+            urljoin(url, location), consume, retry, redirects - 1
+        )
+
+
+def _connect(scheme, hostname, port):
+    if scheme == "https":
+        return HTTPSConnection(hostname, port)
+    return HTTPConnection(hostname, port)
+
+
+def _check(conn):
+    # an idle keep-alive connection must not have anything to read, otherwise
+    # the server has closed it or sent unexpected data
+    if conn.sock is None:
+        return True
+    readable, _, _ = select.select([conn.sock], [], [], 0)
+    return not readable
+
+
+def _close(conn):
+    conn.close()
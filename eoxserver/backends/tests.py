@@ -29,13 +29,22 @@
 import os.path
 from glob import glob
 import logging
+import shutil
+import tempfile
+import tarfile
+import threading
+import time
+from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED
 
 from django.test import TestCase
 
 from eoxserver.backends import testbase
 from eoxserver.backends import models
 from eoxserver.backends.cache import CacheContext
-from eoxserver.backends.access import retrieve
+from eoxserver.backends.pool import ConnectionPool
+from eoxserver.backends.packages.zip import ZIPPackage
+from eoxserver.backends.packages.tar import TARPackage
+from eoxserver.backends.access import retrieve, get_retrieval_statistics
 from eoxserver.backends.component import BackendComponent, env
 from eoxserver.backends.testbase import withFTPServer
 
@@ -126,3 +135,277 @@ class RetrieveTestCase(TestCase):
         self.assertFalse(os.path.exists(cache_path))
         self.assertFalse(os.path.exists(cache_path2))
 
+
+class SlowStorage(object):
+    """ Fake file storage that takes its time to retrieve a file and records
+        all retrievals.
+    """
+    def __init__(self):
+        self.retrieved = []
+
+    def retrieve(self, url, location, path):
+        self.retrieved.append(location)
+        time.sleep(0.2)
+        with open(path, "wb") as f:
+            f.write("data")
+
+
+class CoalescedRetrieveTestCase(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix="eoxs_test_cache")
+        self.storage = SlowStorage()
+        self._get_file_storage_component = \
+            BackendComponent.get_file_storage_component
+        BackendComponent.get_file_storage_component = \
+            lambda backend, storage_type: self.storage
+
+        storage = create(models.Storage,
+            url="http://example.org/", storage_type="SLOW"
+        )
+        self.data_item = create(models.DataItem,
+            location="file.txt", storage=storage, semantic="textfile"
+        )
+        # fetch the related storage before the item is used in other threads
+        self.data_item.storage
+
+    def tearDown(self):
+        BackendComponent.get_file_storage_component = \
+            self._get_file_storage_component
+        shutil.rmtree(self.cache_dir)
+
+    def test_coalesced_retrieval(self):
+        before = get_retrieval_statistics()
+        paths = []
+
+        def run():
+            with CacheContext(cache_directory=self.cache_dir,
+                              persistent=True) as c:
+                paths.append(retrieve(self.data_item, c))
+
+        threads = [threading.Thread(target=run) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        after = get_retrieval_statistics()
+
+        # the item was only retrieved once, all other callers waited for it
+        self.assertEqual(self.storage.retrieved, ["file.txt"])
+        self.assertEqual(len(set(paths)), 1)
+        self.assertEqual(after["retrieved"] - before["retrieved"], 1)
+        self.assertEqual(after["coalesced"] - before["coalesced"], 4)
+
+        with open(paths[0]) as f:
+            self.assertEqual(f.read(), "data")
+
+    def test_lock_files_removed(self):
+        with CacheContext(cache_directory=self.cache_dir) as c:
+            cache_path = retrieve(self.data_item, c)
+            self.assertTrue(os.path.exists(cache_path + ".lock"))
+
+        self.assertFalse(os.path.exists(cache_path))
+        self.assertFalse(os.path.exists(cache_path + ".lock"))
+
+
+class PersistentCacheTestCase(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix="eoxs_test_cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def _populate(self, cache, cache_path, size):
+        temporary_path = cache.temporary_path(cache_path)
+        with open(temporary_path, "wb") as f:
+            f.write("x" * size)
+        return cache.commit(cache_path, temporary_path)
+
+    def test_persistence(self):
+        with CacheContext(cache_directory=self.cache_dir, persistent=True) as c:
+            cache_path = self._populate(c, "a", 10)
+
+        self.assertTrue(os.path.exists(cache_path))
+
+        with CacheContext(cache_directory=self.cache_dir, persistent=True) as c:
+            self.assertTrue("a" in c)
+            self.assertFalse("b" in c)
+
+    def test_lru_eviction(self):
+        with CacheContext(cache_directory=self.cache_dir, persistent=True,
+                          max_size=25) as c:
+            path_a = self._populate(c, "a", 10)
+            path_b = self._populate(c, "b", 10)
+
+        with CacheContext(cache_directory=self.cache_dir, persistent=True,
+                          max_size=25) as c:
+            self.assertTrue("a" in c)
+            path_c = self._populate(c, "c", 10)
+
+        # "b" was the least recently used item
+        self.assertTrue(os.path.exists(path_a))
+        self.assertFalse(os.path.exists(path_b))
+        self.assertTrue(os.path.exists(path_c))
+
+    def test_size_tracking(self):
+        with CacheContext(cache_directory=self.cache_dir, persistent=True,
+                          max_size=25) as c:
+            path_a = self._populate(c, "a", 10)
+            # replacing an item must not count its previous size
+            self._populate(c, "a", 20)
+            path_b = self._populate(c, "b", 5)
+
+        # the budget was never exceeded, so nothing was evicted
+        self.assertTrue(os.path.exists(path_a))
+        self.assertTrue(os.path.exists(path_b))
+        self.assertEqual(c._index.total_size, 25)
+
+    def test_temporary_path_not_registered(self):
+        with CacheContext(cache_directory=self.cache_dir) as c:
+            c.temporary_path("a")
+            self.assertFalse("a" in c)
+
+
+class ConnectionPoolTestCase(TestCase):
+    def setUp(self):
+        self.opened = []
+        self.closed = []
+
+        def connect(name):
+            connection = "%s-%d" % (name, len(self.opened))
+            self.opened.append(connection)
+            return connection
+
+        self.pool = ConnectionPool(
+            connect, self.closed.append, lambda c: c not in self.broken
+        )
+        self.broken = set()
+
+    def test_reuse(self):
+        with self.pool.connection("a", "a") as c1:
+            pass
+        with self.pool.connection("a", "a") as c2:
+            pass
+        with self.pool.connection("b", "b") as c3:
+            pass
+
+        self.assertEqual(c1, c2)
+        self.assertNotEqual(c1, c3)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_discard_broken(self):
+        with self.pool.connection("a", "a") as c1:
+            pass
+        self.broken.add(c1)
+
+        with self.pool.connection("a", "a") as c2:
+            pass
+
+        self.assertNotEqual(c1, c2)
+        self.assertEqual(self.closed, [c1])
+
+    def test_discard_on_error(self):
+        try:
+            with self.pool.connection("a", "a") as c1:
+                raise ValueError()
+        except ValueError:
+            pass
+
+        self.assertEqual(self.closed, [c1])
+
+
+class ZIPPackageTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="eoxs_test_zip")
+        self.package = os.path.join(self.tmp_dir, "package.zip")
+        with ZipFile(self.package, "w", ZIP_DEFLATED) as zipfile:
+            zipfile.writestr("file.txt", "test\n" * 100)
+            zipfile.writestr("dir/file2.txt", "test 2\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_list_files(self):
+        component = ZIPPackage(env)
+        self.assertEqual(
+            component.list_files(self.package), ["dir/file2.txt", "file.txt"]
+        )
+        self.assertEqual(
+            component.list_contents(self.package, "dir"), ["dir/file2.txt"]
+        )
+
+    def test_extract(self):
+        component = ZIPPackage(env)
+        path = os.path.join(self.tmp_dir, "extracted")
+        component.extract(self.package, "file.txt", path)
+        with open(path) as f:
+            self.assertEqual(f.read(), "test\n" * 100)
+
+    def test_connect(self):
+        component = ZIPPackage(env)
+        self.assertEqual(
+            component.connect(self.package, "dir/file2.txt"),
+            "/vsizip/%s/dir/file2.txt" % self.package
+        )
+        self.assertRaises(
+            IOError, component.connect, self.package, "missing.txt"
+        )
+
+    def test_extract_bad_crc(self):
+        package = os.path.join(self.tmp_dir, "corrupt.zip")
+        with ZipFile(package, "w", ZIP_STORED) as zipfile:
+            zipfile.writestr("file.txt", "test\n")
+
+        with open(package, "rb") as f:
+            data = f.read()
+        with open(package, "wb") as f:
+            f.write(data.replace("test\n", "tesT\n"))
+
+        component = ZIPPackage(env)
+        self.assertRaises(
+            IOError, component.extract, package, "file.txt",
+            os.path.join(self.tmp_dir, "extracted")
+        )
+
+
+class TARPackageTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="eoxs_test_tar")
+        self.package = os.path.join(self.tmp_dir, "package.tar")
+
+        files = {"file.txt": "test\n" * 100, "dir/file2.txt": "test 2\n"}
+        with tarfile.open(self.package, "w") as archive:
+            for name, content in sorted(files.items()):
+                filename = os.path.join(self.tmp_dir, "content")
+                with open(filename, "wb") as f:
+                    f.write(content)
+                archive.add(filename, name)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_list_files(self):
+        component = TARPackage(env)
+        self.assertEqual(
+            component.list_files(self.package), ["dir/file2.txt", "file.txt"]
+        )
+        self.assertEqual(
+            component.list_contents(self.package, "dir"), ["dir/file2.txt"]
+        )
+
+    def test_extract(self):
+        component = TARPackage(env)
+        path = os.path.join(self.tmp_dir, "extracted")
+        component.extract(self.package, "file.txt", path)
+        with open(path) as f:
+            self.assertEqual(f.read(), "test\n" * 100)
+
+    def test_connect(self):
+        component = TARPackage(env)
+        self.assertEqual(
+            component.connect(self.package, "dir/file2.txt"),
+            "/vsitar/%s/dir/file2.txt" % self.package
+        )
+        self.assertRaises(
+            IOError, component.connect, self.package, "missing.txt"
+        )
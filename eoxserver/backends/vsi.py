@@ -0,0 +1,108 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+
+
+"""\
+This module provides helpers to construct GDAL virtual file system paths
+(/vsicurl/, /vsizip/, /vsitar/) for data that is accessed without retrieving
+it to the cache first.
+"""
+
+import threading
+import logging
+from os.path import abspath
+
+from eoxserver.backends.config import VSIConfigReader
+
+
+logger = logging.getLogger(__name__)
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def get_vsi_config():
+    """ Returns the :class:`VSIConfigReader` for the current configuration.
+    """
+    return VSIConfigReader.from_config()
+
+
+def configure_vsi(reader=None):
+    """ Set up the GDAL configuration options for block caching of virtual
+        file systems. The options are process wide and are thus only set once.
+    """
+    global _configured
+    if _configured:
+        return
+
+    with _configure_lock:
+        if _configured:
+            return
+
+        from eoxserver.contrib import gdal
+
+        reader = reader or get_vsi_config()
+        options = {
+            "VSI_CACHE": "TRUE" if reader.vsi_cache else "FALSE",
+            "VSI_CACHE_SIZE": str(reader.vsi_cache_size),
+            # avoid directory listings on remote servers when opening files
+            "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+        }
+        if reader.vsicurl_cache_size is not None:
+            options["CPL_VSIL_CURL_CACHE_SIZE"] = str(
+                reader.vsicurl_cache_size
+            )
+
+        for key, value in options.items():
+            # do not override options set in the environment
+            if gdal.GetConfigOption(key) is None:
+                gdal.SetConfigOption(key, value)
+
+        logger.debug("Configured GDAL VSI options: %s" % options)
+        _configured = True
+
+
+def is_vsi_path(path):
+    """ Returns whether or not the given path is a GDAL virtual file system
+        path.
+    """
+    return path.startswith("/vsi")
+
+
+def vsi_path(prefix, path, location=None):
+    """ Constructs a virtual file system path with the given `prefix` (e.g:
+        "vsizip") for the file at `path`, optionally pointing at a member
+        `location` within that file.
+    """
+    configure_vsi()
+    if not is_vsi_path(path):
+        path = abspath(path)
+    result = "/%s/%s" % (prefix, path)
+    if location:
+        result = "%s/%s" % (result, location.lstrip("/"))
+    return result
@@ -46,21 +46,53 @@ from django.conf import settings
 config_lock = threading.RLock()
 logger = logging.getLogger(__name__)
 
-# configuration singleton
+# configuration singleton. The parsed configuration is never altered, but
+# replaced as a whole when the instance configuration file changes.
 _cached_config = None
-_last_access_time = None
+_config_version = 0
+_config_mtime = None
+_next_check_time = 0
 
 
 def get_eoxserver_config():
+    """ Returns the current configuration snapshot. The modification time of
+        the instance configuration file is checked at most every
+        `EOXSERVER_CONFIG_CHECK_INTERVAL` seconds (defaults to 1). Between
+        checks, the configuration is returned without locking.
+    """
+    config = _cached_config
+    if config is not None and time() < _next_check_time:
+        return config
+
     with config_lock:
-        if not _cached_config or getmtime(get_instance_config_path()) > _last_access_time:
-            reload_eoxserver_config()
+        _check_eoxserver_config()
+        return _cached_config
+
+
+def get_eoxserver_config_version():
+    """ Returns a number that is increased each time the configuration is
+        reloaded.
+    """
+    return _config_version
 
-    return _cached_config
+
+def _check_eoxserver_config():
+    global _next_check_time
+    try:
+        mtime = getmtime(get_instance_config_path())
+    except OSError:
+        mtime = None
+
+    if not _cached_config or mtime != _config_mtime:
+        reload_eoxserver_config()
+
+    _next_check_time = time() + getattr(
+        settings, "EOXSERVER_CONFIG_CHECK_INTERVAL", 1
+    )
 
 
 def reload_eoxserver_config():
-    global _cached_config, _last_access_time
+    global _cached_config, _config_version, _config_mtime
     _, eoxs_path, _ = imp.find_module("eoxserver")
     paths = [
         join(eoxs_path, "conf", "default.conf"),
@@ -74,9 +106,17 @@ def reload_eoxserver_config():
     )
 
     with config_lock:
-        _cached_config = RawConfigParser()
-        _cached_config.read(paths)
-        _last_access_time = time()
+        try:
+            mtime = getmtime(get_instance_config_path())
+        except OSError:
+            mtime = None
+
+        # parse the new configuration completely before it is published
+        config = RawConfigParser()
+        config.read(paths)
+        _config_mtime = mtime
+        _config_version += 1
+        _cached_config = config
 
 
 def get_instance_config_path():
@@ -59,6 +59,21 @@ class Option(object):
 
 
     def __get__(self, reader, objtype=None):
+        if reader is None:
+            return self
+
+        values = reader._values
+        if values is None:
+            return self._read(reader)
+
+        try:
+            return values[self]
+        except KeyError:
+            value = values[self] = self._read(reader)
+            return value
+
+
+    def _read(self, reader):
         section = self.section or reader.section
         try:
             if self.type is bool:
@@ -97,9 +112,35 @@ class ReaderMetaclass(type):
 
 
 class Reader(object):
+    """ Base class for typed views of a configuration. Readers obtained via
+        :meth:`from_config` are shared and memoize the parsed values, as the 
+        configuration snapshots are never altered.
+    """
     __metaclass__ = ReaderMetaclass
 
     section = None
 
     def __init__(self, config):
         self._config = config
+        self._values = None
+
+
+    @classmethod
+    def from_config(cls, config=None):
+        """ Returns a memoizing reader for the given configuration, by default
+            the current EOxServer configuration. The reader is re-used as long
+            as the configuration is not reloaded.
+        """
+        if config is None:
+            # avoid circular imports
+            from eoxserver.core.config import get_eoxserver_config
+            config = get_eoxserver_config()
+
+        cached = cls.__dict__.get("_cached_reader")
+        if cached is not None and cached[0] is config:
+            return cached[1]
+
+        reader = cls(config)
+        reader._values = {}
+        cls._cached_reader = (config, reader)
+        return reader
@@ -28,6 +28,8 @@
 #-------------------------------------------------------------------------------
 
 
+from itertools import islice
+
 from django.contrib.gis.db import models
 
 
@@ -70,3 +72,48 @@ class Castable(models.Model):
 
     class Meta:
         abstract = True
+
+
+def cast_all(objects, refresh=False):
+    """ 'Cast' all models of the given iterable or queryset to their actual
+    types. Instead of one query per object, the primary keys are grouped by
+    their real type and a single query per type is performed. Returns a list
+    of the cast models in the original order.
+    """
+
+    objects = list(objects)
+    pks_by_type = {}
+
+    for obj in objects:
+        real_type = obj.real_type
+        if real_type != type(obj) or refresh:
+            pks_by_type.setdefault(real_type, set()).add(obj.pk)
+
+    cast_objects = {}
+    for real_type, pks in pks_by_type.items():
+        for obj in real_type.objects.filter(pk__in=pks):
+            cast_objects[(real_type, obj.pk)] = obj
+
+    return [
+        cast_objects.get((obj.real_type, obj.pk), obj) for obj in objects
+    ]
+
+
+def iter_cast(objects, chunk_size=1000, refresh=False):
+    """ Generator version of `cast_all`. The objects are cast in chunks of
+    `chunk_size`, so that large querysets do not need to be held in memory
+    completely.
+    """
+
+    if hasattr(objects, "iterator"):
+        # do not cache the results of querysets
+        iterator = objects.iterator()
+    else:
+        iterator = iter(objects)
+
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
+        for obj in cast_all(chunk, refresh):
+            yield obj
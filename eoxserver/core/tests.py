@@ -28,5 +28,154 @@
 #-------------------------------------------------------------------------------
 
 import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from ConfigParser import RawConfigParser
 
 from django.test import TestCase
+
+from eoxserver.core.decoders import config
+from eoxserver.core.util.cachetools import lru_cache
+from eoxserver.core.util.iteratortools import parallel_imap
+from eoxserver.core.util.timetools import merge_intervals
+
+
+class MergeIntervalsTestCase(TestCase):
+    def test_merge_intervals(self):
+        t = lambda hour: datetime(2013, 1, 1, hour)
+        intervals = [
+            (t(5), t(6)), (t(0), t(2)), (t(1), t(3)), (t(3), t(4)),
+            (t(8), t(9))
+        ]
+        self.assertEqual(
+            merge_intervals(intervals),
+            [(t(0), t(4)), (t(5), t(6)), (t(8), t(9))]
+        )
+        self.assertEqual(
+            merge_intervals(intervals, timedelta(hours=1)),
+            [(t(0), t(6)), (t(8), t(9))]
+        )
+        self.assertEqual(merge_intervals([]), [])
+
+
+class ConfigReaderTestCase(TestCase):
+    class TestReader(config.Reader):
+        section = "test"
+        number = config.Option(type=int, default=0)
+
+    def test_from_config(self):
+        parser = RawConfigParser()
+        parser.add_section("test")
+        parser.set("test", "number", "1")
+
+        reader = self.TestReader.from_config(parser)
+        self.assertTrue(reader is self.TestReader.from_config(parser))
+        self.assertEqual(reader.number, 1)
+
+        # readers of the same snapshot memoize their values
+        parser.set("test", "number", "2")
+        self.assertEqual(reader.number, 1)
+        self.assertEqual(self.TestReader(parser).number, 2)
+
+        # a new snapshot results in a new reader
+        other = RawConfigParser()
+        self.assertEqual(self.TestReader.from_config(other).number, 0)
+
+
+class LRUCacheTestCase(TestCase):
+    def test_lru_cache(self):
+        calls = []
+
+        @lru_cache(maxsize=4)
+        def double(value):
+            calls.append(value)
+            return value * 2
+
+        for value in (1, 2, 3, 4, 1, 5, 1, 2):
+            double(value)
+
+        # 2 was the least recently used value when 5 was added
+        self.assertEqual(calls, [1, 2, 3, 4, 5, 2])
+        self.assertEqual(double(1), 2)
+
+        double.cache_clear()
+        double(1)
+        self.assertEqual(calls, [1, 2, 3, 4, 5, 2, 1])
+
+
+class ParallelIMapTestCase(TestCase):
+    def test_ordering(self):
+        def delayed(value):
+            # later items finish first
+            time.sleep((10 - value) * 0.005)
+            return value * 2
+
+        self.assertEqual(
+            list(parallel_imap(delayed, range(10), workers=4)),
+            [value * 2 for value in range(10)]
+        )
+        self.assertEqual(list(parallel_imap(delayed, [], workers=4)), [])
+
+    def test_bounded(self):
+        started = []
+
+        def record(value):
+            started.append(value)
+            return value
+
+        results = parallel_imap(record, range(100), workers=2, max_pending=4)
+        self.assertEqual(next(results), 0)
+        time.sleep(0.05)
+        # only the pending items were processed
+        self.assertTrue(len(started) <= 5)
+        self.assertEqual(list(results), range(1, 100))
+
+    def test_error_propagation(self):
+        def fail(value):
+            if value == 3:
+                raise ValueError(value)
+            return value
+
+        results = parallel_imap(fail, range(6), workers=2)
+        self.assertEqual([next(results) for _ in range(3)], [0, 1, 2])
+        with self.assertRaises(ValueError):
+            next(results)
+
+    def test_close(self):
+        lock = threading.Lock()
+        initialized, finalized, discarded = [], [], []
+
+        def initializer():
+            with lock:
+                initialized.append(threading.current_thread())
+
+        def finalizer():
+            with lock:
+                finalized.append(threading.current_thread())
+
+        def slow(value):
+            time.sleep(0.01)
+            return value
+
+        results = parallel_imap(
+            slow, range(100), workers=3, initializer=initializer,
+            finalizer=finalizer, discard=discarded.append
+        )
+        consumed = [next(results) for _ in range(5)]
+        results.close()
+
+        # the computed but unconsumed results are discarded, the remaining
+        # items are not processed at all
+        self.assertEqual(consumed, range(5))
+        self.assertTrue(discarded)
+        self.assertEqual(discarded, range(5, 5 + len(discarded)))
+        self.assertTrue(len(discarded) <= 6)
+
+        # all workers are stopped
+        for _ in range(100):
+            if len(finalized) == 3:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(initialized), 3)
+        self.assertEqual(sorted(finalized), sorted(initialized))
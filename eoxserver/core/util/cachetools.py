@@ -0,0 +1,80 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+
+import threading
+from itertools import count
+
+
+def lru_cache(maxsize=128):
+    """ Decorator to memoize the results of a function with hashable
+        positional arguments. At most ``maxsize`` results are kept. When the
+        cache is full, the least recently used quarter of the results is
+        discarded. Cache hits do not acquire any lock. The decorated function
+        gains a ``cache_clear`` method to empty the cache. The cache is shared
+        between threads, so the function should return immutable values or
+        objects that are not modified by the callers.
+    """
+    def decorator(func):
+        cache = {}
+        last_used = {}
+        counter = count()
+        lock = threading.Lock()
+
+        def evict():
+            keys = sorted(last_used, key=last_used.get)
+            for key in keys[:max(1, len(keys) // 4)]:
+                cache.pop(key, None)
+                last_used.pop(key, None)
+
+        def wrapper(*args):
+            try:
+                result = cache[args]
+            except KeyError:
+                result = func(*args)
+                with lock:
+                    if len(cache) >= maxsize:
+                        evict()
+                    cache[args] = result
+
+            last_used[args] = next(counter)
+            return result
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+                last_used.clear()
+
+        # note: the stdlib functools module is shadowed by the one of this
+        # package, so the wrapper is updated manually
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__module__ = func.__module__
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
@@ -27,6 +27,10 @@
 #-------------------------------------------------------------------------------
 
 
+import sys
+import Queue
+import threading
+from collections import deque
 from itertools import izip, tee
 
 
@@ -41,3 +45,85 @@ def pairwise_iterative(iterable):
     a, b = tee(iterable)
     next(b, None)
     return izip(a, b)
+
+
+def parallel_imap(func, iterable, workers=1, max_pending=None,
+                  initializer=None, finalizer=None, discard=None):
+    """ Lazily applies ``func`` to all items of ``iterable`` within a pool of
+        ``workers`` threads and yields the results in the order of the items.
+        At most ``max_pending`` items (by default twice the number of workers)
+        are processed or waiting to be consumed at any time, which bounds the
+        memory used by the results. ``initializer`` and ``finalizer`` are
+        called in each worker thread when it is started or stopped. Exceptions
+        raised by ``func`` are re-raised when the according result is
+        consumed. When the generator is closed before all results were
+        consumed, ``discard`` is called with each result that was already
+        computed or in progress, e.g: to release temporary files.
+    """
+    workers = max(workers, 1)
+    max_pending = max(max_pending or workers * 2, workers)
+    task_queue = Queue.Queue()
+
+    def worker():
+        if initializer:
+            initializer()
+        try:
+            while True:
+                task = task_queue.get()
+                if task is None:
+                    break
+                item, result_queue = task
+                try:
+                    result_queue.put((True, func(item)))
+                except Exception:
+                    result_queue.put((False, sys.exc_info()))
+        finally:
+            if finalizer:
+                finalizer()
+
+    def get_result(result_queue):
+        success, value = result_queue.get()
+        if not success:
+            raise value[0], value[1], value[2]
+        return value
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    pending = deque()
+    try:
+        for item in iterable:
+            result_queue = Queue.Queue(1)
+            task_queue.put((item, result_queue))
+            pending.append(result_queue)
+            if len(pending) >= max_pending:
+                yield get_result(pending.popleft())
+
+        while pending:
+            yield get_result(pending.popleft())
+
+    finally:
+        # drop all tasks that were not yet started and stop the workers
+        dropped = set()
+        while True:
+            try:
+                task = task_queue.get_nowait()
+            except Queue.Empty:
+                break
+            if task is not None:
+                dropped.add(id(task[1]))
+        for _ in threads:
+            task_queue.put(None)
+
+        # wait for the tasks in progress and discard all unconsumed results
+        for result_queue in pending:
+            if id(result_queue) in dropped:
+                continue
+            success, value = result_queue.get()
+            if success and discard:
+                try:
+                    discard(value)
+                except Exception:
+                    pass
@@ -27,6 +27,7 @@
 #-------------------------------------------------------------------------------
 
 import re
+from calendar import timegm
 from datetime import datetime, timedelta
 
 from django.utils.timezone import utc, make_aware, is_aware
@@ -44,6 +45,32 @@ def isoformat(dt):
     return dt.isoformat("T")
 
 
+def to_timestamp(dt):
+    """ Converts a datetime object to a POSIX timestamp (a float). Timezone
+        naive datetimes are treated as UTC, `None` is converted to NaN.
+    """
+    if dt is None:
+        return float("nan")
+    return timegm(dt.utctimetuple()) + dt.microsecond / 1e6
+
+
+def merge_intervals(intervals, tolerance=None):
+    """ Merges overlapping or contiguous time intervals, given as an iterable
+        of (begin, end) tuples. Intervals separated by a gap of at most
+        `tolerance` (a `timedelta`) are considered contiguous. Returns a sorted
+        list of the merged (begin, end) tuples.
+    """
+    tolerance = tolerance or timedelta(0)
+    merged = []
+    for begin, end in sorted(intervals):
+        if merged and begin <= merged[-1][1] + tolerance:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((begin, end))
+    return merged
+
+
 def parse_iso8601(value, tzinfo=None):
     """ Parses an ISO 8601 date or datetime string to a python date or datetime.
         Raises a `ValueError` if a conversion was not possible. The returned 
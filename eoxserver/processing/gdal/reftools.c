@@ -438,6 +438,44 @@ CPLErr eoxs_get_footprint_wkt(GDALDatasetH ds, int method, int order, char **out
     return CE_None;
 }
 
+/* transform pixel coordinates to the GCP projection in place */
+CPLErr eoxs_transform_points(GDALDatasetH ds, int method, int order, int n_points, double *x, double *y, int *success) {
+    void *transformer;
+    double *z;
+    int i;
+
+    if (!ds) {
+        CPLError(CE_Failure, CPLE_ObjectNull, "No dataset passed.");
+        return CE_Failure;
+    }
+
+    else if ( 0 == GDALGetGCPCount(ds) ) {
+        CPLError(CE_Failure, CPLE_IllegalArg, "The given dataset has no GCPs.");
+        return CE_Failure; 
+    }
+
+    transformer = eoxs_create_referenceable_grid_transformer(ds, method, order);
+
+    if (!transformer) {
+        if (CPLGetLastErrorMsg() == NULL) {
+            CPLError(CE_Failure, CPLE_OutOfMemory, "Failed to create GCP transformer.");
+        }
+        return CE_Failure; 
+    }
+
+    z = malloc(sizeof(double) * n_points);
+    for (i = 0; i < n_points; i++) z[i] = 0;
+
+    GDALUseTransformer(transformer, FALSE, n_points, x, y, z, success);
+
+    free(z);
+    GDALDestroyTransformer(transformer);
+
+    return CE_None;
+}
+
+/******************************************************************************/
+
 double eoxs_array_min(int n, double *c) {
     double min_value;
     int i;
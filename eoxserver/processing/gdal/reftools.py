@@ -27,14 +27,21 @@
 #-------------------------------------------------------------------------------
 
 from tempfile import mkstemp
+from hashlib import md5
+from math import ceil
+from uuid import uuid4
+from array import array
 import ctypes as C
 import os.path
+import os
 import logging
 
 from functools import wraps 
 
-from eoxserver.contrib import gdal
+from eoxserver.contrib import gdal, osr
+from eoxserver.core.decoders import config
 from eoxserver.core.util.rect import Rect
+from eoxserver.core.util.cachetools import lru_cache
 
 #-------------------------------------------------------------------------------
 # approximation transformer's threshold in pixel units 
@@ -129,6 +136,14 @@ try:
     _free_string = _lib.eoxs_free_string
     _free_string.argtypes = [C.c_char_p]
 
+    try:
+        _transform_points = _lib.eoxs_transform_points
+        _transform_points.argtypes = [C.c_void_p, C.c_int, C.c_int, C.c_int, C.POINTER(C.c_double), C.POINTER(C.c_double), C.POINTER(C.c_int)]
+        _transform_points.restype = C.c_int
+    except AttributeError:
+        # library built from an older version
+        _transform_points = None
+
     REFTOOLS_USABLE = True
 
 except OSError:
@@ -328,10 +343,7 @@ def create_temporary_rectified_vrt(path_or_ds, srid=None,
     resample=gdal.GRA_NearestNeighbour, memory_limit=0.0,
     max_error=APPROX_ERR_TOL, method=METHOD_GCP, order=0):
 
-    try:
-        from eoxserver.core.system import System
-        vrt_tmp_dir = System.getConfig().getConfigValue("processing.gdal.reftools", "vrt_tmp_dir")
-    except: vrt_tmp_dir = None
+    vrt_tmp_dir = ReftoolsConfigReader.from_config().vrt_tmp_dir
     
     _, vrt_path = mkstemp(
         dir = vrt_tmp_dir,
@@ -386,3 +398,472 @@ def reproject_image(src_ds, src_wkt, dst_ds, dst_wkt,
     
     if ret != gdal.CE_None:
         raise RuntimeError(gdal.GetLastErrorMsg())
+
+
+#-------------------------------------------------------------------------------
+# cached transformations 
+
+# maximum number of lookup grid cells along each image axis
+LOOKUP_GRID_CELLS = 100
+
+
+class ReftoolsConfigReader(config.Reader):
+    config.section("processing.gdal.reftools")
+    vrt_tmp_dir = config.Option(default=None)
+    lookup_grid_dir = config.Option(default=None)
+
+
+@requires_reftools
+def transform_points(path_or_ds, points, method=METHOD_GCP, order=0):
+    """ Transforms a list of (pixel, line) coordinates to the GCP projection
+        of the dataset. Returns two arrays with the X and Y coordinates. A
+        :class:`ReftoolsException` is raised if any of the points could not
+        be transformed.
+    """
+    if _transform_points is None:
+        raise ReftoolsException(
+            "The reftools extension library does not support point "
+            "transformations. Please rebuild it."
+        )
+
+    ds = _open_ds(path_or_ds)
+    n_points = len(points)
+    x = (C.c_double * n_points)(*[point[0] for point in points])
+    y = (C.c_double * n_points)(*[point[1] for point in points])
+    success = (C.c_int * n_points)()
+
+    ret = _transform_points(
+        C.c_void_p(long(ds.this)), method, order, n_points, x, y, success
+    )
+    if ret != gdal.CE_None:
+        raise RuntimeError(gdal.GetLastErrorMsg())
+
+    failed = n_points - sum(success)
+    if failed:
+        raise ReftoolsException(
+            "Failed to transform %d of %d points." % (failed, n_points)
+        )
+
+    return array("d", x), array("d", y)
+
+
+class LookupGrid(object):
+    """ Coarse lookup grid of the transformation from image to GCP projection
+        coordinates of a referenceable dataset. The nodes of the grid are
+        located every ``step_x`` pixels and ``step_y`` lines, starting at the
+        upper left corner of the image and covering all of it. Fitting the 
+        transformer to the tie-points is thus only necessary once to create
+        the grid, subsets are resolved using the grid alone.
+
+        The grid is stored as a two band (X and Y) GeoTIFF, which is also 
+        usable as geolocation array by GDAL.
+    """
+
+    def __init__(self, size_x, size_y, step_x, step_y, n_x, n_y, x, y, srs,
+                 method, order, path=None):
+        self.size_x = size_x
+        self.size_y = size_y
+        self.step_x = step_x
+        self.step_y = step_y
+        self.n_x = n_x
+        self.n_y = n_y
+        self.x = x
+        self.y = y
+        self.srs = srs
+        self.method = method
+        self.order = order
+        self.path = path
+        self._geolocation_vrt = None
+
+
+    @classmethod
+    def from_dataset(cls, path_or_ds, method=METHOD_GCP, order=0, 
+                     cells=LOOKUP_GRID_CELLS):
+        """ Computes the lookup grid of a dataset for the given transformer 
+            method and order.
+        """
+        ds = _open_ds(path_or_ds)
+        size_x, size_y = ds.RasterXSize, ds.RasterYSize
+        step_x = max(int(ceil(size_x / float(cells))), 1)
+        step_y = max(int(ceil(size_y / float(cells))), 1)
+        n_x = int(ceil(size_x / float(step_x))) + 1
+        n_y = int(ceil(size_y / float(step_y))) + 1
+
+        x, y = transform_points(ds, [
+            (i * step_x, j * step_y) for j in xrange(n_y) for i in xrange(n_x)
+        ], method, order)
+
+        return cls(
+            size_x, size_y, step_x, step_y, n_x, n_y, x, y, 
+            ds.GetGCPProjection(), method, order
+        )
+
+
+    @classmethod
+    def load(cls, path):
+        """ Loads a lookup grid stored with :meth:`save`.
+        """
+        ds = gdal.Open(path)
+        n_x, n_y = ds.RasterXSize, ds.RasterYSize
+        metadata = ds.GetMetadata()
+
+        def read(index):
+            return array("d", ds.GetRasterBand(index).ReadRaster(
+                0, 0, n_x, n_y, buf_type=gdal.GDT_Float64
+            ))
+
+        return cls(
+            int(metadata["EOXS_SIZE_X"]), int(metadata["EOXS_SIZE_Y"]),
+            int(metadata["EOXS_STEP_X"]), int(metadata["EOXS_STEP_Y"]),
+            n_x, n_y, read(1), read(2), metadata["EOXS_SRS"],
+            int(metadata["EOXS_METHOD"]), int(metadata["EOXS_ORDER"]), path
+        )
+
+
+    def save(self, path):
+        """ Stores the lookup grid as a GeoTIFF. The file is written to a 
+            temporary location first and then moved to the given path.
+        """
+        ds = gdal.GetDriverByName("MEM").Create(
+            "", self.n_x, self.n_y, 2, gdal.GDT_Float64
+        )
+        for index, values in ((1, self.x), (2, self.y)):
+            ds.GetRasterBand(index).WriteRaster(
+                0, 0, self.n_x, self.n_y, values.tostring(), 
+                buf_type=gdal.GDT_Float64
+            )
+
+        ds.SetMetadata({
+            "EOXS_SIZE_X": str(self.size_x), "EOXS_SIZE_Y": str(self.size_y),
+            "EOXS_STEP_X": str(self.step_x), "EOXS_STEP_Y": str(self.step_y),
+            "EOXS_SRS": self.srs, 
+            "EOXS_METHOD": str(self.method), "EOXS_ORDER": str(self.order)
+        })
+
+        tmp_path = "%s.%s.tmp" % (path, uuid4().hex)
+        gdal.GetDriverByName("GTiff").CreateCopy(tmp_path, ds)
+        os.rename(tmp_path, path)
+        self.path = path
+
+
+    def rect_from_subset(self, srid, minx, miny, maxx, maxy):
+        """ Returns the pixel rectangle of the image covering the given 
+            subset. All grid cells intersecting the subset are included, so
+            the result is a slight superset of the exact rectangle.
+        """
+        x, y = self.x, self.y
+        src_sr = osr.SpatialReference(self.srs, "WKT")
+        dst_sr = osr.SpatialReference(int(srid))
+        if not src_sr.IsSame(dst_sr):
+            points = osr.CoordinateTransformation(
+                src_sr.sr, dst_sr.sr
+            ).TransformPoints(zip(x, y))
+            x = [point[0] for point in points]
+            y = [point[1] for point in points]
+
+        n_x = self.n_x
+        cols = set()
+        rows = set()
+        for j in xrange(self.n_y - 1):
+            for i in xrange(n_x - 1):
+                corners = (j * n_x + i, j * n_x + i + 1, 
+                           (j + 1) * n_x + i, (j + 1) * n_x + i + 1)
+                cell_x = [x[k] for k in corners]
+                cell_y = [y[k] for k in corners]
+                if (min(cell_x) <= maxx and max(cell_x) >= minx and 
+                        min(cell_y) <= maxy and max(cell_y) >= miny):
+                    cols.add(i)
+                    rows.add(j)
+
+        if not cols:
+            return Rect(0, 0, 0, 0)
+
+        return Rect(0, 0, self.size_x, self.size_y) & Rect(
+            offset_x=min(cols) * self.step_x, 
+            offset_y=min(rows) * self.step_y,
+            upper_x=(max(cols) + 1) * self.step_x, 
+            upper_y=(max(rows) + 1) * self.step_y
+        )
+
+
+    def get_geolocation_vrt(self, path):
+        """ Returns the path of a VRT of the dataset at ``path`` that uses the
+            lookup grid as geolocation arrays instead of its tie-points. The
+            VRT is stored next to the lookup grid.
+        """
+        if self._geolocation_vrt and gdal.VSIStatL(self._geolocation_vrt):
+            return self._geolocation_vrt
+
+        if not self.path:
+            self.save("/vsimem/%s.tif" % uuid4().hex)
+
+        vrt_path = self.path + ".vrt"
+        in_memory = self.path.startswith("/vsimem/")
+        if in_memory or not os.path.exists(vrt_path):
+            # like the grid itself, the VRT is written to a temporary location
+            # first, so that concurrent readers never see a partial file
+            if in_memory:
+                tmp_path = vrt_path
+            else:
+                tmp_path = "%s.%s.tmp" % (vrt_path, uuid4().hex)
+
+            vrt_ds = gdal.GetDriverByName("VRT").CreateCopy(
+                tmp_path, _open_ds(path)
+            )
+            vrt_ds.SetGCPs([], "")
+            vrt_ds.SetMetadata({
+                "SRS": self.srs,
+                "X_DATASET": self.path, "X_BAND": "1",
+                "Y_DATASET": self.path, "Y_BAND": "2",
+                "PIXEL_OFFSET": "0", "PIXEL_STEP": str(self.step_x),
+                "LINE_OFFSET": "0", "LINE_STEP": str(self.step_y)
+            }, "GEOLOCATION")
+            vrt_ds = None
+
+            if not in_memory:
+                os.rename(tmp_path, vrt_path)
+
+        self._geolocation_vrt = vrt_path
+        return vrt_path
+
+
+def _artifact_paths(path, suffix):
+    """ Yields the candidate locations of an artifact derived from a dataset:
+        next to the dataset itself and in the configured ``lookup_grid_dir``.
+    """
+    if not path.startswith("/vsi"):
+        yield path + suffix
+
+    lookup_grid_dir = ReftoolsConfigReader.from_config().lookup_grid_dir
+    if lookup_grid_dir:
+        yield os.path.join(
+            lookup_grid_dir, md5(path).hexdigest() + suffix
+        )
+
+
+def is_lookup_grid_supported():
+    """ Checks whether or not the reftools library is able to compute lookup
+        grids.
+    """
+    return REFTOOLS_USABLE and _transform_points is not None
+
+
+@lru_cache(maxsize=256)
+def _get_transformer_options(path, mtime):
+    return suggest_transformer(path)
+
+
+@lru_cache(maxsize=64)
+def _get_lookup_grid(path, mtime, method, order):
+    candidates = list(
+        _artifact_paths(path, ".eoxs_grid_%d_%d.tif" % (method, order))
+    )
+
+    for grid_path in candidates:
+        try:
+            if os.path.getmtime(grid_path) >= mtime:
+                return LookupGrid.load(grid_path)
+        except (OSError, RuntimeError, KeyError):
+            pass
+
+    grid = LookupGrid.from_dataset(path, method, order)
+
+    for grid_path in candidates:
+        try:
+            grid.save(grid_path)
+            break
+        except (OSError, RuntimeError), e:
+            logger.debug(
+                "Could not store lookup grid at '%s': %s" % (grid_path, e)
+            )
+
+    return grid
+
+
+def _get_mtime(path):
+    stat = gdal.VSIStatL(path)
+    if stat is None:
+        raise ReftoolsException("Could not access '%s'." % path)
+    return stat.mtime
+
+
+def get_transformer_options(path):
+    """ Cached version of :func:`suggest_transformer` for dataset files.
+    """
+    return _get_transformer_options(path, _get_mtime(path))
+
+
+def get_lookup_grid(path, method=None, order=None):
+    """ Returns the :class:`LookupGrid` of the referenceable dataset at the 
+        given path. If no method and order is given, the suggested ones are 
+        used. The grid is kept in memory and persisted next to the dataset or
+        in the ``lookup_grid_dir`` of the ``processing.gdal.reftools`` 
+        configuration section, so that the transformer is only fitted once 
+        per dataset, method and order.
+    """
+    mtime = _get_mtime(path)
+    if method is None:
+        options = _get_transformer_options(path, mtime)
+        method, order = options["method"], options["order"]
+
+    return _get_lookup_grid(path, mtime, method, order or 0)
+
+
+@requires_reftools
+def create_rectified_vrt_from_grid(path, vrt_path, srid=None, 
+    resample=gdal.GRA_NearestNeighbour, max_error=APPROX_ERR_TOL, 
+    method=None, order=None):
+    """ Variant of :func:`create_rectified_vrt` for dataset files, using the
+        geolocation arrays of the cached lookup grid instead of fitting a 
+        transformer to the tie-points. Falls back to 
+        :func:`create_rectified_vrt` if lookup grids are not supported or
+        ``gdal.Warp`` is not available (GDAL < 2.1).
+    """
+    if not is_lookup_grid_supported() or not hasattr(gdal, "Warp"):
+        if method is None:
+            options = get_transformer_options(path)
+            method, order = options["method"], options["order"]
+        return create_rectified_vrt(
+            path, vrt_path, srid, resample, 0.0, max_error, method, order or 0
+        )
+
+    grid = get_lookup_grid(path, method, order)
+    geolocation_vrt = grid.get_geolocation_vrt(path)
+
+    if srid:
+        dst_srs = osr.SpatialReference(int(srid)).wkt
+    else:
+        dst_srs = grid.srs
+
+    ds = gdal.Warp(vrt_path, geolocation_vrt, 
+        format="VRT", dstSRS=dst_srs, geoloc=True, 
+        resampleAlg=resample, errorThreshold=max_error
+    )
+    if ds is None:
+        raise RuntimeError(gdal.GetLastErrorMsg())
+
+
+#-------------------------------------------------------------------------------
+# persisted artifacts 
+
+# overviews of rectified VRTs are built until the image fits into this size
+OVERVIEW_MIN_SIZE = 256
+
+
+def _write_artifact(path, content):
+    tmp_path = "%s.%s.tmp" % (path, uuid4().hex)
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.rename(tmp_path, path)
+
+
+@lru_cache(maxsize=256)
+def _get_footprint_wkt(path, mtime, method, order):
+    candidates = list(
+        _artifact_paths(path, ".eoxs_footprint_%d_%d.wkt" % (method, order))
+    )
+
+    for footprint_path in candidates:
+        try:
+            if os.path.getmtime(footprint_path) >= mtime:
+                with open(footprint_path) as f:
+                    return f.read()
+        except (OSError, IOError):
+            pass
+
+    wkt = get_footprint_wkt(path, method, order)
+
+    for footprint_path in candidates:
+        try:
+            _write_artifact(footprint_path, wkt)
+            break
+        except (OSError, IOError), e:
+            logger.debug(
+                "Could not store footprint at '%s': %s" % (footprint_path, e)
+            )
+
+    return wkt
+
+
+def get_persisted_footprint_wkt(path, method=None, order=None):
+    """ Cached version of :func:`get_footprint_wkt` for dataset files. The
+        footprint is stored alongside the lookup grid of the dataset and is 
+        only recomputed when the dataset was modified.
+    """
+    mtime = _get_mtime(path)
+    if method is None:
+        options = _get_transformer_options(path, mtime)
+        method, order = options["method"], options["order"]
+
+    return _get_footprint_wkt(path, mtime, method, order or 0)
+
+
+def get_overview_levels(size_x, size_y, min_size=OVERVIEW_MIN_SIZE):
+    """ Returns the decimation factors of an overview pyramid for an image of
+        the given size, halving the resolution until it fits into `min_size`.
+    """
+    levels = []
+    level = 2
+    while max(size_x, size_y) / float(level // 2) > min_size:
+        levels.append(level)
+        level *= 2
+    return levels
+
+
+@requires_reftools
+def create_persisted_rectified_vrt(path, srid=None, 
+    resample=gdal.GRA_NearestNeighbour, max_error=APPROX_ERR_TOL,
+    method=None, order=None, overview_levels=None, 
+    overview_resample="AVERAGE"):
+    """ Creates a rectified VRT of the referenceable dataset at ``path`` that
+        is meant to be kept for the lifetime of the dataset, along with a
+        pyramid of downsampled, already warped overviews. Both are stored 
+        next to the dataset or in the ``lookup_grid_dir``. If no 
+        ``overview_levels`` are given, they are derived from the size of the 
+        rectified image; an empty list disables the overviews.
+
+        Returns a tuple of the paths of the VRT and its overviews (or 
+        ``None``).
+    """
+    suffix = ".eoxs_rectified_%s.vrt" % (srid or "native")
+    for vrt_path in _artifact_paths(path, suffix):
+        tmp_path = "%s.%s.tmp" % (vrt_path, uuid4().hex)
+        try:
+            create_rectified_vrt_from_grid(
+                path, tmp_path, srid, resample, max_error, method, order
+            )
+            os.rename(tmp_path, vrt_path)
+            break
+        except (OSError, RuntimeError), e:
+            logger.debug(
+                "Could not store rectified VRT at '%s': %s" % (vrt_path, e)
+            )
+            gdal.Unlink(tmp_path)
+    else:
+        raise ReftoolsException(
+            "Could not store the rectified VRT of '%s'." % path
+        )
+
+    # the VRT must not refer to in-memory files that are gone with the process
+    with open(vrt_path) as f:
+        if "/vsimem/" in f.read():
+            os.remove(vrt_path)
+            raise ReftoolsException(
+                "The lookup grid of '%s' could not be persisted." % path
+            )
+
+    ds = gdal.Open(vrt_path)
+    if overview_levels is None:
+        overview_levels = get_overview_levels(ds.RasterXSize, ds.RasterYSize)
+
+    ovr_path = None
+    if overview_levels:
+        ovr_path = vrt_path + ".ovr"
+        if os.path.exists(ovr_path):
+            os.remove(ovr_path)
+        ret = ds.BuildOverviews(overview_resample, overview_levels)
+        if ret != gdal.CE_None:
+            raise RuntimeError(gdal.GetLastErrorMsg())
+
+    ds = None
+    return vrt_path, ovr_path
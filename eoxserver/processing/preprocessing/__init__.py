@@ -29,7 +29,9 @@
 
 from os.path import splitext
 from itertools import izip
-import numpy
+from tempfile import mkdtemp
+from multiprocessing import Pool
+import shutil
 import logging
 
 from django.contrib.gis.geos import GEOSGeometry, MultiPolygon, Polygon, LinearRing, Point
@@ -38,8 +40,9 @@ from django.contrib.gis.gdal.geometries import OGRGeometry
 from eoxserver.contrib import  gdal, ogr, osr 
 from eoxserver.core.util.xmltools import XMLEncoder
 from eoxserver.processing.preprocessing.util import (
-    create_mem, create_mem_copy, copy_projection
+    create_mem_copy, create_vrt_copy
 )
+from eoxserver.processing.preprocessing.footprint import FootprintExtraction
 from eoxserver.processing.preprocessing.optimization import (
     BandSelectionOptimization, ColorIndexOptimization, NoDataValueOptimization,
     OverviewOptimization, ReprojectionOptimization, AlphaBandOptimization
@@ -87,16 +90,29 @@ RGB, RGBA, ORIG_BANDS = range(3)
 
 class PreProcessor(object):
     """
+        When a `tile_size` is given, the pre-processor operates in tiled mode:
+        instead of copying the whole dataset into memory, the optimization 
+        steps are chained as VRTs or write to temporary files within the
+        `scratch_dir` and process the data in windows of `tile_size` pixels.
+        Thus the peak memory is bounded by the tile size, not the image size.
+        
+        With more than one of `workers`, the tiles are processed by a pool of
+        threads. As parallelism is tile based, this implies the tiled mode
+        with a tile size of `DEFAULT_TILE_SIZE` unless specified otherwise.
     """
     
     force = False
     
+    DEFAULT_TILE_SIZE = 1024
+    
     def __init__(self, format_selection, overviews=True, crs=None, bands=None, 
                  bandmode=RGB, footprint_alpha=False,
                  color_index=False, palette_file=None, no_data_value=None,
                  overview_resampling=None, overview_levels=None, 
                  overview_minsize=None, radiometric_interval_min=None, 
-                 radiometric_interval_max=None, simplification_factor=None):
+                 radiometric_interval_max=None, simplification_factor=None,
+                 tile_size=None, scratch_dir=None, workers=None,
+                 footprint_accuracy=None):
         
         self.format_selection = format_selection
         self.overviews = overviews
@@ -121,13 +137,52 @@ class PreProcessor(object):
             # default 2 * resolution == 2 pixels
             self.simplification_factor = 2
         
+        # a footprint more accurate than the simplification is not required
+        if footprint_accuracy is not None:
+            self.footprint_accuracy = footprint_accuracy
+        else:
+            self.footprint_accuracy = self.simplification_factor
+        
+        if workers > 1 and not tile_size:
+            tile_size = self.DEFAULT_TILE_SIZE
+        
+        self.tile_size = tile_size
+        self.scratch_dir = scratch_dir
+        self.workers = workers
+        
     
     def process(self, input_filename, output_filename, 
                 geo_reference=None, generate_metadata=True):
         
-        # open the dataset and create an In-Memory Dataset as copy
-        # to perform optimizations
-        ds = create_mem_copy(gdal.Open(input_filename))
+        if not self.tile_size:
+            return self._process(input_filename, output_filename,
+                                 geo_reference, generate_metadata)
+        
+        # temporary files of the tiled processing steps
+        scratch_dir = mkdtemp(prefix="eoxs_preprocess", dir=self.scratch_dir)
+        try:
+            return self._process(input_filename, output_filename,
+                                 geo_reference, generate_metadata, 
+                                 scratch_dir)
+        finally:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+    
+    
+    def _process(self, input_filename, output_filename, geo_reference, 
+                 generate_metadata, scratch_dir=None):
+        
+        # open the dataset and create an In-Memory Dataset as copy to perform
+        # optimizations. In tiled mode a VRT is used instead, referencing the
+        # original data.
+        if self.tile_size:
+            ds = create_vrt_copy(gdal.Open(input_filename))
+        else:
+            ds = create_mem_copy(gdal.Open(input_filename))
+        
+        # in tiled mode the intermediate datasets are referenced by their 
+        # successors and have to be kept open
+        chain = []
+        self._keep(chain, ds)
         
         gt = ds.GetGeoTransform()
         footprint_wkt = None
@@ -139,26 +194,31 @@ class PreProcessor(object):
         else:
             logger.debug("Applying geo reference '%s'."
                          % type(geo_reference).__name__)
+            self._configure(geo_reference, scratch_dir)
             ds, footprint_wkt = geo_reference.apply(ds)
+            self._keep(chain, ds)
         
         # apply optimizations
         for optimization in self.get_optimizations(ds):
             logger.debug("Applying optimization '%s'."
                          % type(optimization).__name__)
+            self._configure(optimization, scratch_dir)
             new_ds = optimization(ds)
             ds = None
             ds = new_ds
+            self._keep(chain, ds)
             
         # generate the footprint from the dataset
         if not footprint_wkt:
             logger.debug("Generating footprint.")
-            footprint_wkt = self._generate_footprint_wkt(ds)
+            footprint_wkt = self._generate_footprint_wkt(ds, scratch_dir)
         
         
         if self.footprint_alpha:
             logger.debug("Applying optimization 'AlphaBandOptimization'.")
-            opt = AlphaBandOptimization()
-            opt(ds, footprint_wkt)
+            opt = self._configure(AlphaBandOptimization(), scratch_dir)
+            ds = opt(ds, footprint_wkt)
+            self._keep(chain, ds)
         
         
         output_filename = self.generate_filename(output_filename)
@@ -173,6 +233,7 @@ class PreProcessor(object):
         driver = gdal.GetDriverByName(self.format_selection.driver_name)
         ds = driver.CreateCopy(output_filename, ds,
                                options=self.format_selection.creation_options)
+        chain = None
         
         for optimization in self.get_post_optimizations(ds):
             logger.debug("Applying post-optimization '%s'."
@@ -231,59 +292,33 @@ class PreProcessor(object):
         return base_filename + self.format_selection.extension 
     
     
-    def _generate_footprint_wkt(self, ds):
+    def _configure(self, step, scratch_dir):
+        """ Set up a processing step for the tiled mode, if enabled. """
+        if self.tile_size:
+            step.tile_size = self.tile_size
+            step.scratch_dir = scratch_dir
+            step.workers = self.workers
+        return step
+    
+    
+    def _keep(self, chain, ds):
+        """ Keep a reference to an intermediate dataset in tiled mode. """
+        if self.tile_size:
+            chain.append(ds)
+    
+    
+    def _generate_footprint_wkt(self, ds, scratch_dir=None):
         """ Generate a fooptrint from a raster, using black/no-data as exclusion
         """
         
-        # create an empty boolean array initialized as 'False' to store where
-        # values exist as a mask array.
-        nodata_map = numpy.zeros((ds.RasterYSize, ds.RasterXSize),
-                                 dtype=numpy.bool)
+        # extract the footprint with the requested accuracy, refining a 
+        # coarse mask only at its edges
+        extraction = self._configure(
+            FootprintExtraction(self.footprint_accuracy), scratch_dir
+        )
+        geometry = extraction(ds)
         
-        for idx in range(1, ds.RasterCount + 1):
-            band = ds.GetRasterBand(idx)
-            raster_data = band.ReadAsArray()
-            nodata = band.GetNoDataValue()
-            
-            if nodata is None:
-                nodata = 0
-            
-            # apply the output to the map  
-            nodata_map |= (raster_data != nodata)
-        
-        # create a temporary in-memory dataset and write the nodata mask 
-        # into its single band
-        tmp_ds = create_mem(ds.RasterXSize + 2, ds.RasterYSize + 2, 1, 
-                            gdal.GDT_Byte)
-        copy_projection(ds, tmp_ds)
-        tmp_band = tmp_ds.GetRasterBand(1)
-        tmp_band.WriteArray(nodata_map.astype(numpy.uint8))
-        
-        # create an OGR in memory layer to hold the created polygon
         sr = osr.SpatialReference(); sr.ImportFromWkt(ds.GetProjectionRef())
-        ogr_ds = ogr.GetDriverByName('Memory').CreateDataSource('out')
-        layer = ogr_ds.CreateLayer('poly', sr.sr, ogr.wkbPolygon)
-        fd = ogr.FieldDefn('DN', ogr.OFTInteger)
-        layer.CreateField(fd)
-        
-        # polygonize the mask band and store the result in the OGR layer
-        gdal.Polygonize(tmp_band, tmp_band, layer, 0)
-        
-        if layer.GetFeatureCount() != 1:
-            # if there is more than one polygon, compute the minimum bounding polygon
-            geometry = ogr.Geometry(ogr.wkbPolygon)
-            while True:
-                feature = layer.GetNextFeature()
-                if not feature: break
-                geometry = geometry.Union(feature.GetGeometryRef())
-            
-            # TODO: improve this for a better minimum bounding polygon
-            geometry = geometry.ConvexHull()
-        
-        else:
-            # obtain geometry from the first (and only) layer
-            feature = layer.GetNextFeature()
-            geometry = feature.GetGeometryRef()
         
         if geometry.GetGeometryType() != ogr.wkbPolygon:
             raise RuntimeError("Error during poligonization. Wrong geometry "
@@ -390,6 +425,63 @@ class WMSPreProcessor(PreProcessor):
                                        self.overview_minsize)
 
 
+#===============================================================================
+# Batch processing
+#===============================================================================
+
+# state of the batch worker processes
+_batch = {}
+
+
+def _init_batch_worker(preprocessor, geo_reference, generate_metadata):
+    _batch.update(
+        preprocessor=preprocessor, geo_reference=geo_reference,
+        generate_metadata=generate_metadata
+    )
+
+
+def _process_batch_item(filenames):
+    input_filename, output_filename = filenames
+    try:
+        result = _batch["preprocessor"].process(
+            input_filename, output_filename, _batch["geo_reference"], 
+            _batch["generate_metadata"]
+        )
+        return input_filename, result, None
+    except Exception, e:
+        logger.debug("Pre-processing of '%s' failed." % input_filename,
+                     exc_info=True)
+        return input_filename, None, "%s: %s" % (type(e).__name__, str(e))
+
+
+def process_batch(preprocessor, filenames, geo_reference=None, 
+                  generate_metadata=False, processes=None):
+    """ Pre-processes a batch of files concurrently in a pool of `processes`
+        worker processes, defaulting to the number of CPUs. `filenames` is an
+        iterable of (input filename, output filename) tuples. Yields a tuple 
+        of the input filename, the :class:`PreProcessResult` and an error 
+        message for each file as soon as it is processed. Either the result 
+        or the error message is `None`.
+        
+        The pre-processor and geo reference are inherited by the forked 
+        worker processes and are thus not required to be picklable.
+    """
+    if processes == 1:
+        _init_batch_worker(preprocessor, geo_reference, generate_metadata)
+        for item in filenames:
+            yield _process_batch_item(item)
+        return
+    
+    pool = Pool(processes, _init_batch_worker, 
+                (preprocessor, geo_reference, generate_metadata))
+    try:
+        for item in pool.imap_unordered(_process_batch_item, filenames):
+            yield item
+    finally:
+        pool.terminate()
+        pool.join()
+
+
 #===============================================================================
 # PreProcess result
 #===============================================================================
@@ -0,0 +1,247 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+
+""" Multi-resolution extraction of the footprint of the valid (non no-data) 
+    pixels of a dataset.
+
+    The mask of valid pixels is first computed on a decimated version of the 
+    image, which is cheap to read, especially when overviews are available. 
+    Only the cells of this coarse mask at the edges of the valid area are
+    then refined by reading the corresponding blocks in the requested 
+    accuracy. The resulting mask is polygonized at the accuracy resolution,
+    not at the full resolution of the image.
+"""
+
+from math import ceil
+from threading import Lock
+import logging
+
+import numpy
+
+from eoxserver.contrib import gdal, ogr, osr
+from eoxserver.processing.preprocessing.util import (
+    TiledProcessingMixIn, process_windows
+)
+
+
+logger = logging.getLogger(__name__)
+
+# the coarse mask is computed at a decimation reducing the image to at least 
+# this size along its larger axis
+COARSE_SIZE = 1024
+
+
+def _power_of_two(value):
+    """ Returns the largest power of two less or equal to the value, but at
+        least 1.
+    """
+    level = 1
+    while level * 2 <= value:
+        level *= 2
+    return level
+
+
+def _edges(mask):
+    """ Returns a boolean array of the cells of the mask that have at least one
+        neighbour with a different value, including the image border.
+    """
+    padded = numpy.pad(mask, 1, "constant", constant_values=False)
+    size_y, size_x = mask.shape
+    any_valid = numpy.zeros(mask.shape, dtype=numpy.bool)
+    all_valid = numpy.ones(mask.shape, dtype=numpy.bool)
+    for y in range(3):
+        for x in range(3):
+            neighbour = padded[y:y + size_y, x:x + size_x]
+            any_valid |= neighbour
+            all_valid &= neighbour
+    return any_valid & ~all_valid
+
+
+def _runs(row):
+    """ Yields the (start, stop) index tuples of consecutive `True` values in
+        a boolean array.
+    """
+    changes = numpy.flatnonzero(numpy.diff(
+        numpy.concatenate(([False], row, [False])).astype(numpy.int8)
+    ))
+    for start, stop in zip(changes[::2], changes[1::2]):
+        yield int(start), int(stop)
+
+
+class FootprintExtraction(TiledProcessingMixIn):
+    """ Extracts the footprint of the valid pixels of a dataset, where a pixel
+        is valid if it is not the no-data value (or 0 if not set) in at least
+        one band. The footprint is accurate to `accuracy` pixels: the mask is
+        polygonized with a resolution of the largest power of two not
+        exceeding the accuracy, and the polygons are simplified with a 
+        tolerance of the accuracy before they are merged.
+
+        The strips of the mask are processed by the configured number of 
+        `workers`. In tiled mode, the mask is stored in a temporary file. 
+
+        Note that valid areas smaller than the coarse cells which are not 
+        connected to the edges of the valid area may be missed.
+    """
+
+    def __init__(self, accuracy=1, coarse_size=COARSE_SIZE):
+        self.accuracy = accuracy
+        self.coarse_size = coarse_size
+
+
+    def __call__(self, ds):
+        """ Returns the footprint as an OGR geometry in the projection of the
+            dataset. If the valid area consists of several polygons, their 
+            convex hull is returned.
+        """
+        size_x, size_y = ds.RasterXSize, ds.RasterYSize
+        gt = ds.GetGeoTransform()
+
+        # decimation of the final (fine) and the coarse mask
+        resolution = _power_of_two(self.accuracy)
+        level = max(
+            resolution,
+            _power_of_two(max(size_x, size_y) / float(self.coarse_size))
+        )
+        scale = level // resolution
+
+        bands = [ds.GetRasterBand(idx) for idx in range(1, ds.RasterCount + 1)]
+        nodata_values = []
+        for band in bands:
+            nodata = band.GetNoDataValue()
+            nodata_values.append(nodata if nodata is not None else 0)
+
+        # the datasets must not be accessed concurrently
+        lock = Lock()
+
+        def read_mask(x, y, width, height, decimation):
+            buf_x = int(ceil(width / float(decimation)))
+            buf_y = int(ceil(height / float(decimation)))
+            mask = numpy.zeros((buf_y, buf_x), dtype=numpy.bool)
+            for band, nodata in zip(bands, nodata_values):
+                with lock:
+                    data = band.ReadAsArray(x, y, width, height, buf_x, buf_y)
+                mask |= (data != nodata)
+            return mask
+
+        # only whole cells are read for the coarse mask, so that each sample
+        # lies within its cell. Partial cells at the right and bottom border
+        # are always refined.
+        cells_x, cells_y = size_x // level, size_y // level
+        coarse_x = int(ceil(size_x / float(level)))
+        coarse_y = int(ceil(size_y / float(level)))
+        coarse = numpy.zeros((coarse_y, coarse_x), dtype=numpy.bool)
+        if cells_x and cells_y:
+            coarse[:cells_y, :cells_x] = read_mask(
+                0, 0, cells_x * level, cells_y * level, level
+            )
+
+        if scale > 1:
+            edges = _edges(coarse)
+        else:
+            # the coarse mask is already in the requested resolution
+            edges = numpy.zeros(coarse.shape, dtype=numpy.bool)
+        edges[cells_y:, :] = True
+        edges[:, cells_x:] = True
+
+        logger.debug("Computed coarse footprint mask with decimation %d, "
+                     "refining %d of %d cells with decimation %d."
+                     % (level, edges.sum(), edges.size, resolution))
+
+        # create the fine mask with an empty border of one pixel, so that all 
+        # polygons are closed
+        fine_x = int(ceil(size_x / float(resolution)))
+        fine_y = int(ceil(size_y / float(resolution)))
+        mask_ds = self.create_dataset(fine_x + 2, fine_y + 2, 1, gdal.GDT_Byte)
+        mask_ds.SetProjection(ds.GetProjection())
+        mask_ds.SetGeoTransform([
+            gt[0] - resolution * (gt[1] + gt[2]), resolution * gt[1], 
+            resolution * gt[2],
+            gt[3] - resolution * (gt[4] + gt[5]), resolution * gt[4], 
+            resolution * gt[5]
+        ])
+        mask_band = mask_ds.GetRasterBand(1)
+
+        def strip(row):
+            y = row * level
+            height = min(level, size_y - y)
+            strip_y = int(ceil(height / float(resolution)))
+
+            # upsample the coarse mask and replace the edges with the refined
+            # mask
+            data = numpy.tile(
+                coarse[row].repeat(scale)[:fine_x], (strip_y, 1)
+            )
+            for start, stop in _runs(edges[row]):
+                x = start * level
+                width = min(stop * level, size_x) - x
+                refined = read_mask(x, y, width, height, resolution)
+                offset_x = x // resolution
+                data[:, offset_x:offset_x + refined.shape[1]] = refined
+
+            with lock:
+                mask_band.WriteArray(
+                    data.astype(numpy.uint8), 1, 1 + y // resolution
+                )
+
+        process_windows(strip, range(coarse.shape[0]), self.workers)
+
+        return self._polygonize(mask_band, ds.GetProjectionRef(), 
+                                self.accuracy * min(abs(gt[1]), abs(gt[5])))
+
+
+    def _polygonize(self, mask_band, projection, tolerance):
+        sr = osr.SpatialReference(); sr.ImportFromWkt(projection)
+        ogr_ds = ogr.GetDriverByName('Memory').CreateDataSource('out')
+        layer = ogr_ds.CreateLayer('poly', sr.sr, ogr.wkbPolygon)
+        layer.CreateField(ogr.FieldDefn('DN', ogr.OFTInteger))
+
+        # polygonize the mask band and store the result in the OGR layer
+        gdal.Polygonize(mask_band, mask_band, layer, 0)
+
+        if layer.GetFeatureCount() == 1:
+            return layer.GetNextFeature().GetGeometryRef().Clone()
+
+        # simplify the single polygons before merging them. As the convex hull
+        # of all polygons is computed, no union is required.
+        geometry = ogr.Geometry(ogr.wkbMultiPolygon)
+        while True:
+            feature = layer.GetNextFeature()
+            if not feature: break
+            polygon = feature.GetGeometryRef()
+            try:
+                polygon = polygon.SimplifyPreserveTopology(tolerance)
+            except AttributeError:
+                # SimplifyPreserveTopology() available since OGR 1.9.0
+                pass
+            geometry.AddGeometry(polygon)
+
+        geometry.AssignSpatialReference(sr.sr)
+
+        # TODO: improve this for a better minimum bounding polygon
+        return geometry.ConvexHull()
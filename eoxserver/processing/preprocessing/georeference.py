@@ -31,7 +31,7 @@ import logging
 from eoxserver.contrib import gdal, ogr, osr
 from eoxserver.processing.gdal import reftools as rt 
 from eoxserver.processing.preprocessing.util import (
-    create_mem, copy_metadata
+    copy_metadata, TiledProcessingMixIn
 )
 from eoxserver.processing.preprocessing.exceptions import GCPTransformException
 
@@ -43,7 +43,7 @@ logger = logging.getLogger(__name__)
 # Geographic references
 #===============================================================================
 
-class GeographicReference(object):
+class GeographicReference(TiledProcessingMixIn):
     pass
 
 
@@ -137,7 +137,7 @@ class GCPList(GeographicReference):
                     logger.debug("New size is '%i x %i'" % (size_x, size_y))
                     
                     # create the output dataset
-                    dst_ds = create_mem(size_x, size_y,
+                    dst_ds = self.create_dataset(size_x, size_y,
                                         src_ds.RasterCount, 
                                         src_ds.GetRasterBand(1).DataType)
                     
@@ -27,12 +27,15 @@
 #-------------------------------------------------------------------------------
 
 import logging
+from threading import Lock
 
 import numpy
 
 from eoxserver.contrib import gdal, gdal_array, osr, ogr
+from eoxserver.contrib.vrt import VRTBuilder
 from eoxserver.processing.preprocessing.util import ( 
-    get_limits, create_mem, copy_metadata, copy_projection
+    get_limits, create_mem, create_temp_vrt, copy_metadata, copy_projection, 
+    TiledProcessingMixIn
 )
 from eoxserver.resources.coverages.crss import (
     parseEPSGCode, fromShortCode, fromURL, fromURN, fromProj4Str
@@ -45,10 +48,11 @@ logger = logging.getLogger(__name__)
 # Dataset Optimization steps
 #===============================================================================
 
-class DatasetOptimization(object):
+class DatasetOptimization(TiledProcessingMixIn):
     """ Abstract base class for dataset optimization steps. Each optimization
         step shall be callable and return the dataset or a copy thereof if 
-        necessary.
+        necessary. In tiled mode, the steps shall return VRTs or datasets
+        created with `create_dataset` and process the data window-wise.
     """
     
     def __call__(self, ds):
@@ -90,6 +94,12 @@ class ReprojectionOptimization(DatasetOptimization):
         tmp_ds = gdal.AutoCreateWarpedVRT(src_ds, None, dst_sr.ExportToWkt(), 
                                           gdal.GRA_Bilinear, 0.125)
         
+        if self.tiled:
+            # the warped VRT is used directly, the image is reprojected 
+            # chunk-wise when the data is read
+            copy_metadata(src_ds, tmp_ds)
+            return tmp_ds
+        
         # create the output dataset
         dst_ds = create_mem(tmp_ds.RasterXSize, tmp_ds.RasterYSize,
                             src_ds.RasterCount, 
@@ -126,9 +136,13 @@ class BandSelectionOptimization(DatasetOptimization):
         self.datatype = datatype
         
     def __call__(self, src_ds):
-        dst_ds = create_mem(src_ds.RasterXSize, src_ds.RasterYSize, 
-                            len(self.bands), self.datatype)
+        dst_ds = self.create_dataset(src_ds.RasterXSize, src_ds.RasterYSize, 
+                                     len(self.bands), self.datatype)
         dst_range = get_limits(self.datatype)
+        dst_type = gdal_array.codes[self.datatype]
+        
+        # the datasets must not be accessed concurrently
+        lock = Lock()
         
         multiple = 0
         
@@ -141,16 +155,26 @@ class BandSelectionOptimization(DatasetOptimization):
             if src_index > src_ds.RasterCount:
                 continue
             
+            # equal bands are written at once
+            dst_bands = [dst_ds.GetRasterBand(dst_index - i)
+                         for i in range(multiple + 1)]
+            multiple = 0
+            
             # initialize with zeros if band is 0
             if src_index == 0:
-                src_band = src_ds.GetRasterBand(1)
-                data = numpy.zeros((src_band.YSize, src_band.XSize), dtype=gdal_array.codes[self.datatype])
-                src_min, src_max = (0, 0)
+                def zeros(window):
+                    x, y, sizex, sizey = window
+                    data = numpy.zeros((sizey, sizex), dtype=dst_type)
+                    with lock:
+                        for dst_band in dst_bands:
+                            dst_band.WriteArray(data, x, y)
+                
+                self.process_windows(src_ds, zeros)
+                continue
+            
             # use src_ds band otherwise
-            else:
-                src_band = src_ds.GetRasterBand(src_index)
-                data = src_band.ReadAsArray()
-                src_min, src_max = src_band.ComputeRasterMinMax()
+            src_band = src_ds.GetRasterBand(src_index)
+            src_min, src_max = src_band.ComputeRasterMinMax()
             
             # get min/max values or calculate from band
             if dmin is None:
@@ -163,24 +187,25 @@ class BandSelectionOptimization(DatasetOptimization):
                 dmax = src_max
             src_range = (float(dmin), float(dmax))
             
-            # perform clipping and scaling
-            data = ((dst_range[1] - dst_range[0]) * 
-                    ((numpy.clip(data, dmin, dmax) - src_range[0]) / 
-                    (src_range[1] - src_range[0])))
+            def scale(window):
+                x, y, sizex, sizey = window
+                with lock:
+                    data = src_band.ReadAsArray(x, y, sizex, sizey)
+                
+                # perform clipping and scaling
+                data = ((dst_range[1] - dst_range[0]) * 
+                        ((numpy.clip(data, dmin, dmax) - src_range[0]) / 
+                        (src_range[1] - src_range[0])))
+                
+                # set new datatype
+                data = data.astype(dst_type)
+                
+                # write result
+                with lock:
+                    for dst_band in dst_bands:
+                        dst_band.WriteArray(data, x, y)
             
-            # set new datatype
-            data = data.astype(gdal_array.codes[self.datatype])
-            
-            # write result
-            dst_band = dst_ds.GetRasterBand(dst_index)
-            dst_band.WriteArray(data)
-            
-            # write equal bands at once
-            if multiple > 0:
-                for i in range(multiple):
-                    dst_band = dst_ds.GetRasterBand(dst_index-1-i)
-                    dst_band.WriteArray(data)
-                multiple = 0
+            self.process_windows(src_ds, scale)
         
         copy_projection(src_ds, dst_ds)
         copy_metadata(src_ds, dst_ds)
@@ -200,8 +225,8 @@ class ColorIndexOptimization(DatasetOptimization):
     
     
     def __call__(self, src_ds):
-        dst_ds = create_mem(src_ds.RasterXSize, src_ds.RasterYSize, 
-                            1, gdal.GDT_Byte)
+        dst_ds = self.create_dataset(src_ds.RasterXSize, src_ds.RasterYSize, 
+                                     1, gdal.GDT_Byte)
         
         if not self.palette_file:
             # create a color table as a median of the given dataset
@@ -315,22 +340,55 @@ class OverviewOptimization(DatasetPostOptimization):
 # AlphaBand Optimization
 #===============================================================================
 
-class AlphaBandOptimization(object):
+class AlphaBandOptimization(TiledProcessingMixIn):
     """ This optimization renders the footprint into the alpha channel of the 
-    image. """
+    image. Returns the dataset with the alpha channel. """
     
     def __call__(self, src_ds, footprint_wkt):
         dt = src_ds.GetRasterBand(1).DataType
-        if src_ds.RasterCount == 3:
-            src_ds.AddBand(dt)
-        elif src_ds.RasterCount == 4:
-            pass # okay
-        else:
+        if src_ds.RasterCount not in (3, 4):
             raise Exception("Cannot add alpha band, as the current band number "
                             "'%d' does not match" % src_ds.RasterCount)
         
+        if self.tiled:
+            return self._add_alpha_vrt(src_ds, footprint_wkt, dt)
+        
+        if src_ds.RasterCount == 3:
+            src_ds.AddBand(dt)
+        
+        self._rasterize(src_ds, 4, footprint_wkt, dt)
+        return src_ds
+    
+    
+    def _add_alpha_vrt(self, src_ds, footprint_wkt, dt):
+        """ Renders the footprint into a temporary dataset and returns a VRT
+            of the first three bands of the source dataset with the rendered 
+            footprint as fourth band.
+        """
+        alpha_ds = self.create_dataset(src_ds.RasterXSize, src_ds.RasterYSize,
+                                       1, dt)
+        copy_projection(src_ds, alpha_ds)
+        self._rasterize(alpha_ds, 1, footprint_wkt, dt)
+        alpha_ds.FlushCache()
+        
+        # the source may be a warped VRT without a file to refer to
+        src_filename = create_temp_vrt(src_ds, self.scratch_dir)
+        
+        vrt = VRTBuilder(src_ds.RasterXSize, src_ds.RasterYSize)
+        for index in range(1, 4):
+            vrt.add_band(dt)
+            vrt.add_simple_source(index, src_filename, index)
+        vrt.add_band(dt)
+        vrt.add_simple_source(4, alpha_ds.GetDescription(), 1)
+        
+        copy_projection(src_ds, vrt.dataset)
+        copy_metadata(src_ds, vrt.dataset)
+        return vrt.dataset
+    
+    
+    def _rasterize(self, ds, index, footprint_wkt, dt):
         # initialize the alpha band with zeroes (completely transparent)
-        band = src_ds.GetRasterBand(4)
+        band = ds.GetRasterBand(index)
         band.Fill(0)
         
         # set up the layer with geometry
@@ -344,6 +402,6 @@ class AlphaBandOptimization(object):
         layer.CreateFeature(feat)
         
         # rasterize the polygon, burning the opaque value into the alpha band
-        gdal.RasterizeLayer(src_ds, [4], layer, burn_values=[get_limits(dt)[1]])
+        gdal.RasterizeLayer(ds, [index], layer, burn_values=[get_limits(dt)[1]])
 
 
@@ -27,6 +27,9 @@
 #-------------------------------------------------------------------------------
 
 from os.path import exists
+from tempfile import mkstemp
+from multiprocessing.pool import ThreadPool
+import os
 import numpy
 
 from eoxserver.contrib import gdal, gdal_array
@@ -65,6 +68,111 @@ def create_mem(sizex, sizey, numbands, datatype=gdal.GDT_Byte,
     return mem_drv.Create('', sizex, sizey, numbands, datatype, options)
 
 
+def create_vrt_copy(ds):
+    """ Create a new VRT Dataset as copy from an existing dataset. The data is
+        not copied but referenced.
+    """
+    vrt_drv = gdal.GetDriverByName('VRT')
+    return vrt_drv.CreateCopy('', ds)
+
+
+def create_temp(sizex, sizey, numbands, datatype=gdal.GDT_Byte,
+                directory=None):
+    """ Create a new tiled GeoTIFF Dataset in a temporary file within the 
+        given directory. Used instead of an In-Memory Dataset when the data 
+        shall not be held in memory. The file has to be removed by the caller.
+    """
+    fd, filename = mkstemp(suffix=".tif", dir=directory)
+    os.close(fd)
+
+    gtiff_drv = gdal.GetDriverByName('GTiff')
+    return gtiff_drv.Create(filename, sizex, sizey, numbands, datatype,
+                            ["TILED=YES", "BIGTIFF=IF_SAFER"])
+
+
+def create_temp_vrt(ds, directory=None):
+    """ Write a VRT copy of the dataset to a temporary file within the given
+        directory, so that datasets without a file, like warped VRTs, can be
+        used as sources of other VRTs. The file has to be removed by the 
+        caller.
+    """
+    fd, filename = mkstemp(suffix=".vrt", dir=directory)
+    os.close(fd)
+
+    vrt_drv = gdal.GetDriverByName('VRT')
+    vrt_drv.CreateCopy(filename, ds)
+    return filename
+
+
+def iter_windows(sizex, sizey, tile_size=None):
+    """ Yields the windows (x-offset, y-offset, x-size, y-size) of the tiles 
+        covering an image of the given size. If no tile size is given, a 
+        single window covering the whole image is returned.
+    """
+    if not tile_size:
+        yield 0, 0, sizex, sizey
+        return
+
+    for y in xrange(0, sizey, tile_size):
+        for x in xrange(0, sizex, tile_size):
+            yield x, y, min(tile_size, sizex - x), min(tile_size, sizey - y)
+
+
+def process_windows(func, windows, workers=None):
+    """ Calls `func` for each of the given windows. With more than one worker,
+        the windows are processed concurrently by a pool of threads. As GDAL
+        datasets must not be accessed concurrently, `func` has to serialize
+        reading and writing data with a lock, whereas the NumPy computations
+        in between run in parallel, as NumPy releases the GIL.
+    """
+    if not workers or workers < 2:
+        for window in windows:
+            func(window)
+        return
+
+    pool = ThreadPool(workers)
+    try:
+        pool.map(func, windows, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+class TiledProcessingMixIn(object):
+    """ Mix-in for processing steps that are able to operate block-wise. When
+        a `tile_size` is set, new datasets are created as temporary files in 
+        the `scratch_dir` instead of in memory and data is processed in 
+        windows of at most `tile_size` x `tile_size` pixels, so that the 
+        memory usage is bounded by the tile size. The windows are processed
+        by the given number of `workers` threads.
+    """
+
+    tile_size = None
+    scratch_dir = None
+    workers = None
+
+    @property
+    def tiled(self):
+        return bool(self.tile_size)
+
+    def create_dataset(self, sizex, sizey, numbands, datatype=gdal.GDT_Byte):
+        """ Create a new dataset according to the processing mode. """
+        if self.tiled:
+            return create_temp(sizex, sizey, numbands, datatype,
+                               self.scratch_dir)
+        return create_mem(sizex, sizey, numbands, datatype)
+
+    def iter_windows(self, ds):
+        """ Yields the processing windows of the dataset. """
+        return iter_windows(ds.RasterXSize, ds.RasterYSize, self.tile_size)
+
+    def process_windows(self, ds, func):
+        """ Calls `func` for each processing window of the dataset, using the
+            configured number of workers. See :func:`process_windows`.
+        """
+        return process_windows(func, self.iter_windows(ds), self.workers)
+
+
 def copy_projection(src_ds, dst_ds):
     """ Copy the projection and geotransform from on dataset to another """
     dst_ds.SetProjection(src_ds.GetProjection())
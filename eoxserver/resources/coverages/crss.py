@@ -34,10 +34,12 @@
 import re 
 import logging
 import math
+import threading
 
 from eoxserver.contrib import osr
 from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.decoders import config
+from eoxserver.core.util.cachetools import lru_cache
 
 
 logger = logging.getLogger(__name__)
@@ -242,7 +244,16 @@ _gerexProj4Str = re.compile(r"^\+init=epsg:(\d+)$")
 def validateEPSGCode( string ) : 
     """Check whether the given string is a valid EPSG code (True) or not (False)""" 
     try:
-        osr.SpatialReference().ImportFromEPSG(int(string)) 
+        epsg = int(string)
+    except (ValueError, TypeError): 
+        return False
+    return _validateEPSGCode( epsg ) 
+
+@lru_cache(maxsize=1024)
+def _validateEPSGCode( epsg ) : 
+    """ memoized check of an integer EPSG code """ 
+    try:
+        get_spatial_reference( epsg ) 
     except (ValueError, RuntimeError): 
         return False
     return True
@@ -279,11 +290,67 @@ def fromProj4Str( string ) :
 
 def parseEPSGCode( string , parsers ) :  
     """ parse EPSG code using provided sequence of EPSG parsers """ 
+    try: 
+        return _parseEPSGCode( string , tuple( parsers ) ) 
+    except TypeError: 
+        # unhashable input 
+        return _parseEPSGCodeUncached( string , parsers ) 
+
+@lru_cache(maxsize=1024)
+def _parseEPSGCode( string , parsers ) : 
+    """ memoized variant of the EPSG code parsing """ 
+    return _parseEPSGCodeUncached( string , parsers ) 
+
+def _parseEPSGCodeUncached( string , parsers ) : 
     for parser in parsers : 
         epsg = parser( string ) 
         if epsg is not None : return epsg 
     return None 
 
+#-------------------------------------------------------------------------------
+# shared spatial reference objects 
+
+@lru_cache(maxsize=256)
+def get_spatial_reference( srid ) : 
+    """ Get the :class:`eoxserver.contrib.osr.SpatialReference` for the given
+    EPSG code. The objects are shared between all callers and threads and 
+    must therefore not be modified. Raises a ``RuntimeError`` for unknown 
+    EPSG codes. """ 
+    return osr.SpatialReference( int( srid ) , "EPSG" ) 
+
+@lru_cache(maxsize=256)
+def get_proj4( srid ) : 
+    """ Get the *proj4* definition string of the given EPSG code. """ 
+    return get_spatial_reference( srid ).ExportToProj4() 
+
+@lru_cache(maxsize=256)
+def get_wkt( srid ) : 
+    """ Get the WKT definition string of the given EPSG code. """ 
+    return get_spatial_reference( srid ).ExportToWkt() 
+
+_transformations = threading.local() 
+
+def get_transformation( src_srid , dst_srid ) : 
+    """ Get an ``osr.CoordinateTransformation`` from the source to the 
+    destination EPSG code. As the transformation objects are not thread safe,
+    they are only shared within the calling thread. """ 
+
+    try: 
+        cache = _transformations.cache 
+    except AttributeError: 
+        cache = _transformations.cache = {} 
+
+    key = ( int( src_srid ) , int( dst_srid ) ) 
+    try: 
+        return cache[key] 
+    except KeyError: 
+        transformation = osr.CoordinateTransformation( 
+            get_spatial_reference( key[0] ).sr , 
+            get_spatial_reference( key[1] ).sr 
+        ) 
+        cache[key] = transformation 
+        return transformation 
+
 #-------------------------------------------------------------------------------
 # public API 
 
@@ -363,16 +430,14 @@ def getAxesSwapper( epsg , swapAxes = None ) :
 def isProjected( epsg ) : 
     """Is the coordinate system projected (True) or Geographic (False)? """
 
-    spat_ref = osr.SpatialReference() 
-    spat_ref.ImportFromEPSG(epsg)
-    return bool( spat_ref.IsProjected() ) 
+    return bool( get_spatial_reference( epsg ).IsProjected() ) 
 
 
+@lru_cache(maxsize=256)
 def crs_bounds(srid):
     """ Get the maximum bounds of the CRS. """
 
-    srs = osr.SpatialReference()
-    srs.ImportFromEPSG(srid)
+    srs = get_spatial_reference(srid)
         
     if srs.IsGeographic():
         return (-180.0, -90.0, 180.0, 90.0)
@@ -389,10 +454,7 @@ def crs_bounds(srid):
 def crs_tolerance(srid):
     """ Get the "tolerance" of the CRS """
 
-    srs = osr.SpatialReference()
-    srs.ImportFromEPSG(srid)
-        
-    if srs.IsGeographic():
+    if get_spatial_reference(srid).IsGeographic():
         return 1e-8
     else:
         return 1e-2
@@ -0,0 +1,59 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Martin Paces <martin.paces@eox.at>
+#          Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+
+from django.core.management.base import CommandError, BaseCommand
+
+from eoxserver.resources.coverages import models
+from eoxserver.resources.coverages.management.commands import (
+    CommandOutputMixIn, nested_commit_on_success
+)
+
+
+class Command(CommandOutputMixIn, BaseCommand):
+
+    args = ""
+
+    help = """
+        Rebuild the collection closure table from the existing collection
+        relations. This is only necessary when relations were altered without
+        the model API, e.g: by bulk deletions or by database upgrades.
+    """
+
+    @nested_commit_on_success
+    def handle(self, *args, **kwargs):
+        try:
+            models.CollectionClosure.objects.rebuild()
+        except Exception as e:
+            self.print_traceback(e, kwargs)
+            raise CommandError("Rebuilding the closure failed: %s" % e)
+
+        self.print_msg(
+            "Successfully rebuilt the collection closure with %d entries."
+            % models.CollectionClosure.objects.count()
+        )
@@ -131,19 +131,21 @@ class Command(CommandOutputMixIn, BaseCommand):
                     raise CommandError(msg)
         
         try:
-            for collection, eo_object in product(collections, objects):
-                # check whether the link does not exist
-                if eo_object in collection:
-                    self.print_msg(
-                        "Unlinking: %s <-x- %s" % (collection, eo_object)
-                    )
-                    collection.remove(eo_object)
+            # re-compute the EO metadata of each collection only once
+            with models.deferred_eo_metadata_update():
+                for collection, eo_object in product(collections, objects):
+                    # check whether the link does not exist
+                    if eo_object in collection:
+                        self.print_msg(
+                            "Unlinking: %s <-x- %s" % (collection, eo_object)
+                        )
+                        collection.remove(eo_object)
 
-                else:
-                    self.print_wrn(
-                        "Collection %s does not contain %s" 
-                        % (collection, eo_object)
-                    )
+                    else:
+                        self.print_wrn(
+                            "Collection %s does not contain %s" 
+                            % (collection, eo_object)
+                        )
 
         except Exception as e:
             self.print_traceback(e, kwargs)
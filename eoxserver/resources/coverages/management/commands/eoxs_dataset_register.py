@@ -38,10 +38,11 @@ from django.contrib.gis import geos
 
 from eoxserver.core import env
 from eoxserver.contrib import gdal, osr
+from eoxserver.processing.gdal import reftools as rt
 from eoxserver.backends import models as backends
 from eoxserver.backends.component import BackendComponent
 from eoxserver.backends.cache import CacheContext
-from eoxserver.backends.access import connect
+from eoxserver.backends.access import connect, retrieve
 from eoxserver.resources.coverages import models
 from eoxserver.resources.coverages.metadata.component import MetadataComponent
 from eoxserver.resources.coverages.management.commands import (
@@ -152,6 +153,19 @@ class Command(CommandOutputMixIn, BaseCommand):
             help=("Optional. Proceed even if the linked collection "
                   "does not exist. By defualt, a missing collection " 
                   "will result in an error.")
+        ),
+
+        make_option("--rectified", dest="rectified",
+            action="store_true", default=False,
+            help=("Optional. Precompute the rectified VRT of a referenceable "
+                  "dataset and register it as data item, so that it does "
+                  "not have to be created for each request.")
+        ),
+
+        make_option("--no-overviews", dest="overviews",
+            action="store_false", default=True,
+            help=("Optional. Do not build the pyramid of warped overviews "
+                  "of the rectified VRT. Only used with `--rectified`.")
         )
     )
 
@@ -168,7 +182,7 @@ class Command(CommandOutputMixIn, BaseCommand):
         "[--begin-time <begin-time>] [--end-time <end-time>] "
         "[--coverage-type <coverage-type-name>] "
         "[--visible] [--collection <collection-id> [--collection ... ]] "
-        "[--ignore-missing-collection]"
+        "[--ignore-missing-collection] [--rectified [--no-overviews]]"
     )
 
     help = """
@@ -184,6 +198,11 @@ class Command(CommandOutputMixIn, BaseCommand):
 
         The registered dataset can optionally be directly inserted one or more
         collections.
+
+        For referenceable datasets the rectified VRT and a pyramid of warped
+        overviews can be precomputed with the `--rectified` switch. They are
+        stored next to the data and registered as additional data items with
+        the semantics "rectified" and "rectified_overviews".
     """
 
     @nested_commit_on_success
@@ -227,7 +246,7 @@ class Command(CommandOutputMixIn, BaseCommand):
             data_item.save()
             all_data_items.append(data_item)
 
-            with open(connect(data_item, cache)) as f:
+            with open(retrieve(data_item, cache)) as f:
                 content = f.read()
                 reader = metadata_component.get_reader_by_test(content)
                 if reader:
@@ -302,6 +321,12 @@ class Command(CommandOutputMixIn, BaseCommand):
                 "Type '%s' is not supported." % kwargs["coverage_type"]
             )
 
+        if kwargs["rectified"]:
+            all_data_items.extend(self._create_rectified_items(
+                retrieved_metadata["coverage_type"], all_data_items, 
+                kwargs["overviews"]
+            ))
+
         try:
             coverage = CoverageType()
             coverage.range_type = range_type
@@ -404,6 +429,46 @@ class Command(CommandOutputMixIn, BaseCommand):
         return overrides
 
 
+    def _create_rectified_items(self, coverage_type, data_items, overviews):
+        """ Precomputes the rectified VRT of a referenceable dataset and its 
+            overviews and returns them as (unsaved) data items.
+        """
+        if coverage_type != "ReferenceableDataset":
+            raise CommandError(
+                "Rectified VRTs can only be precomputed for referenceable "
+                "datasets."
+            )
+
+        band_items = filter(
+            lambda d: d.semantic.startswith("bands"), data_items
+        )
+        if len(band_items) != 1 or band_items[0].storage or band_items[0].package:
+            raise CommandError(
+                "Rectified VRTs can only be precomputed for datasets with a "
+                "single local data file."
+            )
+
+        try:
+            vrt_path, ovr_path = rt.create_persisted_rectified_vrt(
+                band_items[0].location, 
+                overview_levels=None if overviews else []
+            )
+        except Exception, e:
+            raise CommandError("Could not precompute rectified VRT: %s" % e)
+
+        items = [("rectified", vrt_path, "GDAL/VRT")]
+        if ovr_path:
+            items.append(("rectified_overviews", ovr_path, "GDAL/GTiff"))
+
+        for semantic, location, format in items:
+            data_item = backends.DataItem(
+                location=location, format=format, semantic=semantic
+            )
+            data_item.full_clean()
+            data_item.save()
+            yield data_item
+
+
     def _get_location_chain(self, items):
         """ Returns the tuple
         """
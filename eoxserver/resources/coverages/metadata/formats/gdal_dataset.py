@@ -107,9 +107,13 @@ class GDALDatasetMetadataReader(Component):
             if sr.GetAuthorityName(None) == "EPSG":
                 srid = int(sr.GetAuthorityCode(None))
 
-                # get the footprint
-                rt_prm = rt.suggest_transformer(ds)
-                fp_wkt = rt.get_footprint_wkt(ds, **rt_prm)
+                # get the footprint, reusing a persisted one for files
+                path = ds.GetDescription()
+                if gdal.VSIStatL(path) is not None:
+                    fp_wkt = rt.get_persisted_footprint_wkt(path)
+                else:
+                    rt_prm = rt.suggest_transformer(ds)
+                    fp_wkt = rt.get_footprint_wkt(ds, **rt_prm)
                 footprint = GEOSGeometry(fp_wkt, srid)
 
                 if isinstance(footprint, Polygon):
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'CollectionClosure'
+        db.create_table(u'coverages_collectionclosure', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('ancestor', self.gf('django.db.models.fields.related.ForeignKey')(related_name='descendant_links', to=orm['coverages.Collection'])),
+            ('descendant', self.gf('django.db.models.fields.related.ForeignKey')(related_name='ancestor_links', to=orm['coverages.EOObject'])),
+            ('paths', self.gf('django.db.models.fields.PositiveIntegerField')(default=1)),
+        ))
+        db.send_create_signal(u'coverages', ['CollectionClosure'])
+
+        # Adding unique constraint on 'CollectionClosure', fields ['ancestor', 'descendant']
+        db.create_unique(u'coverages_collectionclosure', ['ancestor_id', 'descendant_id'])
+
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'CollectionClosure', fields ['ancestor', 'descendant']
+        db.delete_unique(u'coverages_collectionclosure', ['ancestor_id', 'descendant_id'])
+
+        # Deleting model 'CollectionClosure'
+        db.delete_table(u'coverages_collectionclosure')
+
+
+    models = {
+        u'coverages.collection': {
+            'Meta': {'object_name': 'Collection', '_ormbases': [u'coverages.EOObject']},
+            u'eoobject_ptr': ('django.db.models.fields.related.OneToOneField', [], {'to': u"orm['coverages.EOObject']", 'unique': 'True', 'primary_key': 'True'}),
+            'eo_objects': ('django.db.models.fields.related.ManyToManyField', [], {'related_name': "'collections'", 'symmetrical': 'False', 'through': u"orm['coverages.EOObjectToCollectionThrough']", 'to': u"orm['coverages.EOObject']"})
+        },
+        u'coverages.collectionclosure': {
+            'Meta': {'unique_together': "(('ancestor', 'descendant'),)", 'object_name': 'CollectionClosure'},
+            'ancestor': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'descendant_links'", 'to': u"orm['coverages.Collection']"}),
+            'descendant': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'ancestor_links'", 'to': u"orm['coverages.EOObject']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'paths': ('django.db.models.fields.PositiveIntegerField', [], {'default': '1'})
+        },
+        u'coverages.eoobject': {
+            'Meta': {'object_name': 'EOObject'},
+            'begin_time': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'end_time': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'footprint': ('django.contrib.gis.db.models.fields.MultiPolygonField', [], {'null': 'True', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'identifier': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '256'}),
+            'real_content_type': ('django.db.models.fields.PositiveSmallIntegerField', [], {})
+        },
+        u'coverages.eoobjecttocollectionthrough': {
+            'Meta': {'object_name': 'EOObjectToCollectionThrough'},
+            'collection': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'coverages_set'", 'to': u"orm['coverages.Collection']"}),
+            'eo_object': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['coverages.EOObject']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'})
+        }
+    }
+
+    complete_apps = ['coverages']
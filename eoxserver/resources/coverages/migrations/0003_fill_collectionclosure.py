@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import DataMigration
+from django.db import models
+
+
+class Migration(DataMigration):
+
+    def forwards(self, orm):
+        "Fill the collection closure from the existing collection relations."
+        children = {}
+        for collection_id, eo_object_id in \
+                orm['coverages.EOObjectToCollectionThrough'].objects.values_list(
+                    "collection", "eo_object"):
+            children.setdefault(collection_id, []).append(eo_object_id)
+
+        paths_cache = {}
+
+        def paths_from(collection_id):
+            # count the paths to all descendants of a collection
+            if collection_id not in paths_cache:
+                paths = {}
+                for child_id in children.get(collection_id, ()):
+                    paths[child_id] = paths.get(child_id, 0) + 1
+                    for descendant_id, count in paths_from(child_id).items():
+                        paths[descendant_id] = (
+                            paths.get(descendant_id, 0) + count
+                        )
+                paths_cache[collection_id] = paths
+            return paths_cache[collection_id]
+
+        CollectionClosure = orm['coverages.CollectionClosure']
+        CollectionClosure.objects.all().delete()
+        CollectionClosure.objects.bulk_create([
+            CollectionClosure(
+                ancestor_id=collection_id, descendant_id=descendant_id,
+                paths=count
+            )
+            for collection_id in children
+            for descendant_id, count in paths_from(collection_id).items()
+        ])
+
+    def backwards(self, orm):
+        "The closure table is dropped by the preceding schema migration."
+        orm['coverages.CollectionClosure'].objects.all().delete()
+
+    models = {
+        u'coverages.collection': {
+            'Meta': {'object_name': 'Collection', '_ormbases': [u'coverages.EOObject']},
+            u'eoobject_ptr': ('django.db.models.fields.related.OneToOneField', [], {'to': u"orm['coverages.EOObject']", 'unique': 'True', 'primary_key': 'True'}),
+            'eo_objects': ('django.db.models.fields.related.ManyToManyField', [], {'related_name': "'collections'", 'symmetrical': 'False', 'through': u"orm['coverages.EOObjectToCollectionThrough']", 'to': u"orm['coverages.EOObject']"})
+        },
+        u'coverages.collectionclosure': {
+            'Meta': {'unique_together': "(('ancestor', 'descendant'),)", 'object_name': 'CollectionClosure'},
+            'ancestor': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'descendant_links'", 'to': u"orm['coverages.Collection']"}),
+            'descendant': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'ancestor_links'", 'to': u"orm['coverages.EOObject']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'paths': ('django.db.models.fields.PositiveIntegerField', [], {'default': '1'})
+        },
+        u'coverages.eoobject': {
+            'Meta': {'object_name': 'EOObject'},
+            'begin_time': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'end_time': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'footprint': ('django.contrib.gis.db.models.fields.MultiPolygonField', [], {'null': 'True', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'identifier': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '256'}),
+            'real_content_type': ('django.db.models.fields.PositiveSmallIntegerField', [], {})
+        },
+        u'coverages.eoobjecttocollectionthrough': {
+            'Meta': {'object_name': 'EOObjectToCollectionThrough'},
+            'collection': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'coverages_set'", 'to': u"orm['coverages.Collection']"}),
+            'eo_object': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['coverages.EOObject']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'})
+        }
+    }
+
+    complete_apps = ['coverages']
+    symmetrical = True
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding field 'EOObject.modified'
+        db.add_column(u'coverages_eoobject', 'modified',
+                      self.gf('django.db.models.fields.DateTimeField')(auto_now=True, default=datetime.datetime.now, blank=True),
+                      keep_default=False)
+
+
+    def backwards(self, orm):
+        # Deleting field 'EOObject.modified'
+        db.delete_column(u'coverages_eoobject', 'modified')
+
+
+    models = {
+        u'coverages.collection': {
+            'Meta': {'object_name': 'Collection', '_ormbases': [u'coverages.EOObject']},
+            u'eoobject_ptr': ('django.db.models.fields.related.OneToOneField', [], {'to': u"orm['coverages.EOObject']", 'unique': 'True', 'primary_key': 'True'}),
+            'eo_objects': ('django.db.models.fields.related.ManyToManyField', [], {'related_name': "'collections'", 'symmetrical': 'False', 'through': u"orm['coverages.EOObjectToCollectionThrough']", 'to': u"orm['coverages.EOObject']"})
+        },
+        u'coverages.collectionclosure': {
+            'Meta': {'unique_together': "(('ancestor', 'descendant'),)", 'object_name': 'CollectionClosure'},
+            'ancestor': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'descendant_links'", 'to': u"orm['coverages.Collection']"}),
+            'descendant': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'ancestor_links'", 'to': u"orm['coverages.EOObject']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'paths': ('django.db.models.fields.PositiveIntegerField', [], {'default': '1'})
+        },
+        u'coverages.eoobject': {
+            'Meta': {'object_name': 'EOObject'},
+            'begin_time': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'end_time': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'footprint': ('django.contrib.gis.db.models.fields.MultiPolygonField', [], {'null': 'True', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'identifier': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '256'}),
+            'modified': ('django.db.models.fields.DateTimeField', [], {'auto_now': 'True', 'blank': 'True'}),
+            'real_content_type': ('django.db.models.fields.PositiveSmallIntegerField', [], {})
+        },
+        u'coverages.eoobjecttocollectionthrough': {
+            'Meta': {'object_name': 'EOObjectToCollectionThrough'},
+            'collection': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'coverages_set'", 'to': u"orm['coverages.Collection']"}),
+            'eo_object': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['coverages.EOObject']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'})
+        }
+    }
+
+    complete_apps = ['coverages']
@@ -28,17 +28,23 @@
 #-------------------------------------------------------------------------------
 
 import logging
+import threading
 from itertools import chain
+from contextlib import contextmanager
 
 from django.core.exceptions import ValidationError
 from django.contrib.gis.db import models
+from django.db.models import F
+from django.db.models.signals import pre_delete, post_delete
 from django.utils.timezone import now
 
 from eoxserver.core import models as base
 from eoxserver.contrib import gdal, osr
+from eoxserver.resources.coverages import crss
 from eoxserver.backends import models as backends
 from eoxserver.resources.coverages.util import (
-    detect_circular_reference, collect_eo_metadata, is_same_grid
+    collect_eo_metadata, extend_eo_metadata, is_eo_metadata_extension,
+    is_same_grid
 )
 
 
@@ -59,6 +65,40 @@ def iscollection(eo_object):
     return issubclass(eo_object.real_type, Collection)
 
 
+_deferred_updates = threading.local()
+
+
+@contextmanager
+def deferred_eo_metadata_update():
+    """ Context manager to defer full re-computations of the EO metadata of
+    collections, e.g: when removing many objects. Each affected collection is
+    only updated once, when the outermost context is left.
+    """
+
+    pending = getattr(_deferred_updates, "pending", None)
+    if pending is not None:
+        # already deferred by an outer context
+        yield
+        return
+
+    _deferred_updates.pending = pending = []
+    try:
+        yield
+    finally:
+        _deferred_updates.pending = None
+
+    seen = set()
+    for pk in pending:
+        if pk in seen:
+            continue
+        seen.add(pk)
+        try:
+            collection = Collection.objects.get(pk=pk)
+        except Collection.DoesNotExist:
+            continue
+        collection.update_eo_metadata()
+
+
 #===============================================================================
 # Metadata classes
 #===============================================================================
@@ -100,10 +140,12 @@ class Extent(models.Model):
 
     @property
     def spatial_reference(self):
+        """ Returns the osr.SpatialReference of this object. For objects with
+            a SRID the shared instance of the CRS is returned, which must not
+            be modified.
+        """
         if self.srid is not None:
-            sr = osr.SpatialReference()
-            sr.ImportFromEPSG(self.srid)
-            return sr
+            return crss.get_spatial_reference(self.srid)
         else:
             return self.projection.spatial_reference
     
@@ -175,6 +217,9 @@ class EOObject(base.Castable, EOMetadata):
 
     identifier = models.CharField(max_length=256, unique=True, null=False, blank=False)
 
+    # time of the last modification of the object or of its contents
+    modified = models.DateTimeField(auto_now=True)
+
     # this field is required to be named 'real_content_type'
     real_content_type = models.PositiveSmallIntegerField()
     type_registry = EO_OBJECT_TYPE_REGISTRY
@@ -199,8 +244,19 @@ class EOObject(base.Castable, EOMetadata):
             or self._original_end_time != self.end_time
             or self._original_footprint != self.footprint):
 
+            # if the metadata was only extended, the collections can be
+            # extended as well, otherwise they need to be fully recomputed
+            extended = is_eo_metadata_extension(
+                (self._original_begin_time, self._original_end_time,
+                 self._original_footprint),
+                (self.begin_time, self.end_time, self.footprint)
+            )
+
             for collection in self.collections.all():
-                collection.update_eo_metadata()
+                if extended:
+                    collection.extend_eo_metadata(self)
+                else:
+                    collection.update_eo_metadata()
 
         # set the new values for subsequent calls to `save()`
         self._original_begin_time = self.begin_time
@@ -513,6 +569,9 @@ class Collection(EOObject):
 
     eo_objects = models.ManyToManyField(EOObject, through="EOObjectToCollectionThrough", related_name="collections")
 
+    # whether the footprint is reduced to the bounding box of the contents
+    eo_metadata_bbox = False
+
     objects = models.GeoManager()
 
     def insert(self, eo_object, through=None):
@@ -562,9 +621,39 @@ class Collection(EOObject):
         raise NotImplementedError
 
 
-    def update_eo_metadata(self):
+    def update_eo_metadata(self, exclude=None):
+        """ Recompute the EO metadata from all contained objects. Within a
+        `deferred_eo_metadata_update` context, the update is postponed.
+        """
+        pending = getattr(_deferred_updates, "pending", None)
+        if pending is not None:
+            pending.append(self.pk)
+            return
+
         logger.debug("Updating EO Metadata for %s." % self)
-        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(self.eo_objects.all())
+        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
+            self.eo_objects.all(), exclude=exclude,
+            bbox=self.real_type.eo_metadata_bbox
+        )
+        self.full_clean()
+        self.save()
+
+    def extend_eo_metadata(self, eo_object):
+        """ Incrementally extend the EO metadata by the one of the given
+        object, without re-aggregating the metadata of all contained objects.
+        """
+        begin_time, end_time, footprint = extend_eo_metadata(
+            self.begin_time, self.end_time, self.footprint, [eo_object],
+            bbox=self.real_type.eo_metadata_bbox
+        )
+
+        if (begin_time, end_time, footprint) == self.time_extent + (self.footprint,):
+            return
+
+        logger.debug("Extending EO Metadata for %s." % self)
+        self.begin_time, self.end_time, self.footprint = (
+            begin_time, end_time, footprint
+        )
         self.full_clean()
         self.save()
 
@@ -578,16 +667,10 @@ class Collection(EOObject):
         if not isinstance(eo_object, EOObject):
             raise ValueError("Expected EOObject.")
 
-        if self.eo_objects.filter(pk=eo_object.pk).exists():
-            return True
-
         if recursive:
-            for collection in self.eo_objects.filter(collection__isnull=False):
-                collection = collection.cast()
-                if collection.contains(eo_object, recursive):
-                    return True
+            return CollectionClosure.objects.is_ancestor(self.pk, eo_object.pk)
 
-        return False
+        return self.eo_objects.filter(pk=eo_object.pk).exists()
 
 
     def __contains__(self, eo_object):
@@ -598,8 +681,7 @@ class Collection(EOObject):
         return iter(self.eo_objects.all())
 
     def iter_cast(self, recursive=False):
-        for eo_object in self.eo_objects.all():
-            eo_object = eo_object.cast()
+        for eo_object in base.iter_cast(self.eo_objects.all()):
             yield eo_object
             if recursive and iscollection(eo_object):
                 for item in eo_object.iter_cast(recursive):
@@ -637,19 +719,28 @@ class EOObjectToCollectionThrough(models.Model):
 
 
     def save(self, *args, **kwargs):
-        if (self._original_eo_object is not None 
+        is_new = self.pk is None
+        altered = (
+            self._original_eo_object is not None 
             and self._original_collection is not None
             and (self._original_eo_object != self.eo_object
-                 or self._original_collection != self.collection)):
-            logger.debug("Relation has been altered!")
-            self._original_collection.remove(self._original_eo_object, self)
-
-        def getter(eo_object):
-            return eo_object.collections.all()
+                 or self._original_collection != self.collection)
+        )
 
-        if detect_circular_reference(self.eo_object, self.collection, getter):
+        # check before anything is altered, the old relation cannot be part
+        # of a path from the object to the collection
+        if (self.eo_object.pk == self.collection.pk
+                or CollectionClosure.objects.is_ancestor(
+                    self.eo_object.pk, self.collection.pk)):
             raise ValidationError("Circular reference detected.")
 
+        if altered:
+            logger.debug("Relation has been altered!")
+            self._original_collection.remove(self._original_eo_object, self)
+            CollectionClosure.objects.remove_relation(
+                self._original_eo_object.pk, self._original_collection.pk
+            )
+
         # perform the insertion
         # TODO: this is a bit buggy, as the insertion cannot be aborted this way
         # but if the insertion is *before* the save, then EO metadata collecting
@@ -658,6 +749,15 @@ class EOObjectToCollectionThrough(models.Model):
 
         super(EOObjectToCollectionThrough, self).save(*args, **kwargs)
 
+        if is_new or altered:
+            CollectionClosure.objects.add_relation(
+                self.eo_object.pk, self.collection.pk
+            )
+            touched = [self.collection.pk]
+            if altered:
+                touched.append(self._original_collection.pk)
+            EOObject.objects.filter(pk__in=touched).update(modified=now())
+
         self._original_eo_object = self.eo_object
         self._original_collection = self.collection
 
@@ -665,6 +765,8 @@ class EOObjectToCollectionThrough(models.Model):
     def delete(self, *args, **kwargs):
         # TODO: pre-remove method? (maybe to cancel remove?)
         logger.debug("Deleting relation model between for %s and %s." % (self.collection, self.eo_object))
+        # the closure is maintained by the signal handlers below, which are
+        # also called for bulk and cascading deletions
         result =  super(EOObjectToCollectionThrough, self).delete(*args, **kwargs)
         self.collection.remove(self.eo_object, self)
         return result
@@ -676,6 +778,160 @@ class EOObjectToCollectionThrough(models.Model):
         verbose_name_plural = "EO Object to Collection Relations"
 
 
+def _remove_closure_relation(sender, instance, **kwargs):
+    # the closure has to be updated before the relations are deleted, as a
+    # cascading deletion may also delete closure entries in use
+    CollectionClosure.objects.remove_relation(
+        instance.eo_object_id, instance.collection_id
+    )
+
+
+def _touch_collection(sender, instance, **kwargs):
+    EOObject.objects.filter(pk=instance.collection_id).update(modified=now())
+
+pre_delete.connect(
+    _remove_closure_relation, sender=EOObjectToCollectionThrough,
+    dispatch_uid="eoxs_collection_closure_delete"
+)
+post_delete.connect(
+    _touch_collection, sender=EOObjectToCollectionThrough,
+    dispatch_uid="eoxs_collection_touch_delete"
+)
+
+
+class CollectionClosureManager(models.Manager):
+    """ Model manager to maintain the `CollectionClosure` table.
+    """
+
+    def is_ancestor(self, ancestor_id, descendant_id):
+        """ Check whether the collection with the given ID directly or
+        indirectly contains the EO object with the given ID.
+        """
+        return self.filter(
+            ancestor=ancestor_id, descendant=descendant_id
+        ).exists()
+
+    def descendant_ids(self, ancestor_ids):
+        """ Returns a set of IDs of all EO objects that are directly or
+        indirectly contained in the collections with the given IDs.
+        """
+        return set(self.filter(
+            ancestor__in=ancestor_ids
+        ).values_list("descendant", flat=True))
+
+    def add_relation(self, eo_object_id, collection_id):
+        """ Update the closure for a newly inserted relation. """
+        self._adjust(eo_object_id, collection_id, 1)
+
+    def remove_relation(self, eo_object_id, collection_id):
+        """ Update the closure for a removed relation. """
+        self._adjust(eo_object_id, collection_id, -1)
+
+    def rebuild(self):
+        """ Rebuild the whole closure table from the collection relations.
+        """
+        children = {}
+        for collection_id, eo_object_id in \
+                EOObjectToCollectionThrough.objects.values_list(
+                    "collection", "eo_object"):
+            children.setdefault(collection_id, []).append(eo_object_id)
+
+        paths_cache = {}
+
+        def paths_from(collection_id):
+            # count the paths to all descendants of a collection
+            if collection_id not in paths_cache:
+                paths = {}
+                for child_id in children.get(collection_id, ()):
+                    paths[child_id] = paths.get(child_id, 0) + 1
+                    for descendant_id, count in paths_from(child_id).items():
+                        paths[descendant_id] = (
+                            paths.get(descendant_id, 0) + count
+                        )
+                paths_cache[collection_id] = paths
+            return paths_cache[collection_id]
+
+        self.all().delete()
+        self.bulk_create([
+            CollectionClosure(
+                ancestor_id=collection_id, descendant_id=descendant_id,
+                paths=count
+            )
+            for collection_id in children
+            for descendant_id, count in paths_from(collection_id).items()
+        ])
+
+    def _adjust(self, eo_object_id, collection_id, sign):
+        # all ancestors of the collection and all descendants of the object
+        # with the number of paths leading to/from them
+        ancestors = dict(self.filter(
+            descendant=collection_id
+        ).values_list("ancestor", "paths"))
+        ancestors[collection_id] = 1
+
+        descendants = dict(self.filter(
+            ancestor=eo_object_id
+        ).values_list("descendant", "paths"))
+        descendants[eo_object_id] = 1
+
+        deltas = dict(
+            ((ancestor_id, descendant_id), ancestor_paths * descendant_paths)
+            for ancestor_id, ancestor_paths in ancestors.items()
+            for descendant_id, descendant_paths in descendants.items()
+        )
+
+        existing = dict(
+            ((ancestor_id, descendant_id), (pk, paths))
+            for pk, ancestor_id, descendant_id, paths in self.filter(
+                ancestor__in=ancestors.keys(),
+                descendant__in=descendants.keys()
+            ).values_list("pk", "ancestor", "descendant", "paths")
+        )
+
+        # group the updates by their delta to use as few queries as possible
+        updates = {}
+        deleted = []
+        created = []
+        for key, delta in deltas.items():
+            if key in existing:
+                pk, paths = existing[key]
+                if paths + sign * delta <= 0:
+                    deleted.append(pk)
+                else:
+                    updates.setdefault(sign * delta, []).append(pk)
+            elif sign > 0:
+                created.append(CollectionClosure(
+                    ancestor_id=key[0], descendant_id=key[1], paths=delta
+                ))
+
+        for delta, pks in updates.items():
+            self.filter(pk__in=pks).update(paths=F("paths") + delta)
+        if deleted:
+            self.filter(pk__in=deleted).delete()
+        if created:
+            self.bulk_create(created)
+
+
+class CollectionClosure(models.Model):
+    """ Closure table of the transitive containment relation of collections.
+    Each entry links a collection to an EO object it directly or indirectly
+    contains, along with the number of distinct paths between them. The table
+    is maintained by `EOObjectToCollectionThrough` and allows to query all
+    contents of a collection hierarchy with a single query.
+    """
+
+    ancestor = models.ForeignKey(Collection, related_name="descendant_links")
+    descendant = models.ForeignKey(EOObject, related_name="ancestor_links")
+    paths = models.PositiveIntegerField(default=1)
+
+    objects = CollectionClosureManager()
+
+    class Meta:
+        unique_together = (("ancestor", "descendant"),)
+        verbose_name = "Collection Closure"
+        verbose_name_plural = "Collection Closures"
+
+
 #===============================================================================
 # Actual Coverage and Collections
 #===============================================================================
@@ -738,21 +994,13 @@ class RectifiedStitchedMosaic(Coverage, Collection):
                 "Stitched Mosaic '%s'."  % (rectified_dataset, self.identifier)
             )
 
-        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
-            self.eo_objects.all(), insert=[eo_object]
-        )
         # TODO: recalculate size and extent!
-        self.full_clean()
-        self.save()
+        self.extend_eo_metadata(eo_object)
         return
 
     def perform_removal(self, eo_object):
-        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
-            self.eo_objects.all(), exclude=[eo_object]
-        )
         # TODO: recalculate size and extent!
-        self.full_clean()
-        self.save()
+        self.update_eo_metadata(exclude=[eo_object])
         return
 
 EO_OBJECT_TYPE_REGISTRY[20] = RectifiedStitchedMosaic
@@ -763,6 +1011,8 @@ class DatasetSeries(Collection):
         collections.
     """
 
+    eo_metadata_bbox = True
+
     objects = models.GeoManager()
 
     class Meta:
@@ -771,19 +1021,11 @@ class DatasetSeries(Collection):
 
 
     def perform_insertion(self, eo_object, through=None):
-        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
-            self.eo_objects.all(), insert=[eo_object], bbox=True
-        )
-        self.full_clean()
-        self.save()
+        self.extend_eo_metadata(eo_object)
         return
 
     def perform_removal(self, eo_object):
-        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
-            self.eo_objects.all(), exclude=[eo_object], bbox=True
-        )
-        self.full_clean()
-        self.save()
+        self.update_eo_metadata(exclude=[eo_object])
         return
 
 EO_OBJECT_TYPE_REGISTRY[30] = DatasetSeries
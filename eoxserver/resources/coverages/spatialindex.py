@@ -0,0 +1,485 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+
+""" This module provides an in-process index of the footprint bounding boxes
+    and time spans of all EO objects. It is used to pre-select candidates for
+    spatio-temporal queries, which is especially beneficial for database
+    backends without a usable spatial index, like SpatiaLite.
+"""
+
+import logging
+import threading
+from math import ceil
+from time import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from django.db.models import Count, Max
+from django.db.models.signals import post_save, post_delete
+
+from eoxserver.core.decoders import config
+from eoxserver.core.util.timetools import to_timestamp
+from eoxserver.resources.coverages.models import EOObject
+
+
+logger = logging.getLogger(__name__)
+
+
+class SpatialIndexConfigReader(config.Reader):
+    config.section("resources.coverages")
+    spatial_index = config.Option(type=bool, default=False)
+    spatial_index_check_interval = config.Option(type=float, default=5.0)
+    spatial_index_max_candidates = config.Option(type=int, default=900)
+
+
+# indices of the columns of the tree arrays
+MIN_X, MIN_Y, MAX_X, MAX_Y, BEGIN_MIN, BEGIN_MAX, END_MIN, END_MAX = range(8)
+
+
+class STRTree(object):
+    """ Static R-tree over the bounding boxes and time spans of objects
+        identified by integer IDs. The tree is bulk loaded with the
+        Sort-Tile-Recursive algorithm: the objects are sorted into tiles along
+        the X and Y axes and, within these, by their begin time, which keeps
+        dense time series compact. Each level of the tree is stored as a NumPy
+        array holding the aggregated bounds of its nodes, so that queries are
+        evaluated for whole levels at once.
+
+        Missing values (for objects without a footprint or time span) are
+        expressed as NaN and never match a condition on that value.
+    """
+
+    def __init__(self, ids, extents, begin_times, end_times,
+                 node_capacity=16):
+        ids = numpy.asarray(ids, dtype=numpy.int64)
+        extents = numpy.asarray(extents, dtype=float).reshape(-1, 4)
+        begin_times = numpy.asarray(begin_times, dtype=float)
+        end_times = numpy.asarray(end_times, dtype=float)
+
+        self._node_capacity = node_capacity
+
+        order = self._str_order(extents, begin_times, node_capacity)
+        entries = numpy.empty((len(ids), 8))
+        entries[:, MIN_X:MAX_Y + 1] = extents[order]
+        entries[:, BEGIN_MIN] = entries[:, BEGIN_MAX] = begin_times[order]
+        entries[:, END_MIN] = entries[:, END_MAX] = end_times[order]
+
+        self._ids = ids[order]
+
+        levels = [entries]
+        while len(levels[-1]) > node_capacity:
+            levels.append(self._pack(levels[-1], node_capacity))
+        levels.reverse()
+        self._levels = levels
+
+
+    def __len__(self):
+        return len(self._ids)
+
+
+    @property
+    def ids(self):
+        """ Returns the IDs of all objects in the tree.
+        """
+        return self._ids
+
+
+    @staticmethod
+    def _str_order(extents, begin_times, node_capacity):
+        """ Returns the Sort-Tile-Recursive order of the objects.
+        """
+        count = len(extents)
+        if not count:
+            return numpy.arange(0)
+
+        leaves = -(-count // node_capacity)
+        slices = max(1, int(ceil(leaves ** (1 / 3.0))))
+
+        center_x = (extents[:, MIN_X] + extents[:, MAX_X]) / 2
+        center_y = (extents[:, MIN_Y] + extents[:, MAX_Y]) / 2
+
+        # divide the objects into vertical slabs along the X axis
+        slab_x = numpy.empty(count, dtype=int)
+        slab_x[numpy.argsort(center_x, kind="mergesort")] = (
+            numpy.arange(count) * slices // count
+        )
+
+        # divide each vertical slab into tiles along the Y axis
+        order = numpy.lexsort((center_y, slab_x))
+        sizes = numpy.bincount(slab_x, minlength=slices)
+        starts = numpy.cumsum(sizes) - sizes
+        rank = numpy.empty(count, dtype=int)
+        rank[order] = numpy.arange(count) - starts[slab_x[order]]
+        tile_y = rank * slices // sizes[slab_x]
+
+        # sort the objects within the tiles by time
+        return numpy.lexsort((begin_times, tile_y, slab_x))
+
+
+    @staticmethod
+    def _pack(children, node_capacity):
+        """ Creates the parent level of the given level by aggregating the
+            bounds of groups of `node_capacity` children.
+        """
+        starts = numpy.arange(0, len(children), node_capacity)
+        nodes = numpy.empty((len(starts), 8))
+        lower = [MIN_X, MIN_Y, BEGIN_MIN, END_MIN]
+        upper = [MAX_X, MAX_Y, BEGIN_MAX, END_MAX]
+        # fmin/fmax ignore NaNs unless all values are NaN
+        nodes[:, lower] = numpy.fmin.reduceat(children[:, lower], starts)
+        nodes[:, upper] = numpy.fmax.reduceat(children[:, upper], starts)
+        return nodes
+
+
+    def query(self, intersects=(), within=None, begin_max=None,
+              end_min=None, end_max=None, begin_min=None):
+        """ Returns an array with the IDs of all objects whose bounding box
+            intersects all boxes of `intersects` and lies within the box
+            `within` (boxes are given as (min_x, min_y, max_x, max_y) tuples),
+            whose begin time lies within `begin_min` and `begin_max` and whose
+            end time lies within `end_min` and `end_max` (all POSIX
+            timestamps). All conditions are optional.
+        """
+        if not len(self._ids):
+            return self._ids
+
+        capacity = self._node_capacity
+        indices = numpy.arange(len(self._levels[0]))
+        last = len(self._levels) - 1
+
+        for depth, level in enumerate(self._levels):
+            if depth > 0:
+                # descend to the children of the remaining nodes
+                indices = (
+                    indices[:, numpy.newaxis] * capacity
+                    + numpy.arange(capacity)
+                ).ravel()
+                indices = indices[indices < len(level)]
+
+            mask = self._mask(
+                level[indices], intersects, within, begin_max, end_min,
+                end_max, begin_min, depth == last
+            )
+            indices = indices[mask]
+
+            if not len(indices):
+                break
+
+        return self._ids[indices]
+
+
+    @staticmethod
+    def _mask(bounds, intersects, within, begin_max, end_min, end_max,
+              begin_min, leaf):
+        mask = numpy.ones(len(bounds), dtype=bool)
+
+        boxes = list(intersects)
+        if within is not None and not leaf:
+            # inner nodes only need to intersect the containing box
+            boxes.append(within)
+
+        with numpy.errstate(invalid="ignore"):
+            for min_x, min_y, max_x, max_y in boxes:
+                mask &= (
+                    (bounds[:, MIN_X] <= max_x) & (bounds[:, MAX_X] >= min_x) &
+                    (bounds[:, MIN_Y] <= max_y) & (bounds[:, MAX_Y] >= min_y)
+                )
+
+            if within is not None and leaf:
+                min_x, min_y, max_x, max_y = within
+                mask &= (
+                    (bounds[:, MIN_X] >= min_x) & (bounds[:, MAX_X] <= max_x) &
+                    (bounds[:, MIN_Y] >= min_y) & (bounds[:, MAX_Y] <= max_y)
+                )
+
+            if begin_max is not None:
+                mask &= bounds[:, BEGIN_MIN] <= begin_max
+            if begin_min is not None:
+                mask &= bounds[:, BEGIN_MAX] >= begin_min
+            if end_min is not None:
+                mask &= bounds[:, END_MAX] >= end_min
+            if end_max is not None:
+                mask &= bounds[:, END_MIN] <= end_max
+
+        return mask
+
+
+def _entry(footprint, begin_time, end_time):
+    """ Returns the index entry for the given EO metadata.
+    """
+    if footprint is None:
+        extent = (float("nan"),) * 4
+    else:
+        extent = footprint.extent
+    return extent, to_timestamp(begin_time), to_timestamp(end_time)
+
+
+class SpatialIndex(object):
+    """ Index of the footprint bounding boxes and time spans of all EO
+        objects of the database.
+
+        The index is built on first use. Changes made within this process are
+        applied immediately via model signals. Changes made by other
+        processes are detected by checking the number of EO objects and their
+        latest modification time at most every `check_interval` seconds.
+        Changes are collected in a small overlay, which is merged into a
+        newly built tree once it grows too large.
+
+        The index only pre-selects candidates, the exact conditions still
+        have to be checked by the caller.
+    """
+
+    def __init__(self, check_interval=5.0, node_capacity=16):
+        self._check_interval = check_interval
+        self._node_capacity = node_capacity
+
+        # protects the state below, the refresh lock serializes refreshs
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+        self._tree = None
+        self._sorted_ids = None
+        self._overlay = {}
+        self._overlay_tree = None
+        self._removed = set()
+        self._modified = None
+        self._next_check = 0
+
+
+    def query(self, **kwargs):
+        """ Returns the set of primary keys of all EO objects possibly
+            matching the given conditions (see :meth:`STRTree.query`) along
+            with the latest modification time known to the index, or `None`
+            if the index is not available at the moment. Objects modified by
+            other processes since then are not yet reflected by the index.
+        """
+        self.refresh()
+
+        with self._lock:
+            tree = self._tree
+            if tree is None:
+                return None
+            modified = self._modified
+
+            if self._overlay and self._overlay_tree is None:
+                pks = self._overlay.keys()
+                extents, begin_times, end_times = zip(*(
+                    self._overlay[pk] for pk in pks
+                ))
+                self._overlay_tree = STRTree(
+                    pks, extents, begin_times, end_times, self._node_capacity
+                )
+            overlay_tree = self._overlay_tree
+            removed = frozenset(self._removed)
+
+        pks = set(tree.query(**kwargs).tolist())
+        pks -= removed
+        if overlay_tree is not None:
+            pks.update(overlay_tree.query(**kwargs).tolist())
+        return pks, modified
+
+
+    def refresh(self, force=False):
+        """ Builds the index or applies changes made by other processes if
+            the check interval has passed.
+        """
+        if not force and time() < self._next_check:
+            return
+
+        # let only one thread refresh the index, the others use the current
+        # state
+        if not self._refresh_lock.acquire(False):
+            return
+
+        try:
+            state = EOObject.objects.aggregate(
+                count=Count("pk"), modified=Max("modified")
+            )
+
+            if self._tree is None:
+                self._build()
+
+            elif state["modified"] is not None and (
+                    self._modified is None
+                    or state["modified"] > self._modified):
+                # apply changes made by other processes
+                changed = EOObject.objects.filter(
+                    modified__gte=self._modified
+                ) if self._modified is not None else EOObject.objects.all()
+
+                for pk, footprint, begin_time, end_time in \
+                        changed.values_list(
+                            "pk", "footprint", "begin_time", "end_time"
+                        ).iterator():
+                    self._update(pk, _entry(footprint, begin_time, end_time))
+
+                self._modified = state["modified"]
+
+            # objects were deleted by other processes or too many changes
+            # were collected: rebuild the index
+            if (len(self) != state["count"]
+                    or len(self._overlay) + len(self._removed)
+                    > max(1024, len(self._tree) // 8)):
+                self._build()
+
+            self._next_check = time() + self._check_interval
+
+        finally:
+            self._refresh_lock.release()
+
+
+    def __len__(self):
+        with self._lock:
+            if self._tree is None:
+                return 0
+            return len(self._tree) - len(self._removed) + len(self._overlay)
+
+
+    def _build(self):
+        """ Builds the tree from all EO objects of the database.
+        """
+        logger.info("Building the spatial index of EO objects.")
+        start = time()
+
+        modified = EOObject.objects.aggregate(
+            modified=Max("modified")
+        )["modified"]
+
+        pks, extents, begin_times, end_times = [], [], [], []
+        for pk, footprint, begin_time, end_time in \
+                EOObject.objects.values_list(
+                    "pk", "footprint", "begin_time", "end_time"
+                ).iterator():
+            extent, begin_time, end_time = _entry(
+                footprint, begin_time, end_time
+            )
+            pks.append(pk)
+            extents.append(extent)
+            begin_times.append(begin_time)
+            end_times.append(end_time)
+
+        tree = STRTree(
+            pks, extents, begin_times, end_times, self._node_capacity
+        )
+
+        with self._lock:
+            self._tree = tree
+            self._sorted_ids = numpy.sort(tree.ids)
+            self._overlay = {}
+            self._overlay_tree = None
+            self._removed = set()
+            self._modified = modified
+
+        logger.info(
+            "Built the spatial index of %d EO objects in %f seconds."
+            % (len(tree), time() - start)
+        )
+
+
+    def _in_tree(self, pk):
+        index = numpy.searchsorted(self._sorted_ids, pk)
+        return (
+            index < len(self._sorted_ids) and self._sorted_ids[index] == pk
+        )
+
+
+    def _update(self, pk, entry):
+        with self._lock:
+            if self._tree is None:
+                return
+            if self._in_tree(pk):
+                self._removed.add(pk)
+            self._overlay[pk] = entry
+            self._overlay_tree = None
+
+
+    def _remove(self, pk):
+        with self._lock:
+            if self._tree is None:
+                return
+            if self._in_tree(pk):
+                self._removed.add(pk)
+            if self._overlay.pop(pk, None) is not None:
+                self._overlay_tree = None
+
+
+    def update(self, eo_object):
+        """ Inserts or updates the entry of the given EO object.
+        """
+        self._update(eo_object.pk, _entry(
+            eo_object.footprint, eo_object.begin_time, eo_object.end_time
+        ))
+
+
+    def remove(self, pk):
+        """ Removes the entry with the given primary key.
+        """
+        self._remove(pk)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_spatial_index():
+    """ Returns the spatial index of this process or `None` if it is disabled
+        in the configuration or NumPy is not available.
+    """
+    global _index
+
+    reader = SpatialIndexConfigReader.from_config()
+    if not reader.spatial_index:
+        return None
+
+    if _index is None:
+        if numpy is None:
+            logger.warning(
+                "The spatial index is enabled, but NumPy is not available."
+            )
+            return None
+
+        with _index_lock:
+            if _index is None:
+                _index = SpatialIndex(reader.spatial_index_check_interval)
+    return _index
+
+
+def _update_index(sender, instance, **kwargs):
+    if _index is not None and isinstance(instance, EOObject):
+        _index.update(instance)
+
+
+def _remove_from_index(sender, instance, **kwargs):
+    if _index is not None and isinstance(instance, EOObject):
+        _index.remove(instance.pk)
+
+post_save.connect(_update_index, dispatch_uid="eoxs_spatial_index_save")
+post_delete.connect(_remove_from_index, dispatch_uid="eoxs_spatial_index_delete")
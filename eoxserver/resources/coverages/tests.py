@@ -27,21 +27,47 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
+import os
+import shutil
+import tempfile
+from array import array
+from glob import glob
 from datetime import datetime
 from StringIO import StringIO
 from textwrap import dedent
+from unittest import skipUnless
 
+import numpy
 from django.test import TestCase
 from django.core.exceptions import ValidationError
+from django.db.models.signals import post_save
 from django.contrib.gis.geos import GEOSGeometry, Polygon, MultiPolygon
 from django.utils.dateparse import parse_datetime
 from django.utils.timezone import utc
 
 from eoxserver.core import env
+from eoxserver.core.models import cast_all
+from eoxserver.core.util.rect import Rect
+from eoxserver.contrib import gdal, ogr, osr
 from eoxserver.resources.coverages.models import *
+from eoxserver.resources.coverages.models import deferred_eo_metadata_update
+from eoxserver.resources.coverages.util import is_eo_metadata_extension
 from eoxserver.resources.coverages.metadata.formats import (
     native, eoom, dimap_general
 )
+from eoxserver.resources.coverages.spatialindex import STRTree
+from eoxserver.processing.gdal import reftools
+from eoxserver.processing.preprocessing import WMSPreProcessor, process_batch
+from eoxserver.processing.preprocessing.format import get_format_selection
+from eoxserver.processing.preprocessing.footprint import FootprintExtraction
+from eoxserver.processing.preprocessing.optimization import (
+    BandSelectionOptimization, AlphaBandOptimization
+)
+from eoxserver.processing.preprocessing.util import (
+    iter_windows, create_mem, create_mem_copy, create_vrt_copy, create_temp,
+    create_temp_vrt
+)
+from eoxserver.processing.gdal.reftools import LookupGrid, METHOD_GCP
 
 
 def create(Class, **kwargs):
@@ -244,6 +270,88 @@ class ModelTests(GeometryMixIn, TestCase):
             pass
 
 
+    def test_cast_all(self):
+        identifiers = [
+            "rectified-1", "referenceable-1", "mosaic-1", "series-1",
+            "rectified-2"
+        ]
+        eo_objects = sorted(
+            EOObject.objects.filter(identifier__in=identifiers),
+            key=lambda eo_object: identifiers.index(eo_object.identifier)
+        )
+
+        with self.assertNumQueries(4):
+            cast_objects = cast_all(eo_objects)
+
+        self.assertEqual(
+            [eo_object.identifier for eo_object in cast_objects], identifiers
+        )
+        self.assertEqual(
+            map(type, cast_objects), [
+                RectifiedDataset, ReferenceableDataset,
+                RectifiedStitchedMosaic, DatasetSeries, RectifiedDataset
+            ]
+        )
+
+
+    def test_collection_closure(self):
+        rectified_1, rectified_2, mosaic, series_1, series_2 = (
+            self.rectified_1, self.rectified_2, self.mosaic, self.series_1,
+            self.series_2
+        )
+
+        mosaic.insert(rectified_1)
+        series_1.insert(mosaic)
+        series_1.insert(rectified_1)
+        series_2.insert(series_1)
+        series_2.insert(rectified_2)
+
+        def closure():
+            return sorted(
+                CollectionClosure.objects.values_list(
+                    "ancestor__identifier", "descendant__identifier", "paths"
+                )
+            )
+
+        expected = [
+            ("mosaic-1", "rectified-1", 1),
+            ("series-1", "mosaic-1", 1),
+            ("series-1", "rectified-1", 2),
+            ("series-2", "mosaic-1", 1),
+            ("series-2", "rectified-1", 2),
+            ("series-2", "rectified-2", 1),
+            ("series-2", "series-1", 1),
+        ]
+        self.assertEqual(closure(), expected)
+
+        CollectionClosure.objects.rebuild()
+        self.assertEqual(closure(), expected)
+
+        with self.assertRaises(ValidationError):
+            series_1.insert(series_2)
+
+        series_1.remove(mosaic)
+        self.assertEqual(closure(), [
+            ("mosaic-1", "rectified-1", 1),
+            ("series-1", "rectified-1", 1),
+            ("series-2", "rectified-1", 1),
+            ("series-2", "rectified-2", 1),
+            ("series-2", "series-1", 1),
+        ])
+        self.assertFalse(series_2.contains(mosaic, recursive=True))
+        self.assertTrue(series_2.contains(rectified_1, recursive=True))
+
+        # bulk deletions bypass EOObjectToCollectionThrough.delete()
+        EOObjectToCollectionThrough.objects.filter(
+            collection=series_2
+        ).delete()
+        self.assertEqual(closure(), [
+            ("mosaic-1", "rectified-1", 1),
+            ("series-1", "rectified-1", 1),
+        ])
+        self.assertFalse(series_2.contains(rectified_1, recursive=True))
+
+
     def test_insertion_failed(self):
         referenceable, mosaic = self.referenceable, self.mosaic
 
@@ -295,6 +403,123 @@ class ModelTests(GeometryMixIn, TestCase):
         self.assertEqual(series_1.end_time, new_end_time)
 
 
+    def test_eo_metadata_insertion(self):
+        rectified_1, rectified_2, mosaic, series_1 = (
+            self.rectified_1, self.rectified_2, self.mosaic, self.series_1
+        )
+
+        series_1.insert(rectified_1)
+        series_1.insert(rectified_2)
+        mosaic.insert(rectified_1)
+        mosaic.insert(rectified_2)
+
+        series_1, mosaic = refresh(series_1, mosaic)
+
+        # series merge the bounding boxes, mosaics the actual footprints
+        self.assertGeometryEqual(
+            series_1.footprint, MultiPolygon(Polygon.from_bbox(
+                union(rectified_1.footprint, rectified_2.footprint).extent
+            ))
+        )
+        self.assertGeometryEqual(
+            mosaic.footprint,
+            union(rectified_1.footprint, rectified_2.footprint)
+        )
+
+        for collection in (series_1, mosaic):
+            self.assertEqual(collection.begin_time, rectified_2.begin_time)
+            self.assertEqual(collection.end_time, rectified_1.end_time)
+
+
+    def test_eo_metadata_shrinking_save(self):
+        rectified_1, rectified_2, series_1 = (
+            self.rectified_1, self.rectified_2, self.series_1
+        )
+
+        series_1.insert(rectified_1)
+        series_1.insert(rectified_2)
+
+        # shrinking the metadata of a contained object cannot be handled
+        # incrementally, the collection has to be recomputed entirely
+        rectified_2.begin_time = parse_datetime("2013-06-11T20:00:00Z")
+        rectified_2.end_time = parse_datetime("2013-06-11T21:00:00Z")
+        rectified_2.footprint = MultiPolygon(
+            Polygon.from_bbox((-10, 0, -5, 5))
+        )
+        rectified_2.full_clean()
+        rectified_2.save()
+
+        series_1 = refresh(series_1)
+        self.assertEqual(series_1.begin_time, rectified_1.begin_time)
+        self.assertEqual(series_1.end_time, rectified_2.end_time)
+        self.assertGeometryEqual(
+            series_1.footprint, MultiPolygon(Polygon.from_bbox(
+                union(rectified_1.footprint, rectified_2.footprint).extent
+            ))
+        )
+
+
+    def test_eo_metadata_deferred_removal(self):
+        rectified_1, rectified_2, rectified_3, series_1, series_2 = (
+            self.rectified_1, self.rectified_2, self.rectified_3,
+            self.series_1, self.series_2
+        )
+
+        for series in (series_1, series_2):
+            for rectified in (rectified_1, rectified_2, rectified_3):
+                series.insert(rectified)
+
+        saved = []
+
+        def on_save(sender, instance, **kwargs):
+            if instance.pk in (series_1.pk, series_2.pk):
+                saved.append(instance.pk)
+
+        post_save.connect(on_save)
+        try:
+            with deferred_eo_metadata_update():
+                for series in (series_1, series_2):
+                    series.remove(rectified_2)
+                    series.remove(rectified_3)
+
+                # the updates are postponed until the context is left
+                self.assertEqual(saved, [])
+        finally:
+            post_save.disconnect(on_save)
+
+        self.assertEqual(sorted(saved), sorted([series_1.pk, series_2.pk]))
+
+        for series in refresh(series_1, series_2):
+            self.assertEqual(series.time_extent, rectified_1.time_extent)
+            self.assertGeometryEqual(
+                series.footprint,
+                MultiPolygon(Polygon.from_bbox(rectified_1.footprint.extent))
+            )
+
+
+    def test_is_eo_metadata_extension(self):
+        early = parse_datetime("2013-06-10T00:00:00Z")
+        late = parse_datetime("2013-06-12T00:00:00Z")
+        small = MultiPolygon(Polygon.from_bbox((0, 0, 5, 5)))
+        large = MultiPolygon(Polygon.from_bbox((0, 0, 10, 10)))
+
+        cases = (
+            ((None, None, None), (None, None, None), True),
+            ((None, None, None), (early, late, small), True),
+            ((early, late, small), (early, late, large), True),
+            ((early, None, small), (early, late, small), True),
+            ((None, late, None), (early, late, small), True),
+            ((early, late, small), (None, late, small), False),
+            ((early, late, small), (early, None, small), False),
+            ((early, late, small), (early, late, None), False),
+            ((early, late, large), (early, late, small), False),
+            ((early, late, small), (late, late, small), False),
+            ((early, late, small), (early, early, small), False),
+        )
+        for old, new, expected in cases:
+            self.assertEqual(is_eo_metadata_extension(old, new), expected)
+
+
     def test_insert_in_self_fails(self):
         series_1 = self.series_1
         with self.assertRaises(ValidationError):
@@ -481,3 +706,428 @@ class MetadataFormatTests(GeometryMixIn, TestCase):
         
 
 
+class STRTreeTestCase(TestCase):
+    def test_query(self):
+        nan = float("nan")
+        # a grid of 10x10 objects of 1x1 degrees, each spanning 10 seconds
+        extents = [
+            (x, y, x + 1, y + 1) for x in range(10) for y in range(10)
+        ] + [(nan, nan, nan, nan)]
+        begin_times = [i * 10 for i in range(100)] + [0]
+        end_times = [i * 10 + 10 for i in range(100)] + [1000]
+
+        tree = STRTree(
+            range(len(extents)), extents, begin_times, end_times,
+            node_capacity=4
+        )
+        self.assertEqual(len(tree), 101)
+
+        # objects intersecting the box touch it on the boundary
+        self.assertEqual(
+            sorted(tree.query(intersects=[(2.5, 2.5, 4, 3.5)])),
+            [22, 23, 32, 33, 42, 43]
+        )
+        self.assertEqual(
+            sorted(tree.query(within=(2.5, 2.5, 5, 4))), [33, 43]
+        )
+        self.assertEqual(
+            sorted(tree.query(
+                intersects=[(2.5, 2.5, 4, 3.5)], begin_max=230, end_min=225
+            )),
+            [22, 23]
+        )
+        self.assertEqual(
+            sorted(tree.query(begin_min=980, end_max=1000)), [98, 99]
+        )
+        self.assertEqual(len(tree.query()), 101)
+
+
+class LookupGridTestCase(TestCase):
+    def setUp(self):
+        # a 100x100 pixel image covering 10x10 degrees, with a node every 50
+        # pixels and lines
+        n = 3
+        self.grid = LookupGrid(
+            100, 100, 50, 50, n, n,
+            array("d", [i * 5.0 for j in range(n) for i in range(n)]),
+            array("d", [10 - j * 5.0 for j in range(n) for i in range(n)]),
+            osr.SpatialReference(4326).wkt, METHOD_GCP, 0
+        )
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_rect_from_subset(self):
+        grid = self.grid
+        # the subset only intersects the lower left cell
+        self.assertEqual(
+            grid.rect_from_subset(4326, 2, 2, 4, 4), Rect(0, 50, 50, 50)
+        )
+        # the subset intersects all cells
+        self.assertEqual(
+            grid.rect_from_subset(4326, 4, 4, 6, 6), Rect(0, 0, 100, 100)
+        )
+        self.assertEqual(
+            grid.rect_from_subset(4326, 20, 20, 30, 30), Rect(0, 0, 0, 0)
+        )
+
+    def test_save_load(self):
+        path = os.path.join(self.tmp_dir, "grid.tif")
+        self.grid.save(path)
+        self.assertEqual(self.grid.path, path)
+
+        loaded = LookupGrid.load(path)
+        for name in ("size_x", "size_y", "step_x", "step_y", "n_x", "n_y",
+                     "method", "order", "path"):
+            self.assertEqual(getattr(loaded, name), getattr(self.grid, name))
+        self.assertEqual(list(loaded.x), list(self.grid.x))
+        self.assertEqual(list(loaded.y), list(self.grid.y))
+        self.assertTrue(
+            osr.SpatialReference(loaded.srs, "WKT").IsSame(
+                osr.SpatialReference(self.grid.srs, "WKT")
+            )
+        )
+        # no temporary files are left behind
+        self.assertEqual(os.listdir(self.tmp_dir), ["grid.tif"])
+
+    def test_get_geolocation_vrt(self):
+        src_path = os.path.join(self.tmp_dir, "src.tif")
+        gdal.GetDriverByName("GTiff").Create(src_path, 100, 100, 1)
+        grid_path = os.path.join(self.tmp_dir, "grid.tif")
+        self.grid.save(grid_path)
+
+        vrt_path = self.grid.get_geolocation_vrt(src_path)
+        self.assertEqual(vrt_path, grid_path + ".vrt")
+        self.assertEqual(
+            gdal.Open(vrt_path).GetMetadata("GEOLOCATION")["X_DATASET"],
+            grid_path
+        )
+        # the VRT is renamed into place, no temporary files are left behind
+        self.assertEqual(
+            sorted(os.listdir(self.tmp_dir)),
+            ["grid.tif", "grid.tif.vrt", "src.tif"]
+        )
+
+
+@skipUnless(
+    reftools.is_lookup_grid_supported() and hasattr(gdal, "Warp"),
+    "reftools with lookup grid support and GDAL 2.1 or newer are required"
+)
+class PersistedRectifiedVRTTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "ref.tif")
+
+        # a 100x100 pixel image covering 10x10 degrees, with a tie-point every
+        # 25 pixels and lines
+        ds = gdal.GetDriverByName("GTiff").Create(self.path, 100, 100, 1)
+        ds.SetGCPs([
+            gdal.GCP(x / 10.0, 10 - y / 10.0, 0, x, y)
+            for x in range(0, 101, 25) for y in range(0, 101, 25)
+        ], osr.SpatialReference(4326).wkt)
+        ds = None
+
+        reftools._get_lookup_grid.cache_clear()
+
+    def tearDown(self):
+        reftools._get_lookup_grid.cache_clear()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_artifacts_reused(self):
+        vrt_path, ovr_path = reftools.create_persisted_rectified_vrt(
+            self.path, overview_levels=[]
+        )
+        self.assertEqual(vrt_path, self.path + ".eoxs_rectified_native.vrt")
+        self.assertEqual(ovr_path, None)
+        self.assertTrue(os.path.exists(vrt_path))
+
+        grid_paths = glob(self.path + ".eoxs_grid_*.tif")
+        self.assertEqual(len(grid_paths), 1)
+        inode = os.stat(grid_paths[0]).st_ino
+
+        # the stored lookup grid is reused while the dataset is unchanged
+        reftools._get_lookup_grid.cache_clear()
+        reftools.create_persisted_rectified_vrt(self.path, overview_levels=[])
+        self.assertEqual(os.stat(grid_paths[0]).st_ino, inode)
+
+        # and replaced once the dataset was modified
+        reftools._get_lookup_grid.cache_clear()
+        mtime = os.path.getmtime(self.path) + 10
+        os.utime(self.path, (mtime, mtime))
+        reftools.create_persisted_rectified_vrt(self.path, overview_levels=[])
+        self.assertNotEqual(os.stat(grid_paths[0]).st_ino, inode)
+
+        self.assertEqual(glob(os.path.join(self.tmp_dir, "*.tmp")), [])
+
+    def test_in_memory_grid_rejected(self):
+        # the lookup grid cannot be stored on disk and is kept in /vsimem/
+        save = LookupGrid.__dict__["save"]
+
+        def save_in_memory(grid, path):
+            if not path.startswith("/vsimem/"):
+                raise OSError("Read-only file system: '%s'" % path)
+            save(grid, path)
+
+        LookupGrid.save = save_in_memory
+        try:
+            self.assertRaises(
+                reftools.ReftoolsException,
+                reftools.create_persisted_rectified_vrt, self.path,
+                overview_levels=[]
+            )
+        finally:
+            LookupGrid.save = save
+
+        # the VRT referring to the in-memory grid is not kept
+        self.assertFalse(
+            os.path.exists(self.path + ".eoxs_rectified_native.vrt")
+        )
+
+
+class TiledPreProcessingTestCase(TestCase):
+    """ Compares the tiled, out-of-core mode of the pre-processing steps with
+        the in-memory mode on a small synthetic image that is not a multiple
+        of the tile size.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.scratch_dir = os.path.join(self.tmp_dir, "scratch")
+        os.mkdir(self.scratch_dir)
+
+        # a 50x30 pixel RGB image with a black (invalid) strip on the left
+        self.path = os.path.join(self.tmp_dir, "input.tif")
+        ds = gdal.GetDriverByName("GTiff").Create(self.path, 50, 30, 3)
+        ds.SetGeoTransform([10, 0.1, 0, 50, 0, -0.1])
+        ds.SetProjection(osr.SpatialReference(4326).wkt)
+        y, x = numpy.mgrid[0:30, 0:50]
+        for index in range(1, 4):
+            data = (x * 5 + y * 3 + index * 20) % 200 + 1
+            data[:, :10] = 0
+            ds.GetRasterBand(index).WriteArray(data.astype(numpy.uint8))
+        ds = None
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def configure(self, step):
+        step.tile_size = 16
+        step.scratch_dir = self.scratch_dir
+        step.workers = 2
+        return step
+
+    def assertDatasetEqual(self, a, b):
+        self.assertEqual(a.RasterCount, b.RasterCount)
+        for index in range(1, a.RasterCount + 1):
+            self.assertTrue(numpy.array_equal(
+                a.GetRasterBand(index).ReadAsArray(),
+                b.GetRasterBand(index).ReadAsArray()
+            ))
+
+    def test_iter_windows(self):
+        windows = list(iter_windows(50, 30, 16))
+        self.assertEqual(len(windows), 8)
+        self.assertEqual(windows[0], (0, 0, 16, 16))
+        # partial tiles at the right and bottom borders
+        self.assertEqual(windows[3], (48, 0, 2, 16))
+        self.assertEqual(windows[-1], (48, 16, 2, 14))
+        self.assertEqual(
+            sum(size_x * size_y for _, _, size_x, size_y in windows), 50 * 30
+        )
+        self.assertEqual(list(iter_windows(50, 30)), [(0, 0, 50, 30)])
+
+    def test_create_temp(self):
+        ds = create_temp(100, 50, 2, gdal.GDT_UInt16, self.scratch_dir)
+        path = ds.GetDescription()
+        self.assertEqual(os.path.dirname(path), self.scratch_dir)
+        self.assertTrue(path.endswith(".tif"))
+        self.assertEqual((ds.RasterXSize, ds.RasterYSize), (100, 50))
+        self.assertEqual(ds.RasterCount, 2)
+        band = ds.GetRasterBand(1)
+        self.assertEqual(band.DataType, gdal.GDT_UInt16)
+        self.assertEqual(band.GetBlockSize(), [256, 256])
+
+    def test_create_temp_vrt(self):
+        src_ds = create_vrt_copy(gdal.Open(self.path))
+        path = create_temp_vrt(src_ds, self.scratch_dir)
+        self.assertEqual(os.path.dirname(path), self.scratch_dir)
+        self.assertTrue(path.endswith(".vrt"))
+        self.assertDatasetEqual(gdal.Open(path), gdal.Open(self.path))
+
+    def test_band_selection(self):
+        # a zero band and a repeated band
+        bands = [(2, 0, 255), (0, 0, 0), (1, "min", "max"), (1, "min", "max")]
+        src_ds = gdal.Open(self.path)
+
+        expected = BandSelectionOptimization(bands)(src_ds)
+        tiled = self.configure(BandSelectionOptimization(bands))(src_ds)
+
+        self.assertEqual(
+            os.path.dirname(tiled.GetDescription()), self.scratch_dir
+        )
+        self.assertDatasetEqual(tiled, expected)
+        self.assertFalse(tiled.GetRasterBand(2).ReadAsArray().any())
+        self.assertTrue(numpy.array_equal(
+            tiled.GetRasterBand(3).ReadAsArray(),
+            tiled.GetRasterBand(4).ReadAsArray()
+        ))
+
+    def test_alpha_band(self):
+        footprint_wkt = "POLYGON((11 48,14 48,14 49.5,11 49.5,11 48))"
+
+        expected = AlphaBandOptimization()(
+            create_mem_copy(gdal.Open(self.path)), footprint_wkt
+        )
+        tiled = self.configure(AlphaBandOptimization())(
+            create_vrt_copy(gdal.Open(self.path)), footprint_wkt
+        )
+
+        self.assertEqual(tiled.GetDriver().ShortName, "VRT")
+        self.assertDatasetEqual(tiled, expected)
+        alpha = tiled.GetRasterBand(4).ReadAsArray()
+        self.assertTrue(alpha.any())
+        self.assertFalse(alpha.all())
+
+    def test_process(self):
+        def process(output_filename, **kwargs):
+            preprocessor = WMSPreProcessor(
+                get_format_selection("GTiff"), overviews=False,
+                footprint_alpha=True, **kwargs
+            )
+            return preprocessor.process(
+                self.path, os.path.join(self.tmp_dir, output_filename)
+            )
+
+        expected = process("expected.tif")
+        tiled = process(
+            "tiled.tif", tile_size=16, scratch_dir=self.scratch_dir, workers=2
+        )
+
+        self.assertEqual(tiled.num_bands, expected.num_bands)
+        self.assertDatasetEqual(
+            gdal.Open(tiled.output_filename),
+            gdal.Open(expected.output_filename)
+        )
+        self.assertTrue(
+            tiled.footprint_geom.equals_exact(expected.footprint_geom, 1e-9)
+        )
+        # the temporary files of the tiled steps are removed
+        self.assertEqual(os.listdir(self.scratch_dir), [])
+
+
+class ProcessBatchTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+        self.valid = os.path.join(self.tmp_dir, "valid.tif")
+        ds = gdal.GetDriverByName("GTiff").Create(self.valid, 20, 10, 3)
+        ds.SetGeoTransform([10, 0.1, 0, 50, 0, -0.1])
+        ds.SetProjection(osr.SpatialReference(4326).wkt)
+        for index in range(1, 4):
+            ds.GetRasterBand(index).Fill(index * 50)
+        ds = None
+
+        self.broken = os.path.join(self.tmp_dir, "broken.tif")
+        with open(self.broken, "w") as f:
+            f.write("not an image")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_process_batch(self):
+        preprocessor = WMSPreProcessor(
+            get_format_selection("GTiff"), overviews=False
+        )
+        filenames = [
+            (path, os.path.join(self.tmp_dir, "out_" + os.path.basename(path)))
+            for path in (self.valid, self.broken)
+        ]
+
+        for processes in (1, 2):
+            results = dict(
+                (input_filename, (result, error))
+                for input_filename, result, error
+                in process_batch(preprocessor, filenames, processes=processes)
+            )
+            self.assertEqual(sorted(results), sorted([self.valid, self.broken]))
+
+            # a failing file does not abort the batch
+            result, error = results[self.valid]
+            self.assertEqual(error, None)
+            self.assertEqual(result.num_bands, 3)
+            self.assertTrue(os.path.exists(result.output_filename))
+
+            result, error = results[self.broken]
+            self.assertEqual(result, None)
+            self.assertTrue(error)
+
+
+class FootprintExtractionTestCase(TestCase):
+    def extract(self, mask, gt=None, **kwargs):
+        """ Extracts the footprint of a single band dataset that is valid 
+            where the mask is set.
+        """
+        size_y, size_x = mask.shape
+        ds = create_mem(size_x, size_y, 1)
+        ds.SetGeoTransform(gt or [0, 1, 0, size_y, 0, -1])
+        ds.SetProjection(osr.SpatialReference(4326).wkt)
+        ds.GetRasterBand(1).WriteArray(mask.astype(numpy.uint8) * 255)
+        return FootprintExtraction(**kwargs)(ds)
+
+    def test_single_blob(self):
+        mask = numpy.zeros((200, 200), dtype=numpy.bool)
+        mask[23:117, 37:151] = True
+
+        # the coarse mask has cells of 8 pixels, the edges are refined to the
+        # exact pixels
+        geometry = self.extract(mask, accuracy=1, coarse_size=16)
+        self.assertEqual(geometry.GetGeometryType(), ogr.wkbPolygon)
+        self.assertEqual(geometry.GetEnvelope(), (37, 151, 83, 177))
+        self.assertEqual(geometry.GetArea(), 114 * 94)
+
+    def test_multiple_blobs(self):
+        mask = numpy.zeros((200, 200), dtype=numpy.bool)
+        mask[10:30, 10:30] = True
+        mask[120:150, 100:140] = True
+
+        # the convex hull of both blobs is returned
+        geometry = self.extract(mask, accuracy=1, coarse_size=16)
+        self.assertEqual(geometry.GetGeometryType(), ogr.wkbPolygon)
+        self.assertEqual(geometry.GetEnvelope(), (10, 140, 50, 190))
+        self.assertTrue(geometry.GetArea() > 20 * 20 + 40 * 30)
+
+    def test_partial_border_cells(self):
+        # the image size is not a multiple of the coarse cell size of 8
+        mask = numpy.ones((197, 203), dtype=numpy.bool)
+        geometry = self.extract(mask, accuracy=1, coarse_size=16)
+        self.assertEqual(geometry.GetEnvelope(), (0, 203, 0, 197))
+        self.assertEqual(geometry.GetArea(), 203 * 197)
+
+        # valid pixels only within the partial cells
+        mask = numpy.zeros((197, 203), dtype=numpy.bool)
+        mask[192:, 200:] = True
+        geometry = self.extract(mask, accuracy=1, coarse_size=16)
+        self.assertEqual(geometry.GetEnvelope(), (200, 203, 0, 5))
+        self.assertEqual(geometry.GetArea(), 3 * 5)
+
+    def test_geotransform(self):
+        # the mask cells of 4x4 pixels are aligned to the image pixels
+        mask = numpy.zeros((64, 64), dtype=numpy.bool)
+        mask[12:32, 8:40] = True
+        geometry = self.extract(
+            mask, gt=[100, 0.5, 0, 50, 0, -0.5], accuracy=4
+        )
+        self.assertEqual(geometry.GetEnvelope(), (104, 120, 34, 44))
+
+    def test_accuracy(self):
+        mask = numpy.zeros((64, 64), dtype=numpy.bool)
+        mask[6:45, 10:50] = True
+        geometry = self.extract(mask, accuracy=4)
+
+        # the footprint is accurate to the cells of 4x4 pixels
+        envelope = geometry.GetEnvelope()
+        for value, expected in zip(envelope, (10, 50, 19, 58)):
+            self.assertTrue(abs(value - expected) < 4)
+        for x, y in geometry.GetGeometryRef(0).GetPoints():
+            self.assertEqual((x % 4, y % 4), (0, 0))
@@ -87,7 +87,19 @@ def collect_eo_metadata(qs, insert=None, exclude=None, bbox=False):
     if end_time and is_naive(end_time):
         end_time = make_aware(end_time, get_current_timezone())
 
-    for eo_object in insert or ():
+    return extend_eo_metadata(
+        begin_time, end_time, footprint, insert or (), bbox
+    )
+
+
+def extend_eo_metadata(begin_time, end_time, footprint, eo_objects, bbox=False):
+    """ Helper function to incrementally extend already collected EO metadata
+    by the metadata of the given EOObjects, without re-aggregating the
+    metadata of all other objects. If bbox is `True` then the returned polygon
+    will only be a minimal bounding box of the footprints.
+    """
+
+    for eo_object in eo_objects:
         if begin_time is None:
             begin_time = eo_object.begin_time
         elif eo_object.begin_time is not None:
@@ -101,7 +113,12 @@ def collect_eo_metadata(qs, insert=None, exclude=None, bbox=False):
         if footprint is None:
             footprint = eo_object.footprint
         elif eo_object.footprint is not None:
-            footprint = footprint.union(eo_object.footprint)
+            if bbox:
+                footprint = Polygon.from_bbox(
+                    _merge_extents(footprint.extent, eo_object.footprint.extent)
+                )
+            else:
+                footprint = footprint.union(eo_object.footprint)
 
     if not isinstance(footprint, MultiPolygon) and footprint is not None:
         footprint = MultiPolygon(footprint)
@@ -112,6 +129,29 @@ def collect_eo_metadata(qs, insert=None, exclude=None, bbox=False):
     return begin_time, end_time, footprint
 
 
+def is_eo_metadata_extension(old, new):
+    """ Check whether the EO metadata tuple `new` (begin time, end time and
+    footprint) only extends the EO metadata tuple `old`, i.e: the time span
+    and the footprint of `new` contain the ones of `old`.
+    """
+
+    old_begin, old_end, old_footprint = old
+    new_begin, new_end, new_footprint = new
+
+    if old_begin is not None and (new_begin is None or new_begin > old_begin):
+        return False
+    if old_end is not None and (new_end is None or new_end < old_end):
+        return False
+    if old_footprint is not None and (
+            new_footprint is None or not new_footprint.contains(old_footprint)):
+        return False
+    return True
+
+
+def _merge_extents(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
 def is_same_grid(coverages, epsilon=1e-10):
     """ Function to determine if the given coverages share the same base grid.
         Returns a boolean value, whether or not the coverages share a common 
@@ -36,7 +36,6 @@ import logging
 from django.http import HttpResponse
 
 from eoxserver.core import Component, ExtensionPoint, env
-from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.decoders import config
 from eoxserver.services.auth.exceptions import AuthorisationException
 from eoxserver.services.auth.interfaces import PolicyDecisionPointInterface
@@ -79,7 +78,7 @@ class BasePDP(object):
         actual authorization decision logic.
         """
 
-        reader = AuthConfigReader(get_eoxserver_config())
+        reader = AuthConfigReader.from_config()
 
         # This code segment allows local clients bypassing the
         # Authorisation process.
@@ -123,7 +122,7 @@ class PDPComponent(Component):
 
 
 def getPDP():
-    reader = AuthConfigReader(get_eoxserver_config())
+    reader = AuthConfigReader.from_config()
     if not reader.pdp_type or reader.pdp_type == "none":
         logger.debug("Authorization deactivated.")
         return None
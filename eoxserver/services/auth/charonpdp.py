@@ -35,7 +35,6 @@ import eoxserver
 from urlparse import urlparse
 
 from eoxserver.core import implements
-from eoxserver.core.config import get_eoxserver_config
 from eoxserver.services.ows.decoders import get_decoder
 from eoxserver.services.auth.base import BasePDP, AuthConfigReader
 from eoxserver.services.auth.interfaces import PolicyDecisionPointInterface
@@ -88,7 +87,7 @@ class CharonPDP(BasePDP):
 
     def __init__(self, client=None):
 
-        cfgReader = AuthConfigReader(get_eoxserver_config())
+        cfgReader = AuthConfigReader.from_config()
         url = cfgReader.authorisationServiceURL
 
         # For tests
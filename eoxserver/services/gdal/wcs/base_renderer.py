@@ -0,0 +1,242 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+
+
+from os.path import abspath
+from urllib import unquote
+from uuid import uuid4
+import logging
+
+from eoxserver.core import Component
+from eoxserver.core.decoders import config
+from eoxserver.backends.access import connect
+from eoxserver.backends.vsi import is_vsi_path
+from eoxserver.contrib import gdal, vsi
+from eoxserver.contrib.vrt import VRTBuilder
+from eoxserver.resources.coverages.formats import getFormatRegistry
+from eoxserver.services.result import ResultItem
+from eoxserver.services.exceptions import RenderException
+
+
+logger = logging.getLogger(__name__)
+
+
+class WCSConfigReader(config.Reader):
+    section = "services.ows.wcs"
+    maxsize = config.Option(type=int, default=None)
+    rectified_renderer = config.Option(default="mapserver")
+
+
+_warned_gdal_version = False
+
+
+def use_gdal_rectified_renderer():
+    """ Returns whether rectified coverages shall be rendered with GDAL instead
+        of MapServer. This is only possible with the ``gdal.Warp``,
+        ``gdal.Translate`` and ``gdal.BuildVRT`` functions of GDAL 2.1 or
+        newer, otherwise MapServer is used regardless of the configuration.
+    """
+    global _warned_gdal_version
+
+    if WCSConfigReader.from_config().rectified_renderer != "gdal":
+        return False
+
+    if not hasattr(gdal, "Warp"):
+        if not _warned_gdal_version:
+            logger.warning(
+                "The GDAL renderer for rectified coverages requires GDAL 2.1 "
+                "or newer, using the MapServer renderer instead."
+            )
+            _warned_gdal_version = True
+        return False
+
+    return True
+
+
+class BaseGDALRenderer(Component):
+    """ Base class for coverage renderers that process the data with GDAL 
+        directly. Provides access to the source data and the output format 
+        handling.
+    """
+
+    abstract = True
+
+    def get_source_dataset(self, coverage, data_items, range_type,
+                           vrt_filename=None):
+        """ Returns the GDAL source dataset of a coverage. Either a single file
+            dataset or a VRT combining the bands of all data items. The VRT is
+            only kept in memory, unless a ``vrt_filename`` is given, which 
+            then needs to be removed by the caller.
+        """
+        if len(data_items) == 1:
+            return gdal.OpenShared(_abspath(connect(data_items[0])))
+
+        vrt = VRTBuilder(
+            coverage.size_x, coverage.size_y, vrt_filename=vrt_filename
+        )
+
+        # sort in ascending order according to semantic and append all bands
+        # of each data item
+        data_items = sorted(data_items, key=(lambda d: d.semantic))
+
+        index = 0
+        for data_item in data_items:
+            path = _abspath(connect(data_item))
+            ds = gdal.OpenShared(path)
+
+            for item_index in xrange(1, ds.RasterCount + 1):
+                index += 1
+                vrt.add_band(range_type[index - 1].data_type)
+                vrt.add_simple_source(index, path, item_index)
+
+        return vrt.dataset
+
+
+    def get_output_driver(self, frmt):
+        """ Returns the GDAL driver for the given MIME type. Raises a 
+            :class:`RenderException` if the format is not supported.
+        """
+        reg_format = getFormatRegistry().getFormatByMIME(frmt)
+        driver = None
+        if reg_format and reg_format.driver.startswith("GDAL/"):
+            driver = gdal.GetDriverByName(reg_format.driver.split("/", 1)[1])
+
+        if driver is None:
+            raise RenderException(
+                "Unsupported output format '%s'." % frmt, "format"
+            )
+        return driver
+
+
+    def encode(self, dataset, frmt, encoding_params, path=None,
+               format_options=()):
+        """ Encodes the dataset in the given format and writes it to the given
+            path, a temporary file by default. The ``format_options`` (tuples 
+            of key and value) are passed as creation options to the driver.
+            Returns the output dataset and the used driver.
+        """
+        options = []
+        if frmt == "image/tiff":
+            options.extend(_get_gtiff_options(**encoding_params))
+        options.extend(format_options)
+
+        args = ["%s=%s" % (key, value) for key, value in options]
+
+        path = path or "/tmp/%s" % uuid4().hex
+        out_driver = self.get_output_driver(frmt)
+        return out_driver.CreateCopy(path, dataset, True, args), out_driver
+
+
+class ResultVSIFile(ResultItem):
+    """ Result item for files in the GDAL virtual file system, e.g in 
+        ``/vsimem/``. The data is streamed directly from the file, which is
+        unlinked when the item is deleted.
+    """
+
+    def __init__(self, path, content_type=None, filename=None, identifier=None):
+        super(ResultVSIFile, self).__init__(content_type, filename, identifier)
+        self.path = path
+
+    @property
+    def data(self):
+        with vsi.open(self.path) as f:
+            return f.read()
+
+    @property
+    def data_file(self):
+        return vsi.open(self.path)
+
+    def __len__(self):
+        return gdal.VSIStatL(self.path).size
+
+    def chunked(self, chunksize):
+        with vsi.open(self.path) as f:
+            size = f.size
+            while f.tell() < size:
+                yield f.read(min(chunksize, size - f.tell()))
+
+    def delete(self):
+        vsi.remove(self.path)
+
+
+def temp_vsimem_filename():
+    return "/vsimem/%s" % uuid4().hex
+
+
+def split_format(frmt):
+    """ Splits a format parameter into the MIME type and a list of the 
+        (key, value) options following it, e.g: 
+        ``image/tiff;COMPRESS=LZW`` yields 
+        ``("image/tiff", [["COMPRESS", "LZW"]])``.
+    """
+    parts = unquote(frmt).split(";")
+    mime_type = parts[0]
+    options = map(
+        lambda kv: map(lambda i: i.strip(), kv.split("=")), parts[1:]
+    )
+    return mime_type, options
+
+
+def _get_gtiff_options(compression=None, jpeg_quality=None, 
+                       predictor=None, interleave=None, tiling=False, 
+                       tilewidth=None, tileheight=None):
+
+    logger.info("Applying GeoTIFF parameters.")
+
+    if compression:
+        if compression.lower() == "huffman":
+            compression = "CCITTRLE"
+        yield ("COMPRESS", compression.upper())
+
+    if jpeg_quality is not None:
+        yield ("JPEG_QUALITY", str(jpeg_quality))
+
+    if predictor:
+        pr = ["NONE", "HORIZONTAL", "FLOATINGPOINT"].index(predictor.upper())
+        if pr == -1:
+            raise ValueError("Invalid compression predictor '%s'." % predictor)
+        yield ("PREDICTOR", str(pr + 1))
+
+    if interleave:
+        yield ("INTERLEAVE", interleave)
+
+    if tiling:
+        yield ("TILED", "YES")
+        if tilewidth is not None:
+            yield ("BLOCKXSIZE", str(tilewidth))
+        if tileheight is not None:
+            yield ("BLOCKYSIZE", str(tileheight))
+
+
+def _abspath(path):
+    """ Returns the absolute path for local files, virtual file system paths
+        are returned unaltered.
+    """
+    if is_vsi_path(path):
+        return path
+    return abspath(path)
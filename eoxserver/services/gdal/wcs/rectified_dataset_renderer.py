@@ -0,0 +1,443 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+
+
+from datetime import datetime
+from math import floor, ceil
+import logging
+
+from django.contrib.gis.geos import Polygon
+
+from eoxserver.core import implements
+from eoxserver.core.util.rect import Rect
+from eoxserver.contrib import gdal
+from eoxserver.resources.coverages import models, crss
+from eoxserver.resources.coverages.formats import getFormatRegistry
+from eoxserver.services.ows.version import Version
+from eoxserver.services.result import ResultBuffer
+from eoxserver.services.subset import x_axes, y_axes
+from eoxserver.services.ows.wcs.interfaces import WCSCoverageRendererInterface
+from eoxserver.services.ows.wcs.v20.encoders import WCS20EOXMLEncoder
+from eoxserver.services.ows.wcs.v20.util import (
+    ScaleSize, ScaleExtent, ScaleAxis
+)
+from eoxserver.services.exceptions import RenderException
+from eoxserver.services.gdal.wcs.base_renderer import (
+    BaseGDALRenderer, WCSConfigReader, ResultVSIFile, temp_vsimem_filename,
+    use_gdal_rectified_renderer, split_format
+)
+
+
+logger = logging.getLogger(__name__)
+
+INTERPOLATION_TRANS = {
+    "nearest-neighbour": "near",
+    "linear": "bilinear",
+    "bilinear": "bilinear",
+    "cubic": "cubic",
+    "cubic-spline": "cubicspline",
+    "lanczos": "lanczos",
+    "average": "average",
+    "mode": "mode"
+}
+
+
+class GDALRectifiedDatasetRenderer(BaseGDALRenderer):
+    """ A coverage renderer for rectified datasets and stitched mosaics that
+        processes the request with GDAL instead of MapServer. Only the window
+        of the source data covered by the subsets is read; band subsets, 
+        scaling and reprojection are applied with virtual datasets and the 
+        result is encoded into the ``/vsimem/`` file system.
+
+        The renderer is used instead of the MapServer based one when 
+        ``rectified_renderer`` is set to ``gdal`` in the ``services.ows.wcs``
+        section of the configuration and GDAL 2.1 or newer is available.
+    """
+
+    implements(WCSCoverageRendererInterface)
+
+    versions = (Version(2, 0),)
+    handles = (models.RectifiedDataset, models.RectifiedStitchedMosaic)
+
+    def supports(self, params):
+        return (
+            params.version in self.versions
+            and issubclass(params.coverage.real_type, self.handles)
+            and use_gdal_rectified_renderer()
+        )
+
+
+    def render(self, params):
+        # VRTs of coverages within mosaics need to be files in /vsimem/ to be
+        # referenced; they are removed once the output is encoded
+        temp_paths = []
+        try:
+            return self._render(params, temp_paths)
+        finally:
+            for path in temp_paths:
+                gdal.Unlink(path)
+
+
+    def _render(self, params, temp_paths):
+        coverage = params.coverage.cast()
+        range_type = coverage.range_type
+        subsets = params.subsets
+
+        if subsets and subsets.srid is not None:
+            if not crss.validateEPSGCode(subsets.srid):
+                raise RenderException(
+                    "Failed to extract an EPSG code from the CRS URI "
+                    "'%s'." % subsets.srid, "subset"
+                )
+
+        frmt = params.format or self.get_native_format(coverage)
+        if not frmt:
+            raise RenderException("No format specified.", "format")
+
+        frmt, format_options = split_format(frmt)
+        if any(len(option) != 2 for option in format_options):
+            raise RenderException(
+                "Invalid format options in '%s'." % params.format, "format"
+            )
+
+        resample_alg = INTERPOLATION_TRANS.get(
+            params.interpolation or "nearest-neighbour"
+        )
+        if resample_alg is None:
+            raise RenderException(
+                "Interpolation method '%s' is not supported." 
+                % params.interpolation, "interpolation"
+            )
+
+        if params.rangesubset:
+            band_list = list(params.rangesubset.get_band_indices(range_type, 1))
+        else:
+            band_list = None
+
+        src_ds = self.get_coverage_dataset(coverage, range_type, temp_paths)
+
+        # only read the window of the source dataset covered by the subsets
+        src_rect = self.get_source_rect(src_ds, coverage, subsets)
+        if not src_rect.area:
+            raise RenderException("Subset outside coverage extent.", "subset")
+
+        dst_srid = self.get_output_srid(params, coverage)
+
+        if dst_srid == coverage.srid:
+            size_x, size_y = self.get_output_size(params, src_rect.size)
+            dst_ds = gdal.Translate("", src_ds, 
+                format="VRT", srcWin=list(src_rect), bandList=band_list,
+                width=size_x, height=size_y, resampleAlg=resample_alg
+            )
+
+        else:
+            window_ds = gdal.Translate("", src_ds, 
+                format="VRT", srcWin=list(src_rect), bandList=band_list
+            )
+            warp_options = {
+                "format": "VRT",
+                "dstSRS": crss.asShortCode(dst_srid),
+                "resampleAlg": resample_alg
+            }
+            if subsets and subsets.srid == dst_srid:
+                warp_options["outputBounds"] = self.get_subset_bbox(
+                    coverage, subsets
+                )
+
+            dst_ds = gdal.Warp("", window_ds, **warp_options)
+
+            size = dst_ds.RasterXSize, dst_ds.RasterYSize
+            size_x, size_y = self.get_output_size(params, size)
+            if (size_x, size_y) != size:
+                # warp again to the same bounds, but with the scaled size
+                warp_options["outputBounds"] = _get_extent(dst_ds)
+                dst_ds = gdal.Warp("", window_ds, 
+                    width=size_x, height=size_y, **warp_options
+                )
+
+        maxsize = WCSConfigReader.from_config().maxsize
+        if maxsize is not None and (maxsize < size_x or maxsize < size_y):
+            raise RenderException(
+                "Requested image size %dpx x %dpx exceeds the allowed "
+                "limit maxsize=%dpx!" % (size_x, size_y, maxsize), "size"
+            )
+
+        # up to here, only virtual datasets were created: the data is actually
+        # read, processed and written when encoding the output
+        out_driver = self.get_output_driver(frmt)
+        driver_metadata = out_driver.GetMetadata_Dict()
+        mime_type = driver_metadata.get("DMD_MIMETYPE", frmt)
+        extension = driver_metadata.get("DMD_EXTENSION", "")
+
+        suffix = ".%s" % extension if extension else ""
+
+        time_stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        filename = "%s_%s%s" % (coverage.identifier, time_stamp, suffix)
+
+        out_ds, _ = self.encode(
+            dst_ds, frmt, getattr(params, "encoding_params", {}),
+            temp_vsimem_filename() + suffix, format_options
+        )
+        out_path = out_ds.GetDescription()
+        extent = _get_extent(out_ds)
+
+        # close the dataset to flush its contents and remove the side-car file
+        # that formats without georeferencing capabilities write
+        out_ds = None
+        if gdal.VSIStatL(out_path + ".aux.xml") is not None:
+            gdal.Unlink(out_path + ".aux.xml")
+
+        reference = "cid:coverage/%s" % filename
+        result_set = [
+            ResultVSIFile(out_path, mime_type, filename, reference)
+        ]
+
+        if not (params.mediatype 
+                and params.mediatype.startswith("multipart")):
+            return result_set
+
+        try:
+            if band_list:
+                bands = [range_type[i - 1] for i in band_list]
+            else:
+                bands = list(range_type)
+
+            encoder_subset = (
+                dst_srid, (size_x, size_y), extent,
+                subsets.bounding_polygon(coverage) if subsets else None
+            )
+
+            encoder = WCS20EOXMLEncoder()
+            content = encoder.serialize(
+                encoder.encode_rectified_dataset(
+                    coverage, bands, reference, mime_type, encoder_subset,
+                    getattr(params, "http_request", None)
+                )
+            )
+        except:
+            result_set[0].delete()
+            raise
+
+        result_set.insert(0, ResultBuffer(content, encoder.content_type))
+        return result_set
+
+
+    def get_native_format(self, coverage):
+        """ Returns the native format of the coverage, if it can be written.
+            Otherwise, and for mosaics and coverages stored in multiple files,
+            GeoTIFF is used.
+        """
+        if not issubclass(coverage.real_type, models.RectifiedStitchedMosaic):
+            data_items = coverage.data_items.filter(
+                semantic__startswith="bands"
+            )
+            if len(data_items) == 1 and data_items[0].format:
+                reg_format = getFormatRegistry().getFormatByMIME(
+                    data_items[0].format
+                )
+                if reg_format is not None and reg_format.isWriteable:
+                    return data_items[0].format
+
+        return "image/tiff"
+
+
+    def get_coverage_dataset(self, coverage, range_type, temp_paths):
+        """ Returns a georeferenced GDAL dataset for the coverage. For mosaics
+            a VRT of all contained datasets on the grid of the mosaic is 
+            returned, later datasets being drawn on top of earlier ones. The
+            paths of all temporary files created are appended to 
+            ``temp_paths``.
+        """
+        minx, miny, maxx, maxy = coverage.extent
+        size_x, size_y = coverage.size
+
+        if issubclass(coverage.real_type, models.RectifiedStitchedMosaic):
+            datasets = models.RectifiedDataset.objects.filter(
+                collections__pk=coverage.pk
+            ).order_by("begin_time")
+
+            sources = [
+                self.get_coverage_dataset(dataset, range_type, temp_paths)
+                for dataset in datasets
+            ]
+            if not sources:
+                raise RenderException(
+                    "Mosaic '%s' does not contain any datasets." 
+                    % coverage.identifier, "coverage"
+                )
+
+            return gdal.BuildVRT("", sources,
+                outputBounds=(minx, miny, maxx, maxy), 
+                xRes=(maxx - minx) / size_x, yRes=(maxy - miny) / size_y
+            )
+
+        data_items = coverage.data_items.filter(semantic__startswith="bands")
+
+        vrt_filename = None
+        if len(data_items) > 1:
+            # the bands VRT is referenced by its filename in mosaics
+            vrt_filename = temp_vsimem_filename() + ".vrt"
+            temp_paths.append(vrt_filename)
+
+        ds = self.get_source_dataset(
+            coverage, data_items, range_type, vrt_filename
+        )
+
+        if len(data_items) > 1:
+            # the bands VRT is not georeferenced yet
+            ds.SetGeoTransform([
+                minx, (maxx - minx) / size_x, 0, 
+                maxy, 0, -(maxy - miny) / size_y
+            ])
+            if coverage.srid is not None:
+                ds.SetProjection(crss.get_wkt(coverage.srid))
+            else:
+                ds.SetProjection(coverage.spatial_reference.wkt)
+            ds.FlushCache()
+
+        return ds
+
+
+    def get_subset_bbox(self, coverage, subsets):
+        """ Returns the bounding box of the X and Y subsets in the subsetting
+            CRS. Open bounds are taken from the coverages extent.
+        """
+        extent = coverage.extent
+        if subsets.srid != coverage.srid:
+            poly = Polygon.from_bbox(extent)
+            poly.srid = coverage.srid
+            extent = poly.transform(subsets.srid, True).extent
+
+        return tuple(
+            float(value) if value is not None else default
+            for value, default in zip(subsets.xy_bbox, extent)
+        )
+
+
+    def get_source_rect(self, dataset, coverage, subsets):
+        """ Returns the pixel window of the source dataset covered by the 
+            subsets.
+        """
+        image_rect = Rect(0, 0, dataset.RasterXSize, dataset.RasterYSize)
+
+        if not subsets or not (subsets.has_x or subsets.has_y):
+            return image_rect
+
+        # pixel subset
+        if subsets.srid is None:
+            minx, miny, maxx, maxy = subsets.xy_bbox
+
+            minx = int(minx) if minx is not None else image_rect.offset_x
+            miny = int(miny) if miny is not None else image_rect.offset_y
+            maxx = int(maxx) if maxx is not None else image_rect.upper_x - 1
+            maxy = int(maxy) if maxy is not None else image_rect.upper_y - 1
+
+            return image_rect & Rect(minx, miny, maxx-minx+1, maxy-miny+1)
+
+        # subset in geographical coordinates
+        minx, miny, maxx, maxy = self.get_subset_bbox(coverage, subsets)
+        if subsets.srid != coverage.srid:
+            poly = Polygon.from_bbox((minx, miny, maxx, maxy))
+            poly.srid = subsets.srid
+            minx, miny, maxx, maxy = poly.transform(coverage.srid, True).extent
+
+        gt = dataset.GetGeoTransform()
+        offset_x = int(floor((minx - gt[0]) / gt[1]))
+        offset_y = int(floor((maxy - gt[3]) / gt[5]))
+        upper_x = max(int(ceil((maxx - gt[0]) / gt[1])), offset_x + 1)
+        upper_y = max(int(ceil((miny - gt[3]) / gt[5])), offset_y + 1)
+
+        return image_rect & Rect(
+            offset_x, offset_y, upper_x=upper_x, upper_y=upper_y
+        )
+
+
+    def get_output_srid(self, params, coverage):
+        """ Returns the SRID of the output: either the requested output CRS, 
+            the subsetting CRS or the native CRS of the coverage.
+        """
+        if params.outputcrs:
+            srid = crss.parseEPSGCode(params.outputcrs, 
+                (crss.fromURL, crss.fromURN, crss.fromShortCode)
+            )
+            if srid is None:
+                raise RenderException(
+                    "Failed to extract an EPSG code from the CRS URI '%s'." 
+                    % params.outputcrs, "outputcrs"
+                )
+            return srid
+
+        if params.subsets and params.subsets.srid is not None:
+            return params.subsets.srid
+
+        return coverage.srid
+
+
+    def get_output_size(self, params, size):
+        """ Applies the scaling parameters to the given output size.
+        """
+        size_x, size_y = size
+
+        if params.scalefactor is not None:
+            size_x = size_x * params.scalefactor
+            size_y = size_y * params.scalefactor
+
+        for scale in params.scales:
+            axis = scale.axis.lower()
+            if axis in x_axes + ("i",):
+                is_x = True
+            elif axis in y_axes + ("j",):
+                is_x = False
+            else:
+                continue
+
+            if isinstance(scale, ScaleSize):
+                value = scale.size
+            elif isinstance(scale, ScaleExtent):
+                value = scale.high - scale.low
+            elif isinstance(scale, ScaleAxis):
+                value = (size_x if is_x else size_y) * scale.scale
+            else:
+                continue
+
+            if is_x:
+                size_x = value
+            else:
+                size_y = value
+
+        return max(int(round(size_x)), 1), max(int(round(size_y)), 1)
+
+
+def _get_extent(dataset):
+    """ Returns the extent of a north-up dataset.
+    """
+    gt = dataset.GetGeoTransform()
+    return (
+        gt[0], gt[3] + dataset.RasterYSize * gt[5], 
+        gt[0] + dataset.RasterXSize * gt[1], gt[3]
+    )
@@ -27,19 +27,15 @@
 #-------------------------------------------------------------------------------
 
 
-from os.path import splitext, abspath
 from datetime import datetime
-from uuid import uuid4
 import logging
 
 from django.contrib.gis.geos import GEOSGeometry
 
-from eoxserver.core import Component, implements
-from eoxserver.core.config import get_eoxserver_config
-from eoxserver.core.decoders import config
+from eoxserver.core import implements
 from eoxserver.core.util.rect import Rect
-from eoxserver.backends.access import connect
-from eoxserver.contrib import gdal, osr
+from eoxserver.contrib import osr
+from eoxserver.backends.vsi import is_vsi_path
 from eoxserver.contrib.vrt import VRTBuilder
 from eoxserver.resources.coverages import models
 from eoxserver.services.ows.version import Version
@@ -49,13 +45,16 @@ from eoxserver.services.ows.wcs.v20.encoders import WCS20EOXMLEncoder
 from eoxserver.services.exceptions import (
     RenderException, OperationNotSupportedException
 )
+from eoxserver.services.gdal.wcs.base_renderer import (
+    BaseGDALRenderer, WCSConfigReader
+)
 from eoxserver.processing.gdal import reftools
 
 
 logger = logging.getLogger(__name__)
 
 
-class GDALReferenceableDatasetRenderer(Component):
+class GDALReferenceableDatasetRenderer(BaseGDALRenderer):
     implements(WCSCoverageRendererInterface)
 
     versions = (Version(2, 0),)
@@ -101,7 +100,7 @@ class GDALReferenceableDatasetRenderer(Component):
                 "scalefactor" if params.scalefactor is not None else "scale"
             )
 
-        maxsize = WCSConfigReader(get_eoxserver_config()).maxsize
+        maxsize = WCSConfigReader.from_config().maxsize
         if maxsize < dst_rect.size_x or maxsize < dst_rect.size_y:              
             raise RenderException(                                              
                 "Requested image size %dpx x %dpx exceeds the allowed "       
@@ -138,10 +137,19 @@ class GDALReferenceableDatasetRenderer(Component):
             
             if subsets.has_x and subsets.has_y:
                 footprint = GEOSGeometry(reftools.get_footprint_wkt(out_ds))
-                if not subsets.srid:
-                    extent = footprint.extent
+                if subsets.srid:
+                    # the source rect is made of whole grid cells and thus
+                    # covers more than the requested subset: encode the
+                    # extent actually delivered in the subset CRS
+                    footprint.srid = osr.SpatialReference(
+                        out_ds.GetGCPProjection(), "WKT"
+                    ).srid
+                    if footprint.srid != subsets.srid:
+                        extent = footprint.transform(subsets.srid, True).extent
+                    else:
+                        extent = footprint.extent
                 else:
-                    extent = subsets.xy_bbox
+                    extent = footprint.extent
                 encoder_subset = (
                     subsets.srid, src_rect.size, extent, footprint
                 )
@@ -159,38 +167,6 @@ class GDALReferenceableDatasetRenderer(Component):
         return result_set
 
 
-    def get_source_dataset(self, coverage, data_items, range_type):
-        if len(data_items) == 1:
-            return gdal.OpenShared(abspath(connect(data_items[0])))
-        else:
-            vrt = VRTBuilder(
-                coverage.size_x, coverage.size_y,
-                vrt_filename=temp_vsimem_filename()
-            )
-
-            # sort in ascending order according to semantic
-            data_items = sorted(data_items, key=(lambda d: d.semantic))
-
-            gcps = []
-            compound_index = 0
-            for data_item in data_items:
-                path = abspath(connect(data_item))
-
-                # iterate over all bands of the data item
-                for set_index, item_index in self._data_item_band_indices(data_item):
-                    if set_index != compound_index + 1: 
-                        raise ValueError
-                    compound_index = set_index
-
-                    band = range_type[set_index]
-                    vrt.add_band(band.data_type)
-                    vrt.add_simple_source(
-                        set_index, path, item_index
-                    )
-
-            return vrt.dataset
-
-
     def get_source_and_dest_rect(self, dataset, subsets):
         size_x, size_y = dataset.RasterXSize, dataset.RasterYSize
         image_rect = Rect(0, 0, size_x, size_y)
@@ -209,6 +185,16 @@ class GDALReferenceableDatasetRenderer(Component):
 
             subset_rect = Rect(minx, miny, maxx-minx+1, maxy-miny+1)
 
+        # subset in geographical coordinates of a single file: use the cached
+        # lookup grid of the file; composed VRTs are only kept in memory
+        elif (reftools.is_lookup_grid_supported() 
+                and dataset.GetDescription()
+                and not is_vsi_path(dataset.GetDescription())):
+            grid = reftools.get_lookup_grid(dataset.GetDescription())
+            subset_rect = grid.rect_from_subset(
+                subsets.srid, *subsets.xy_bbox
+            )
+
         # subset in geographical coordinates
         else:
             vrt = VRTBuilder(*image_rect.size)
@@ -255,60 +241,8 @@ class GDALReferenceableDatasetRenderer(Component):
         return vrt.dataset
 
 
-    def encode(self, dataset, frmt, encoding_params):
-        options = ()
-        if frmt == "image/tiff":
-            options = _get_gtiff_options(**encoding_params)
-
-        args = [ ("%s=%s" % key, value) for key, value in options ]
-
-        path = "/tmp/%s" % uuid4().hex
-        out_driver = gdal.GetDriverByName("GTiff")
-        return out_driver.CreateCopy(path, dataset, True, args), out_driver
-
-
 def index_of(iterable, predicate, default=None, start=1):
     for i, item in enumerate(iterable, start):
         if predicate(item):
             return i
     return default
-
-
-def temp_vsimem_filename():
-    return "/vsimem/%s" % uuid4().hex
-
-
-def _get_gtiff_options(compression=None, jpeg_quality=None, 
-                       predictor=None, interleave=None, tiling=False, 
-                       tilewidth=None, tileheight=None):
-
-    logger.info("Applying GeoTIFF parameters.")
-
-    if compression:
-        if compression.lower() == "huffman":
-            compression = "CCITTRLE"
-        yield ("COMPRESS", compression.upper())
-
-    if jpeg_quality is not None:
-        yield ("JPEG_QUALITY", str(jpeg_quality))
-
-    if predictor:
-        pr = ["NONE", "HORIZONTAL", "FLOATINGPOINT"].index(predictor.upper())
-        if pr == -1:
-            raise ValueError("Invalid compression predictor '%s'." % predictor)
-        yield ("PREDICTOR", str(pr + 1))
-
-    if interleave:
-        yield ("INTERLEAVE", interleave)
-
-    if tiling:
-        yield ("TILED", "YES")
-        if tilewidth is not None:
-            yield ("BLOCKXSIZE", str(tilewidth))
-        if tileheight is not None:
-            yield ("BLOCKYSIZE", str(tileheight))
-
-
-class WCSConfigReader(config.Reader):
-    section = "services.ows.wcs"
-    maxsize = config.Option(type=int, default=None)
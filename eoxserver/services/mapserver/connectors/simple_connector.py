@@ -52,9 +52,15 @@ class SimpleConnector(Component):
         filtered = filter(lambda d: d.semantic.startswith("bands"), data_items)
         data = connect(filtered[0])
 
-        if isinstance(coverage, models.ReferenceableDataset):
+        rectified = filter(lambda d: d.semantic == "rectified", data_items)
+
+        if rectified:
+            # use the rectified VRT precomputed at registration
+            data = connect(rectified[0])
+
+        elif isinstance(coverage, models.ReferenceableDataset):
             vrt_path = join("/vsimem", uuid4().hex)
-            reftools.create_rectified_vrt(data, vrt_path)
+            reftools.create_rectified_vrt_from_grid(data, vrt_path)
             data = vrt_path
             layer.setMetaData("eoxs_ref_data", data)
 
@@ -30,7 +30,7 @@
 import os.path
 
 from eoxserver.core import Component, implements
-from eoxserver.backends.access import connect
+from eoxserver.backends.access import retrieve
 from eoxserver.services.mapserver.interfaces import ConnectorInterface
 
 
@@ -47,7 +47,7 @@ class TileIndexConnector(Component):
         )
 
     def connect(self, coverage, data_items, layer):
-        layer.tileindex = os.path.abspath(connect(data_items[0]))
+        layer.tileindex = os.path.abspath(retrieve(data_items[0]))
         layer.tileitem = "location"
 
     def disconnect(self, coverage, data_items, layer):
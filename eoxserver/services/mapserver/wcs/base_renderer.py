@@ -30,7 +30,6 @@
 from django.db.models import Q
 
 from eoxserver.core import Component
-from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.decoders import config, typelist
 from eoxserver.contrib import mapserver as ms
 from eoxserver.resources.coverages import crss
@@ -55,12 +54,11 @@ class BaseRenderer(Component):
         """
         map_ = ms.mapObj()
         map_.setMetaData("ows_enable_request", "*")
-        maxsize = WCSConfigReader(get_eoxserver_config()).maxsize
+        reader = WCSConfigReader.from_config()
+        maxsize = reader.maxsize
         if maxsize is not None:
             map_.maxsize = maxsize
-        map_.setMetaData("ows_updateSequence", 
-            WCSConfigReader(get_eoxserver_config()).update_sequence
-        )
+        map_.setMetaData("ows_updateSequence", reader.update_sequence)
         return map_
 
     def data_items_for_coverage(self, coverage):
@@ -83,7 +81,12 @@ class BaseRenderer(Component):
         layer.name = coverage.identifier
         layer.type = ms.MS_LAYER_RASTER
 
-        layer.setProjection(coverage.spatial_reference.proj)
+        # coverages with a projection but no SRID use its definition
+        sr = coverage.spatial_reference
+        if coverage.srid is not None:
+            layer.setProjection(crss.get_proj4(coverage.srid))
+        else:
+            layer.setProjection(sr.proj)
 
         extent = coverage.extent
         size = coverage.size
@@ -128,7 +131,7 @@ class BaseRenderer(Component):
                 "nativeformat": native_format
             }, namespace="wcs")
 
-        native_crs = "EPSG:%d" % coverage.spatial_reference.srid
+        native_crs = "EPSG:%d" % sr.srid
         all_crss = crss.getSupportedCRS_WCS(format_function=crss.asShortCode)
         if native_crs in all_crss:
             all_crss.remove(native_crs)
@@ -190,5 +193,5 @@ class BaseRenderer(Component):
 
 
 def is_format_supported(mime_type):
-    reader = WCSConfigReader(get_eoxserver_config())
+    reader = WCSConfigReader.from_config()
     return mime_type in reader.supported_formats
\ No newline at end of file
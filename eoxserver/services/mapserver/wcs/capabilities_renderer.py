@@ -28,7 +28,6 @@
 
 
 from eoxserver.core import Component, implements
-from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.util.timetools import isoformat
 from eoxserver.contrib.mapserver import create_request, Map, Layer
 from eoxserver.resources.coverages import crss
@@ -52,7 +51,7 @@ class MapServerWCSCapabilitiesRenderer(BaseRenderer):
         return params.version in self.versions
 
     def render(self, params):
-        conf = CapabilitiesConfigReader(get_eoxserver_config())
+        conf = CapabilitiesConfigReader.from_config()
 
         map_ = Map()
         map_.setMetaData({
@@ -93,7 +92,11 @@ class MapServerWCSCapabilitiesRenderer(BaseRenderer):
         for coverage in params.coverages:
             layer = Layer(coverage.identifier)
 
-            layer.setProjection(coverage.spatial_reference.proj)
+            # coverages with a projection but no SRID use its definition
+            if coverage.srid is not None:
+                layer.setProjection(crss.get_proj4(coverage.srid))
+            else:
+                layer.setProjection(coverage.spatial_reference.proj)
             extent = coverage.extent
             size = coverage.size
             resolution = ((extent[2] - extent[0]) / float(size[0]),
@@ -28,11 +28,8 @@
 
 
 from datetime import datetime
-from urllib import unquote
 import logging
 
-from lxml import etree
-
 from eoxserver.core import implements, ExtensionPoint
 from eoxserver.contrib import mapserver as ms
 from eoxserver.resources.coverages import models, crss
@@ -50,6 +47,9 @@ from eoxserver.services.subset import Subsets
 from eoxserver.services.mapserver.wcs.base_renderer import (
     BaseRenderer, is_format_supported
 )
+from eoxserver.services.gdal.wcs.base_renderer import (
+    use_gdal_rectified_renderer, split_format
+)
 from eoxserver.services.ows.version import Version
 from eoxserver.services.result import result_set_from_raw_data, ResultBuffer
 from eoxserver.services.exceptions import (
@@ -99,7 +99,9 @@ class RectifiedCoverageMapServerRenderer(BaseRenderer):
             and issubclass(params.coverage.real_type, self.handles_full))
             or
             (params.version in self.versions_partly
-            and issubclass(params.coverage.real_type, self.handles_partly))
+            and issubclass(params.coverage.real_type, self.handles_partly)
+            # the GDAL based renderer takes over, if configured
+            and not use_gdal_rectified_renderer())
         )
 
 
@@ -167,11 +169,20 @@ class RectifiedCoverageMapServerRenderer(BaseRenderer):
                 "Could not find applicable layer connector.", "coverage"
             )
 
+        # WCS 2.0 multipart responses: only let MapServer render the raster and
+        # encode the coverage description ourselves
+        multipart = (
+            params.version == Version(2, 0) and 
+            getattr(params, "mediatype", None) in (
+                "multipart/mixed", "multipart/related"
+            )
+        )
+
         try:
             connector.connect(coverage, data_items, layer)
             # create request object and dispatch it against the map
             request = ms.create_request(
-                self.translate_params(params, range_type)
+                self.translate_params(params, range_type, multipart)
             )
             request.setParameter("format", mime_type)
             raw_result = ms.dispatch(map_, request)
@@ -182,40 +193,83 @@ class RectifiedCoverageMapServerRenderer(BaseRenderer):
 
         result_set = result_set_from_raw_data(raw_result)
 
-        if params.version == Version(2, 0):
-            if getattr(params, "mediatype", None) in ("multipart/mixed", "multipart/related"):
-                encoder = WCS20EOXMLEncoder()
-                is_mosaic = issubclass(
-                    coverage.real_type, models.RectifiedStitchedMosaic
-                )
-
-                if not is_mosaic:
-                    tree = encoder.alter_rectified_dataset(
-                        coverage, getattr(params, "http_request", None), 
-                        etree.parse(result_set[0].data_file).getroot(), 
-                        subsets.bounding_polygon(coverage) if subsets else None
-                    )
-                else:
-                    tree = encoder.alter_rectified_stitched_mosaic(
-                        coverage.cast(), getattr(params, "http_request", None), 
-                        etree.parse(result_set[0].data_file).getroot(), 
-                        subsets.bounding_polygon(coverage) if subsets else None
-                    )
+        if multipart:
+            # the raster is passed on as a view of the MapServer output buffer
+            raster = result_set[0]
+            raster.content_type = raster.content_type or mime_type
+            raster.filename = raster.filename or (basename + of.extension)
+            reference = "cid:coverage/%s" % raster.filename
+            raster.identifier = reference
+
+            if issubclass(coverage.real_type, models.RectifiedStitchedMosaic):
+                coverage = coverage.cast()
+
+            if params.rangesubset:
+                bands = [
+                    bands[i] for i in 
+                    params.rangesubset.get_band_indices(range_type)
+                ]
+
+            size, extent = self.get_output_grid(map_)
+            encoder_subset = (
+                self.get_output_srid(params, coverage), size, extent,
+                subsets.bounding_polygon(coverage) if subsets else None
+            )
 
-                result_set[0] = ResultBuffer(
-                    encoder.serialize(tree), 
-                    encoder.content_type
+            encoder = WCS20EOXMLEncoder()
+            content = encoder.serialize(
+                encoder.encode_rectified_dataset(
+                    coverage, bands, reference, raster.content_type,
+                    encoder_subset, getattr(params, "http_request", None)
                 )
+            )
+            result_set = [ResultBuffer(content, encoder.content_type), raster]
 
         # "default" response
         return result_set
 
-    def translate_params(self, params, range_type):
-        """ "Translate" parameters to be understandable by mapserver.
+    def get_output_srid(self, params, coverage):
+        """ Returns the SRID of the rendered coverage: either the requested 
+            output CRS, the subsetting CRS or the native CRS of the coverage.
+        """
+        if params.outputcrs:
+            srid = crss.parseEPSGCode(params.outputcrs, 
+                (crss.fromURL, crss.fromURN, crss.fromShortCode)
+            )
+            if srid is not None:
+                return srid
+
+        if params.subsets and params.subsets.srid is not None:
+            return params.subsets.srid
+
+        return coverage.srid
+
+    def get_output_grid(self, map_):
+        """ Returns the size and the (outer) extent of the grid MapServer 
+            rendered for the last dispatched request. MapServer stores the 
+            extent from the centers of the corner pixels, so it is expanded by
+            half a pixel in each direction.
+        """
+        width, height = map_.width, map_.height
+        extent = map_.extent
+        half_x = (extent.maxx - extent.minx) / max(width - 1, 1) / 2.0
+        half_y = (extent.maxy - extent.miny) / max(height - 1, 1) / 2.0
+        return (width, height), (
+            extent.minx - half_x, extent.miny - half_y, 
+            extent.maxx + half_x, extent.maxy + half_y
+        )
+
+    def translate_params(self, params, range_type, multipart=False):
+        """ "Translate" parameters to be understandable by mapserver. If 
+            ``multipart`` is set, the media type is omitted, so that only the 
+            raster is rendered.
         """
         if params.version.startswith("2.0"):
             for key, value in params:
-                if key == "interpolation":
+                if key == "mediatype" and multipart:
+                    continue
+
+                elif key == "interpolation":
                     interpolation = INTERPOLATION_TRANS.get(value)
                     if not interpolation:
                         raise InterpolationMethodNotSupportedException(
@@ -273,15 +327,6 @@ class RectifiedCoverageMapServerRenderer(BaseRenderer):
                 yield key, value
 
 
-def split_format(frmt):
-    parts = unquote(frmt).split(";")
-    mime_type = parts[0]
-    options = map(
-        lambda kv: map(lambda i: i.strip(), kv.split("=")), parts[1:]
-    )
-    return mime_type, options
-        
-
 def create_outputformat(mime_type, options, imagemode, basename, parameters):
     """ Returns a ``mapscript.outputFormatObj`` for the given format name and 
         imagemode.
@@ -28,12 +28,13 @@
 from itertools import chain
 
 from eoxserver.core import Component, implements, ExtensionPoint
-from eoxserver.core.config import get_eoxserver_config
-from eoxserver.core.util.timetools import isoformat
+from eoxserver.core.util.timetools import isoformat, merge_intervals
 from eoxserver.contrib.mapserver import create_request, Map, Layer, Class, Style
 from eoxserver.resources.coverages import crss, models
 from eoxserver.resources.coverages.formats import getFormatRegistry
-from eoxserver.services.ows.common.config import CapabilitiesConfigReader
+from eoxserver.services.ows.common.config import (
+    CapabilitiesConfigReader, WMSCapabilitiesConfigReader
+)
 from eoxserver.services.ows.wms.interfaces import (
     WMSCapabilitiesRendererInterface
 )
@@ -56,7 +57,8 @@ class MapServerWMSCapabilitiesRenderer(Component):
 
 
     def render(self, collections, coverages, request_values):
-        conf = CapabilitiesConfigReader(get_eoxserver_config())
+        conf = CapabilitiesConfigReader.from_config()
+        wms_conf = WMSCapabilitiesConfigReader.from_config()
 
         suffixes = self.suffixes
 
@@ -102,17 +104,16 @@ class MapServerWMSCapabilitiesRenderer(Component):
             # save overall map extent
             map_extent = self.join_extents(map_extent, extent)
 
-            eo_objects = collection.eo_objects.filter(
+            time_extents = collection.eo_objects.filter(
                 begin_time__isnull=False, end_time__isnull=False
-            )
+            ).values_list("begin_time", "end_time")
+
+            if wms_conf.compact_time_extents:
+                time_extents = merge_intervals(time_extents)
+
             timeextent = ",".join(
-                map(
-                    lambda o: (
-                        "/".join(
-                            map(isoformat, o.time_extent)
-                        ) + "/PT1S"
-                    ), eo_objects
-                )
+                "%s/%s/PT1S" % (isoformat(begin_time), isoformat(end_time))
+                for begin_time, end_time in time_extents
             )
 
             if len(suffixes) > 1:
@@ -28,7 +28,6 @@
 
 
 from eoxserver.core import implements
-from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.decoders import xml
 from eoxserver.contrib import mapserver as ms
 from eoxserver.resources.coverages import models
@@ -50,7 +49,7 @@ class MapServerWMSFeatureInfoRenderer(MapServerWMSBaseComponent):
 
     
     def render(self, layer_groups, request_values, **options):
-        config = CapabilitiesConfigReader(get_eoxserver_config())
+        config = CapabilitiesConfigReader.from_config()
         map_ = ms.Map()
         map_.setMetaData({
             "enable_request": "*",
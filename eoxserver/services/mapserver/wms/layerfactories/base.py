@@ -195,8 +195,9 @@ class PlainLayerMixIn(object):
                 layer.setProcessingKey("RESAMPLE", str(options.resampling))
 
     def _set_projection(self, layer, sr):
-        short_epsg = "EPSG:%d" % sr.srid
-        layer.setProjection(sr.proj)
+        srid = sr.srid
+        short_epsg = "EPSG:%d" % srid
+        layer.setProjection(crss.get_proj4(srid))
         layer.setMetaData("ows_srs", short_epsg) 
         layer.setMetaData("wms_srs", short_epsg) 
 
@@ -29,7 +29,6 @@
 
 import logging
 
-from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.decoders import config, typelist
 from eoxserver.contrib import mapserver as ms
 from eoxserver.services.mapserver.wms.layerfactories.base import (
@@ -48,7 +47,7 @@ class ColorizedMaskLayerFactory(BaseStyleMixIn, AbstractLayerFactory):
 
     @property
     def enabled_masks(self):
-        decoder = EnabledMasksConfigReader(get_eoxserver_config())
+        decoder = EnabledMasksConfigReader.from_config()
         return decoder.mask_names
 
     def generate(self, eo_object, group_layer, suffix, options):
@@ -28,7 +28,7 @@
 import logging
 
 from eoxserver.core import Component, implements
-from eoxserver.backends.access import connect
+from eoxserver.backends.access import retrieve
 from eoxserver.services.mapserver.interfaces import StyleApplicatorInterface
 
 
@@ -44,7 +44,7 @@ class SLDStyleApplicator(Component):
         ), data_items)
 
         for sld_item in sld_items:
-            sld_filename = connect(sld_item)
+            sld_filename = retrieve(sld_item)
             with open(sld_filename) as f:
                 #layer.setMetaData("wms_sld_body", f.read())
                 #layer.map.applySLD(f.read())
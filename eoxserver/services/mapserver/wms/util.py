@@ -28,15 +28,22 @@
 
 
 import logging
+import threading
 from itertools import chain
+from collections import OrderedDict
 
 from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
 from django.utils.datastructures import SortedDict
 
 from eoxserver.core import Component, ExtensionPoint
-from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.decoders import config
 from eoxserver.contrib import mapserver as ms
+from eoxserver.backends.models import DataItem
 from eoxserver.resources.coverages.crss import CRSsConfigReader
+from eoxserver.resources.coverages.models import EOObject
+from eoxserver.services.models import WMSRenderOptions
+from eoxserver.services.ows.common.config import CapabilitiesConfigReader
 from eoxserver.services.mapserver.interfaces import (
     ConnectorInterface, LayerFactoryInterface, StyleApplicatorInterface
 )
@@ -57,29 +64,58 @@ class MapServerWMSBaseComponent(Component):
 
 
     def render(self, layer_groups, request_values, **options):
+        map_, session = self.get_map(layer_groups, options)
+
+        self.check_parameters(map_, request_values)
+
+        with session:
+            request = ms.create_request(request_values)
+            raw_result = ms.dispatch(map_, request)
+
+            result = result_set_from_raw_data(raw_result)
+            return result, get_content_type(result)
+
+
+    def create_map(self):
+        """ Create the base map with all request independent settings.
+        """
         map_ = ms.Map()
         map_.setMetaData("ows_enable_request", "*")
         map_.setProjection("EPSG:4326")
         map_.imagecolor.setRGB(0, 0, 0)
 
         # set supported CRSs
-        decoder = CRSsConfigReader(get_eoxserver_config())
+        decoder = CRSsConfigReader.from_config()
         crss_string = " ".join(
             map(lambda crs: "EPSG:%d" % crs, decoder.supported_crss_wms)
         )
         map_.setMetaData("ows_srs", crss_string)
         map_.setMetaData("wms_srs", crss_string)
+        return map_
+
+
+    def get_map(self, layer_selection, options):
+        """ Returns a tuple of a map, set up with all layers of the given
+            selection, and a :class:`ConnectorSession` to connect the layers
+            with their data. Prepared maps are cached as templates and cloned
+            for each request, so that only the request specific data
+            connections have to be made.
+        """
+        key = _map_key(type(self), layer_selection, options)
+        template = _map_cache.get(key)
+
+        if template is None:
+            template = self.create_map()
+            session = self.setup_map(layer_selection, template, options)
+            _map_cache.put(key, (template, session))
+        else:
+            template, session = template
 
-        self.check_parameters(map_, request_values)
+        if not _map_cache.enabled:
+            return template, session
 
-        session = self.setup_map(layer_groups, map_, options)
-        
-        with session:
-            request = ms.create_request(request_values)
-            raw_result = map_.dispatch(request)
-
-            result = result_set_from_raw_data(raw_result)
-            return result, get_content_type(result)
+        map_ = template.clone()
+        return map_, session.bind(map_)
 
 
     def check_parameters(self, map_, request_values):
@@ -181,13 +217,17 @@ class MapServerWMSBaseComponent(Component):
                 session.add(connector, coverage, data_items, layer)
                 
 
+        # determine the final order of the layers first: a layer with an
+        # already used name replaces the old one and is raised to the top
         coverage_layers = [layer for _, layer, _ in session.coverage_layers]
+        ordered_layers = SortedDict()
         for layer in chain(group_layers.values(), coverage_layers):
+            ordered_layers.pop(layer.name, None)
+            ordered_layers[layer.name] = layer
+
+        for layer in ordered_layers.values():
             old_layer = map_.getLayerByName(layer.name)
             if old_layer:
-                # remove the old layer and reinsert the new one, to 
-                # raise the layer to the top.
-                # TODO: find a more efficient way to do this
                 map_.removeLayer(old_layer.index)
             map_.insertLayer(layer)
 
@@ -233,3 +273,111 @@ class ConnectorSession(object):
     @property
     def coverage_layers(self):
         return map(lambda it: (it[1], it[2], it[3]), self.item_list)
+
+    def bind(self, map_):
+        """ Returns a new session with all layers replaced by the equally
+            named layers of the given map, e.g: a clone of the map the layers
+            were originally inserted into.
+        """
+        session = ConnectorSession()
+        items = SortedDict()
+        for connector, coverage, layer, data_items in self.item_list:
+            # only the last layer with a given name is part of the map
+            items.pop(layer.name, None)
+            items[layer.name] = (connector, coverage, data_items)
+
+        for name, (connector, coverage, data_items) in items.items():
+            layer = map_.getLayerByName(name)
+            if layer:
+                session.add(connector, coverage, data_items, layer)
+        return session
+
+
+class MapCacheConfigReader(config.Reader):
+    section = "services.ows.wms"
+    map_cache_size = config.Option(type=int, default=0)
+
+
+class MapCache(object):
+    """ Bounded LRU cache of prepared map templates. Cached templates are
+        invalidated whenever coverages, their data items or their render
+        options are changed within this process. Changes made by other
+        processes (e.g: management commands) require the `update_sequence` to
+        be increased.
+    """
+
+    def __init__(self):
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+
+    @property
+    def max_entries(self):
+        return max(MapCacheConfigReader.from_config().map_cache_size or 0, 0)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @property
+    def version(self):
+        return self._version
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            template = self._templates.pop(key, None)
+            if template is not None:
+                self._templates[key] = template
+            return template
+
+    def put(self, key, template):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            if key[0] != self._version:
+                # the template was prepared before an invalidation
+                return
+            self._templates[key] = template
+            while len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._templates.clear()
+
+
+_map_cache = MapCache()
+
+
+def _map_key(component_type, layer_selection, options):
+    """ Creates the key of a map template for the given layer selection and
+        options.
+    """
+    layers = tuple(
+        (
+            tuple(collection.pk for collection in collections),
+            coverage.pk if coverage else None, name, suffix
+        )
+        for collections, coverage, name, suffix in layer_selection.walk()
+    )
+    bands = options.get("bands")
+    update_sequence = CapabilitiesConfigReader.from_config().update_sequence
+    return (
+        _map_cache.version, update_sequence, component_type, layers,
+        tuple(bands) if bands else None
+    )
+
+
+def _invalidate_map_cache(sender, instance, **kwargs):
+    if isinstance(instance, (EOObject, DataItem, WMSRenderOptions)):
+        _map_cache.invalidate()
+
+post_save.connect(_invalidate_map_cache, dispatch_uid="eoxs_wms_map_cache_save")
+post_delete.connect(
+    _invalidate_map_cache, dispatch_uid="eoxs_wms_map_cache_delete"
+)
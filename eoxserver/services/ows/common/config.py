@@ -66,3 +66,11 @@ class CapabilitiesConfigReader(config.Reader):
 class WCSEOConfigReader(config.Reader):
     section = "services.ows.wcs20"
     paging_count_default = config.Option(type=int, default=None)
+    eocoverageset_workers = config.Option(type=int, default=1)
+    eocoverageset_streaming = config.Option(type=bool, default=False)
+
+
+class WMSCapabilitiesConfigReader(config.Reader):
+    section = "services.ows.wms"
+    capabilities_cache = config.Option(type=bool, default=False)
+    compact_time_extents = config.Option(type=bool, default=False)
@@ -93,6 +93,12 @@ class PackageWriterInterface(object):
             `create_package` method.
         """
 
+    def stream_package(self, items, format, params):
+        """ Optional. Yield the package in chunks, while adding the items of 
+            the iterable `items`, tuples of file object, size and location. 
+            The chunks of an item shall be yielded as soon as it was added.
+        """
+
     def get_mime_type(self, package, format, params):
         """ Retrieve the output mime type for the given package and/or format
             specifier.
@@ -34,7 +34,7 @@ from itertools import chain
 from django.db.models import Q
 
 from eoxserver.core import Component, implements
-from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.models import cast_all
 from eoxserver.core.decoders import xml, kvp, typelist, upper, enum
 from eoxserver.resources.coverages import models
 from eoxserver.services.ows.interfaces import (
@@ -73,7 +73,7 @@ class WCS20DescribeEOCoverageSetHandler(Component):
 
     @property
     def constraints(self):
-        reader = WCSEOConfigReader(get_eoxserver_config())
+        reader = WCSEOConfigReader.from_config()
         return {
             "CountDefault": reader.paging_count_default
         }
@@ -121,28 +121,15 @@ class WCS20DescribeEOCoverageSetHandler(Component):
             identifier__in=eo_ids
         ), containment="overlaps")
 
-        # create a set of all indirectly referenced containers by iterating
-        # recursively. The containment is set to "overlaps", to also include 
-        # collections that might have been excluded with "contains" but would 
-        # have matching coverages inserted.
-
-        def recursive_lookup(super_collection, collection_set):
-            sub_collections = models.Collection.objects.filter(
-                collections__in=[super_collection.pk]
-            ).exclude(
-                pk__in=map(lambda c: c.pk, collection_set)
-            )
-            sub_collections = subsets.filter(sub_collections, "overlaps")
-
-            # Add all to the set
-            collection_set |= set(sub_collections)
-
-            for sub_collection in sub_collections:
-                recursive_lookup(sub_collection, collection_set)
+        # create a set of all indirectly referenced containers by looking them
+        # up in the collection closure. The containment is set to "overlaps",
+        # to also include collections that might have been excluded with
+        # "contains" but would have matching coverages inserted.
 
         collection_set = set(collections_qs)
-        for collection in set(collection_set):
-            recursive_lookup(collection, collection_set)
+        collection_set |= set(subsets.filter(models.Collection.objects.filter(
+            ancestor_links__ancestor__in=[c.pk for c in collection_set]
+        ).distinct(), "overlaps"))
 
         collection_pks = map(lambda c: c.pk, collection_set)
 
@@ -185,23 +172,26 @@ class WCS20DescribeEOCoverageSetHandler(Component):
 
         # if containment is "contains" we need to check all collections again
         if containment == "contains":
-            collection_set = filter(lambda c: subsets.matches(c), collection_set)
+            collection_set = subsets.select(collection_set)
 
-        coverages = set()
-        dataset_series = set()
+        coverages = []
+        dataset_series = []
 
         # finally iterate over everything that has been retrieved and get
         # a list of dataset series and coverages to be encoded into the response
         for eo_object in chain(coverages_qs, collection_set):
             if inc_cov_section and issubclass(eo_object.real_type, models.Coverage):
-                coverages.add(eo_object.cast())
+                coverages.append(eo_object)
             elif inc_dss_section and issubclass(eo_object.real_type, models.DatasetSeries):
-                dataset_series.add(eo_object.cast())
+                dataset_series.append(eo_object)
 
             else:
                 # TODO: what to do here?
                 pass
 
+        coverages = set(cast_all(coverages))
+        dataset_series = set(cast_all(dataset_series))
+
         # TODO: coverages should be sorted
         #coverages = sorted(coverages, ) 
 
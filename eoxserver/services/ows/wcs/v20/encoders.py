@@ -32,7 +32,6 @@ from lxml import etree
 from django.contrib.gis.geos import Polygon, MultiPolygon
 from django.utils.timezone import now
 
-from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.util.xmltools import XMLEncoder
 from eoxserver.core.util.timetools import isoformat
 from eoxserver.backends.access import retrieve
@@ -55,7 +54,7 @@ from eoxserver.services.ows.wcs.v20.util import (
 
 class WCS20CapabilitiesXMLEncoder(OWS20Encoder):
     def encode_capabilities(self, sections, coverages_qs=None, dataset_series_qs=None):
-        conf = CapabilitiesConfigReader(get_eoxserver_config())
+        conf = CapabilitiesConfigReader.from_config()
 
         all_sections = "all" in sections
         caps = []
@@ -629,20 +628,38 @@ class WCS20EOXMLEncoder(WCS20CoverageDescriptionXMLEncoder, EOP20Encoder, OWS20E
             for eo_object, contribution in reversed(actual_contributions)
         ])
 
-    def alter_rectified_dataset(self, coverage, request, tree, subset_polygon=None):
-        return EOWCS("RectifiedDataset", *(
-            tree.getchildren() + [
-                self.encode_eo_metadata(coverage, request, subset_polygon)
-            ]
-        ), **tree.attrib)
-
-    def alter_rectified_stitched_mosaic(self, coverage, request, tree, subset_polygon=None):
-        return EOWCS("RectifiedStitchedMosaic", *(
-            tree.getchildren() + [
-                self.encode_eo_metadata(coverage, request, subset_polygon),
+    def encode_rectified_dataset(self, coverage, range_type, reference,
+                                 mime_type, subset=None, request=None):
+        """ Encodes a RectifiedDataset or RectifiedStitchedMosaic as the first
+            part of a multipart GetCoverage response. The ``subset`` is a tuple
+            of the SRID, size, extent and subset footprint of the rendered 
+            coverage.
+        """
+        if not subset:
+            srid, size, extent = coverage.srid, coverage.size, coverage.extent
+            subset_polygon = None
+        else:
+            srid, size, extent, subset_polygon = subset
+
+        contents = [
+            self.encode_bounded_by(extent, crss.get_spatial_reference(srid)),
+            self.encode_domain_set(coverage, srid, size, extent, True),
+            self.encode_range_set(reference, mime_type),
+            self.encode_range_type(range_type),
+            self.encode_eo_metadata(coverage, request, subset_polygon)
+        ]
+
+        if issubclass(coverage.real_type, RectifiedStitchedMosaic):
+            tag = "RectifiedStitchedMosaic"
+            contents.append(
                 self.encode_contributing_datasets(coverage, subset_polygon)
-            ]
-        ), **tree.attrib)
+            )
+        else:
+            tag = "RectifiedDataset"
+
+        return EOWCS(tag, *contents, **{
+            ns_gml("id"): self.get_gml_id(coverage.identifier)
+        })
 
     def encode_referenceable_dataset(self, coverage, range_type, reference, 
                                      mime_type, subset=None):
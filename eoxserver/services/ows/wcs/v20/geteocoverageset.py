@@ -35,6 +35,7 @@ from itertools import chain
 from cStringIO import StringIO
 import mimetypes
 
+from django.db import connection
 from django.db.models import Q
 from django.http import HttpResponse
 try:
@@ -43,7 +44,11 @@ except:
     StreamingHttpResponse = HttpResponse
 
 from eoxserver.core import Component, implements, ExtensionPoint
-from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.models import cast_all
+from eoxserver.core.util.iteratortools import parallel_imap
+from eoxserver.backends.cache import (
+    setup_cache_session, shutdown_cache_session
+)
 from eoxserver.core.decoders import xml, kvp, typelist, upper, enum
 from eoxserver.resources.coverages import models
 from eoxserver.services.ows.interfaces import (
@@ -114,7 +119,7 @@ class WCS20GetEOCoverageSetHandler(Component):
 
     @property
     def constraints(self):
-        reader = WCSEOConfigReader(get_eoxserver_config())
+        reader = WCSEOConfigReader.from_config()
         return {
             "CountDefault": reader.paging_count_default
         }
@@ -160,28 +165,15 @@ class WCS20GetEOCoverageSetHandler(Component):
             identifier__in=eo_ids
         ), containment="overlaps")
 
-        # create a set of all indirectly referenced containers by iterating
-        # recursively. The containment is set to "overlaps", to also include 
-        # collections that might have been excluded with "contains" but would 
-        # have matching coverages inserted.
-
-        def recursive_lookup(super_collection, collection_set):
-            sub_collections = models.Collection.objects.filter(
-                collections__in=[super_collection.pk]
-            ).exclude(
-                pk__in=map(lambda c: c.pk, collection_set)
-            )
-            sub_collections = subsets.filter(sub_collections, "overlaps")
-
-            # Add all to the set
-            collection_set |= set(sub_collections)
-
-            for sub_collection in sub_collections:
-                recursive_lookup(sub_collection, collection_set)
+        # create a set of all indirectly referenced containers by looking them
+        # up in the collection closure. The containment is set to "overlaps",
+        # to also include collections that might have been excluded with
+        # "contains" but would have matching coverages inserted.
 
         collection_set = set(collections_qs)
-        for collection in set(collection_set):
-            recursive_lookup(collection, collection_set)
+        collection_set |= set(subsets.filter(models.Collection.objects.filter(
+            ancestor_links__ancestor__in=[c.pk for c in collection_set]
+        ).distinct(), "overlaps"))
 
         collection_pks = map(lambda c: c.pk, collection_set)
 
@@ -221,41 +213,62 @@ class WCS20GetEOCoverageSetHandler(Component):
 
         # TODO: if containment is "within" we need to check all collections again
         if containment == "within":
-            collection_set = filter(lambda c: subsets.matches(c), collection_set)
+            collection_set = subsets.select(collection_set)
 
-        coverages = []
         dataset_series = []
 
         # finally iterate over everything that has been retrieved and get
         # a list of dataset series and coverages to be encoded into the response
-        for eo_object in chain(coverages_qs, collection_set):
-            if issubclass(eo_object.real_type, models.Coverage):
-                coverages.append(eo_object.cast())
+        coverages = cast_all(
+            eo_object for eo_object in chain(coverages_qs, collection_set)
+            if issubclass(eo_object.real_type, models.Coverage)
+        )
+
+
+        reader = WCSEOConfigReader.from_config()
+        workers = reader.eocoverageset_workers
+
+        def render(coverage):
+            params = self.get_params(coverage, decoder, request)
+            renderer = self.get_renderer(params)
+            return coverage, renderer.render(params)
+
+        if reader.eocoverageset_streaming and hasattr(writer, "stream_package"):
+            # render in worker threads, as the response is consumed after 
+            # the cache session of this request was shut down
+            rendered = parallel_imap(
+                render, coverages, workers, 
+                initializer=setup_cache_session, finalizer=_finalize_worker,
+                discard=_delete_rendered
+            )
+
+            mime_type = writer.get_mime_type(None, format, format_params)
+            ext = writer.get_file_extension(None, format, format_params)
 
+            response = StreamingHttpResponse(
+                writer.stream_package(
+                    iter_package_items(rendered), format, format_params
+                ), mime_type
+            )
+            response["Content-Disposition"] = 'inline; filename="ows%s"' % ext
+            return response
+
+        if workers > 1:
+            rendered = parallel_imap(
+                render, coverages, workers, 
+                initializer=setup_cache_session, finalizer=_finalize_worker,
+                discard=_delete_rendered
+            )
+        else:
+            rendered = (render(coverage) for coverage in coverages)
 
         fd, pkg_filename = tempfile.mkstemp()
         tmp = os.fdopen(fd)
         tmp.close()
         package = writer.create_package(pkg_filename, format, format_params)
 
-        for coverage in coverages:
-            params = self.get_params(coverage, decoder, request)
-            renderer = self.get_renderer(params)
-            result_set = renderer.render(params)
-            all_filenames = set()
-            for result_item in result_set:
-                if not result_item.filename:
-                    ext = mimetypes.guess_extension(result_item.content_type)
-                    filename = coverage.identifier + ext
-                else:
-                    filename = result_item.filename
-                if filename in all_filenames:
-                    continue # TODO: create new filename
-                all_filenames.add(filename)
-                location = "%s/%s" % (coverage.identifier, filename)
-                writer.add_to_package(
-                    package, result_item.data_file, result_item.size, location
-                )
+        for file_obj, size, location in iter_package_items(rendered):
+            writer.add_to_package(package, file_obj, size, location)
 
         mime_type = writer.get_mime_type(package, format, format_params)
         ext = writer.get_file_extension(package, format, format_params)
@@ -270,16 +283,64 @@ class WCS20GetEOCoverageSetHandler(Component):
         return response
 
 
-def tempfile_iterator(filename, chunksize=2048, delete=True):
-    with open(filename) as file_obj:
-        while True:
-            data = file_obj.read(chunksize)
-            if not data:
-                break
-            yield data
-
-    if delete:
-        os.remove(filename)
+def iter_package_items(rendered):
+    """ Yields tuples of file object, size and location within the package for
+        all items of the given (coverage, result set) tuples. The result items
+        are deleted after they were consumed. When this generator is closed
+        early, the `rendered` iterator is closed as well, so that results
+        still in progress can be released.
+    """
+    try:
+        for coverage, result_set in rendered:
+            all_filenames = set()
+            try:
+                for result_item in result_set:
+                    if not result_item.filename:
+                        ext = mimetypes.guess_extension(
+                            result_item.content_type
+                        )
+                        filename = coverage.identifier + ext
+                    else:
+                        filename = result_item.filename
+                    if filename in all_filenames:
+                        continue # TODO: create new filename
+                    all_filenames.add(filename)
+                    location = "%s/%s" % (coverage.identifier, filename)
+                    yield result_item.data_file, result_item.size, location
+            finally:
+                _delete_rendered((coverage, result_set))
+    finally:
+        close = getattr(rendered, "close", None)
+        if close:
+            close()
+
+
+def _delete_rendered(rendered):
+    _, result_set = rendered
+    for result_item in result_set:
+        try:
+            result_item.delete()
+        except:
+            pass
+
+
+def _finalize_worker():
+    shutdown_cache_session()
+    connection.close()
+
+
+def tempfile_iterator(filename, chunksize=65536, delete=True):
+    try:
+        with open(filename) as file_obj:
+            while True:
+                data = file_obj.read(chunksize)
+                if not data:
+                    break
+                yield data
+    finally:
+        # also remove the file when the response is abandoned
+        if delete:
+            os.remove(filename)
 
 
 def pos_int(value):
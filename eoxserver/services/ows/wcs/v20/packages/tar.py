@@ -27,7 +27,9 @@
 #-------------------------------------------------------------------------------
 
 
+import zlib
 import tarfile
+from cStringIO import StringIO
 
 from eoxserver.core import Component, implements
 from eoxserver.services.ows.wcs.interfaces import (
@@ -59,6 +61,41 @@ class TarPackageWriter(Component):
 
         return tarfile.open(filename, mode)
 
+    def stream_package(self, items, format, params):
+        """ Yields the package in chunks, each time an item of ``items`` 
+            (a tuple of file object, size and location) was added.
+        """
+        # gzip compression is done here, to be able to flush the compressed
+        # data after each item
+        compressor = None
+        if format in gzip_mimes:
+            compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            mode = "w|"
+        elif format in bzip_mimes:
+            mode = "w|bz2"
+        else:
+            mode = "w|"
+
+        sink = StringIO()
+        package = tarfile.open(
+            fileobj=sink, mode=mode, bufsize=tarfile.BLOCKSIZE
+        )
+        for file_obj, size, location in items:
+            self.add_to_package(package, file_obj, size, location)
+            data = _drain(sink)
+            if compressor:
+                data = (
+                    compressor.compress(data) 
+                    + compressor.flush(zlib.Z_SYNC_FLUSH)
+                )
+            yield data
+
+        package.close()
+        data = _drain(sink)
+        if compressor:
+            data = compressor.compress(data) + compressor.flush()
+        yield data
+
     def cleanup(self, package):
         package.close()
 
@@ -78,3 +115,12 @@ class TarPackageWriter(Component):
             return ".tar.bz2"
 
         return ".tar"
+
+
+def _drain(sink):
+    """ Returns and removes all data written to the `StringIO` sink so far.
+    """
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
@@ -27,6 +27,9 @@
 #-------------------------------------------------------------------------------
 
 
+import zlib
+import time
+import struct
 import zipfile
 
 from eoxserver.core import Component, implements
@@ -47,6 +50,21 @@ class ZipPackageWriter(Component):
             compression = zipfile.ZIP_DEFLATED
         return zipfile.ZipFile(filename, "a", compression)
 
+    def stream_package(self, items, format, params):
+        """ Yields the package in chunks, while the items of ``items`` (tuples 
+            of file object, size and location) are added. As the package is 
+            not seekable, the sizes and checksums of the entries are written
+            in data descriptors following each entry.
+        """
+        compression = zipfile.ZIP_STORED
+        if params.get("compression", "").upper() == "DEFLATED":
+            compression = zipfile.ZIP_DEFLATED
+
+        return stream_zip(
+            ((file_obj, location) for file_obj, _, location in items),
+            compression
+        )
+
     def cleanup(self, package):
         package.close()
 
@@ -57,4 +75,93 @@ class ZipPackageWriter(Component):
         return "application/zip"
 
     def get_file_extension(self, package, format, params):
-        return ".zip"
\ No newline at end of file
+        return ".zip"
+
+
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+DATA_DESCRIPTOR = struct.Struct("<4s3L")
+CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+END_OF_CENTRAL_DIRECTORY = struct.Struct("<4s4H2LH")
+
+
+def stream_zip(items, compression=zipfile.ZIP_STORED, chunk_size=65536):
+    """ Generator to write a ZIP file from the given tuples of file objects and
+        locations in chunks to a non-seekable stream. ZIP64 extensions are not
+        supported, so neither single entries nor the whole file may exceed 
+        4GB.
+    """
+    entries = []
+    offset = 0
+
+    for file_obj, location in items:
+        if isinstance(location, unicode):
+            location = location.encode("utf-8")
+
+        date_time = time.localtime()[:6]
+        dos_date = (date_time[0] - 1980) << 9 | date_time[1] << 5 | date_time[2]
+        dos_time = date_time[3] << 11 | date_time[4] << 5 | date_time[5] // 2
+
+        # bit 3: sizes and CRC are stored in the data descriptor
+        flags = 0x08
+        header = LOCAL_HEADER.pack(
+            "PK\x03\x04", 20, flags, compression, dos_time, dos_date,
+            0, 0, 0, len(location), 0
+        ) + location
+        yield header
+
+        if compression == zipfile.ZIP_DEFLATED:
+            compressor = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15
+            )
+        else:
+            compressor = None
+
+        crc = 0
+        compressed_size = 0
+        size = 0
+        while True:
+            chunk = file_obj.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            crc = zlib.crc32(chunk, crc)
+            if compressor:
+                chunk = compressor.compress(chunk)
+            compressed_size += len(chunk)
+            if chunk:
+                yield chunk
+
+        if compressor:
+            chunk = compressor.flush()
+            compressed_size += len(chunk)
+            yield chunk
+
+        if max(size, compressed_size, offset) > 0xFFFFFFFF:
+            raise ValueError(
+                "Entry '%s' exceeds the size limits of ZIP files." % location
+            )
+
+        crc &= 0xFFFFFFFF
+        yield DATA_DESCRIPTOR.pack("PK\x07\x08", crc, compressed_size, size)
+
+        entries.append((
+            location, flags, dos_time, dos_date, crc, compressed_size, size,
+            offset
+        ))
+        offset += len(header) + compressed_size + DATA_DESCRIPTOR.size
+
+    central_directory = []
+    for (location, flags, dos_time, dos_date, crc, compressed_size, size,
+         header_offset) in entries:
+        central_directory.append(CENTRAL_HEADER.pack(
+            "PK\x01\x02", 20, 20, flags, compression, dos_time, dos_date,
+            crc, compressed_size, size, len(location), 0, 0, 0, 0,
+            0600 << 16, header_offset
+        ) + location)
+
+    central_directory = "".join(central_directory)
+    yield central_directory
+    yield END_OF_CENTRAL_DIRECTORY.pack(
+        "PK\x05\x06", 0, 0, len(entries), len(entries),
+        len(central_directory), offset, 0
+    )
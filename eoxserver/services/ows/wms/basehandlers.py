@@ -32,12 +32,20 @@ a specific handler. Interface methods need to be overridden in order to work,
 default methods can be overidden.
 """
 
+import threading
+from collections import OrderedDict
+
+from django.db.models.signals import post_save, post_delete
+
 from eoxserver.core import UniqueExtensionPoint
 from eoxserver.resources.coverages import models
+from eoxserver.services.ows.common.config import (
+    CapabilitiesConfigReader, WMSCapabilitiesConfigReader
+)
 from eoxserver.services.ows.wms.interfaces import (
     WMSCapabilitiesRendererInterface
 )
-from eoxserver.services.result import to_http_response
+from eoxserver.services.result import to_http_response, ResultBuffer
 
 
 class WMSGetCapabilitiesHandlerBase(object):
@@ -50,19 +58,109 @@ class WMSGetCapabilitiesHandlerBase(object):
     renderer = UniqueExtensionPoint(WMSCapabilitiesRendererInterface)
 
     def handle(self, request):
+        key = None
+        if WMSCapabilitiesConfigReader.from_config().capabilities_cache:
+            conf = CapabilitiesConfigReader.from_config()
+            key = (
+                type(self), conf.http_service_url, conf.update_sequence,
+                tuple(sorted(
+                    (name.lower(), value)
+                    for name, value in request.GET.items()
+                ))
+            )
+            result = _capabilities_cache.get(key)
+            if result is not None:
+                return to_http_response(result)
+
+        version = _capabilities_cache.version
+
         collections_qs = models.Collection.objects \
             .order_by("identifier") \
             .exclude(
                 footprint__isnull=True, begin_time__isnull=True, 
                 end_time__isnull=True
             )
-        coverages = [
-            coverage for coverage in models.Coverage.objects \
-                .filter(visible=True)
-            if not issubclass(coverage.real_type, models.Collection)
+
+        # exclude collections by their type ID instead of casting each object
+        collection_type_ids = [
+            type_id 
+            for type_id, cls in models.EO_OBJECT_TYPE_REGISTRY.items()
+            if issubclass(cls, models.Collection)
         ]
+        coverages = models.Coverage.objects \
+            .filter(visible=True) \
+            .exclude(real_content_type__in=collection_type_ids)
 
         result, _ = self.renderer.render(
             collections_qs, coverages, request.GET.items()
         )
+
+        if key is not None:
+            # keep a copy of the rendered result, as it may reference a 
+            # temporary buffer
+            result = [
+                ResultBuffer(
+                    str(item.data), item.content_type, item.filename, 
+                    item.identifier
+                ) for item in result
+            ]
+            _capabilities_cache.put(key, result, version)
+
         return to_http_response(result)
+
+
+class CapabilitiesCache(object):
+    """ Bounded cache of rendered capabilities documents. The cache is cleared
+        whenever an EO object or a collection link is saved or deleted within
+        this process. Changes made by other processes (e.g: management
+        commands) require the `update_sequence` to be increased.
+    """
+
+    def __init__(self, max_entries=16):
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        self._max_entries = max_entries
+
+    @property
+    def version(self):
+        return self._version
+
+    def get(self, key):
+        with self._lock:
+            result = self._results.pop(key, None)
+            if result is not None:
+                self._results[key] = result
+            return result
+
+    def put(self, key, result, version):
+        with self._lock:
+            if version != self._version:
+                # the result was rendered before an invalidation
+                return
+            self._results[key] = result
+            while len(self._results) > self._max_entries:
+                self._results.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._results.clear()
+
+
+_capabilities_cache = CapabilitiesCache()
+
+
+def _invalidate_capabilities_cache(sender, instance, **kwargs):
+    if isinstance(instance, (
+            models.EOObject, models.EOObjectToCollectionThrough)):
+        _capabilities_cache.invalidate()
+
+post_save.connect(
+    _invalidate_capabilities_cache, 
+    dispatch_uid="eoxs_wms_capabilities_cache_save"
+)
+post_delete.connect(
+    _invalidate_capabilities_cache, 
+    dispatch_uid="eoxs_wms_capabilities_cache_delete"
+)
@@ -0,0 +1,344 @@
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+
+"""\
+This module provides a server side cache for WMS GetMap requests that are
+aligned to a regular tile grid. Tiles are rendered in larger metatiles which
+are sliced into the single tiles and stored in a size bounded cache directory.
+"""
+
+import os
+import logging
+import threading
+from hashlib import sha1
+from uuid import uuid4
+
+from django.db.models import Q, Max, Count
+
+from eoxserver.core.decoders import config
+from eoxserver.contrib import gdal, vsi
+from eoxserver.backends.cache import CacheContext
+from eoxserver.resources.coverages import models
+from eoxserver.services.result import ResultBuffer
+
+
+logger = logging.getLogger(__name__)
+
+
+# origins of the supported tile grids per SRID
+GRID_ORIGINS = {
+    4326: (-180.0, -90.0),
+    3857: (-20037508.342789244, -20037508.342789244),
+    900913: (-20037508.342789244, -20037508.342789244),
+}
+
+# GDAL drivers and file extensions for the supported tile formats
+TILE_FORMATS = {
+    "image/png": ("PNG", "png"),
+    "image/jpeg": ("JPEG", "jpg"),
+}
+
+
+class TileCacheConfigReader(config.Reader):
+    section = "services.ows.wms"
+    tile_cache = config.Option(type=bool, default=False)
+    tile_cache_directory = config.Option(default=None)
+    tile_cache_max_size = config.Option(type=int, default=None)
+    tile_size = config.Option(type=int, default=256)
+    metatile_size = config.Option(type=int, default=4)
+
+
+# tile caches of this process, shared by all requests
+_tile_caches = {}
+_tile_caches_lock = threading.Lock()
+
+
+def get_tile_cache(config=None):
+    """ Returns the configured :class:`TileCache` or `None` if the tile cache
+        is disabled. The tile cache is created only once per process.
+    """
+    reader = TileCacheConfigReader.from_config(config)
+    if not reader.tile_cache or not reader.tile_cache_directory:
+        return None
+
+    key = (
+        reader.tile_cache_directory, reader.tile_cache_max_size,
+        reader.tile_size, reader.metatile_size
+    )
+    with _tile_caches_lock:
+        tile_cache = _tile_caches.get(key)
+        if tile_cache is None:
+            tile_cache = TileCache(*key)
+            _tile_caches[key] = tile_cache
+        return tile_cache
+
+
+class TileCache(object):
+    """ Cache for grid aligned GetMap requests. Tiles are identified by all
+        request parameters except the bounding box, the position in the grid
+        and the modification state of the requested layers. Thus, tiles of
+        modified coverages or collections are never served again and are
+        eventually evicted when the cache exceeds its `max_size` in bytes.
+        Instances are shared by the threads of a process and shall be obtained
+        using :func:`get_tile_cache`.
+    """
+
+    def __init__(self, cache_directory, max_size=None, tile_size=256,
+                 metatile_size=4):
+        self._cache = CacheContext(
+            cache_directory=cache_directory, managed=True, persistent=True,
+            max_size=max_size
+        )
+        self._tile_size = tile_size
+        self._metatile_size = max(metatile_size, 1)
+
+
+    def render(self, layers, suffixes, srid, bbox, swap_axes, request_values,
+               render):
+        """ Returns the result for a GetMap request of the given layers from
+            the cache, or renders the metatile containing the requested tile
+            using the `render` callable. `render` is passed the bounding box
+            (minx, miny, maxx, maxy) and the request values to render and
+            shall return a result set. `swap_axes` determines whether the
+            "bbox" parameter is in (y, x) order. Returns `None` if the request
+            is not a tile request or if the rendered result cannot be sliced.
+        """
+
+        params = dict((key.lower(), value) for key, value in request_values)
+
+        tile = self._get_tile_position(srid, bbox, params)
+        if tile is None:
+            return None
+
+        content_type = params["format"].lower()
+        driver_name, extension = TILE_FORMATS[content_type]
+        span, i, j = tile
+
+        digest = sha1(repr((
+            srid, "%.10g" % span,
+            sorted(
+                (key, value) for key, value in params.items() if key != "bbox"
+            ),
+            self._get_modification_state(layers, suffixes)
+        ))).hexdigest()
+
+        tile_path = self._tile_path(digest, i, j, extension)
+        data = self._read_tile(tile_path)
+        if data is not None:
+            return [ResultBuffer(data, content_type)]
+
+        n = self._metatile_size
+        mi, mj = i // n, j // n
+        with self._cache.lock(self._tile_path(digest, mi, mj, "meta")):
+            # another thread or process may have rendered the metatile
+            # in the meantime
+            data = self._read_tile(tile_path)
+            if data is None:
+                logger.debug(
+                    "Rendering metatile %d/%d for tile %d/%d." % (mi, mj, i, j)
+                )
+                rendered = self._render_metatile(
+                    digest, span, mi, mj, srid, swap_axes, request_values,
+                    content_type, driver_name, extension, render
+                )
+                if not rendered:
+                    return None
+                data = self._read_tile(tile_path)
+
+        # write the recorded accesses to the cache index, items are only
+        # evicted when committing tiles exceeds the maximum size
+        self._cache.cleanup()
+
+        if data is None:
+            return None
+        return [ResultBuffer(data, content_type)]
+
+
+    def _get_tile_position(self, srid, bbox, params):
+        """ Returns a tuple of the tile span and the column and row of the tile
+            within the grid or `None` if the request is not grid aligned.
+        """
+        if srid not in GRID_ORIGINS:
+            return None
+
+        if params.get("format", "").lower() not in TILE_FORMATS:
+            return None
+
+        try:
+            width = int(params.get("width"))
+            height = int(params.get("height"))
+        except (TypeError, ValueError):
+            return None
+
+        if width != self._tile_size or height != self._tile_size:
+            return None
+
+        minx, miny, maxx, maxy = bbox
+        span = maxx - minx
+        if span <= 0 or abs((maxy - miny) - span) > span * 1e-6:
+            return None
+
+        origin_x, origin_y = GRID_ORIGINS[srid]
+        column = (minx - origin_x) / span
+        row = (miny - origin_y) / span
+        i, j = int(round(column)), int(round(row))
+        if abs(column - i) > 1e-6 or abs(row - j) > 1e-6:
+            return None
+
+        return span, i, j
+
+
+    def _get_modification_state(self, layers, suffixes):
+        """ Returns the time of the latest modification and the number of the
+            EO objects referenced by the given layer names and of their
+            contained objects.
+        """
+        identifiers = set(layers)
+        for layer in layers:
+            for suffix in suffixes:
+                if suffix and layer.endswith(suffix):
+                    identifiers.add(layer[:-len(suffix)])
+
+        state = models.EOObject.objects.filter(
+            Q(identifier__in=identifiers)
+            | Q(ancestor_links__ancestor__identifier__in=identifiers)
+        ).aggregate(Max("modified"), Count("pk", distinct=True))
+
+        return state["modified__max"], state["pk__count"]
+
+
+    def _tile_path(self, digest, i, j, extension):
+        return os.path.join(
+            digest[:2], digest, "%d_%d.%s" % (i, j, extension)
+        )
+
+
+    def _read_tile(self, tile_path):
+        if not self._cache.contains(tile_path):
+            return None
+
+        try:
+            with open(self._cache.relative_path(tile_path), "rb") as f:
+                return f.read()
+        except IOError:
+            # the tile was evicted in the meantime
+            return None
+
+
+    def _render_metatile(self, digest, span, mi, mj, srid, swap_axes,
+                         request_values, content_type, driver_name, extension,
+                         render):
+        n = self._metatile_size
+        size = n * self._tile_size
+
+        origin_x, origin_y = GRID_ORIGINS[srid]
+        minx = origin_x + mi * n * span
+        miny = origin_y + mj * n * span
+        maxx = minx + n * span
+        maxy = miny + n * span
+
+        if swap_axes:
+            bbox = (miny, minx, maxy, maxx)
+        else:
+            bbox = (minx, miny, maxx, maxy)
+
+        values = [
+            (key, value) for key, value in request_values
+            if key.lower() not in ("bbox", "width", "height")
+        ]
+        values.extend((
+            ("bbox", ",".join("%.16g" % v for v in bbox)),
+            ("width", str(size)),
+            ("height", str(size)),
+        ))
+
+        result = render(minx, miny, maxx, maxy, values)
+        if (len(result) != 1 or (result[0].content_type or "")
+                .split(";")[0].strip().lower() != content_type):
+            # most likely an exception report, which is not cached
+            return False
+
+        metatile_path = "/vsimem/%s" % uuid4().hex
+        gdal.FileFromMemBuffer(metatile_path, str(result[0].data))
+        try:
+            metatile = gdal.Open(metatile_path)
+            self._slice_metatile(
+                metatile, digest, mi, mj, driver_name, extension
+            )
+            metatile = None
+        finally:
+            vsi.remove(metatile_path)
+
+        return True
+
+
+    def _slice_metatile(self, metatile, digest, mi, mj, driver_name,
+                        extension):
+        """ Slices the metatile into the single tiles and stores them in the
+            cache.
+        """
+        n = self._metatile_size
+        tile_size = self._tile_size
+        driver = gdal.GetDriverByName(driver_name)
+        mem_driver = gdal.GetDriverByName("MEM")
+
+        for x in range(n):
+            for y in range(n):
+                # rows of the grid are counted upwards, rows of the image
+                # downwards
+                x_off = x * tile_size
+                y_off = (n - 1 - y) * tile_size
+
+                tile = mem_driver.Create(
+                    "", tile_size, tile_size, metatile.RasterCount,
+                    metatile.GetRasterBand(1).DataType
+                )
+                for index in range(1, metatile.RasterCount + 1):
+                    src = metatile.GetRasterBand(index)
+                    dst = tile.GetRasterBand(index)
+                    dst.WriteRaster(
+                        0, 0, tile_size, tile_size,
+                        src.ReadRaster(x_off, y_off, tile_size, tile_size)
+                    )
+                    dst.SetColorInterpretation(src.GetColorInterpretation())
+                    color_table = src.GetColorTable()
+                    if color_table:
+                        dst.SetColorTable(color_table)
+
+                tile_path = self._tile_path(
+                    digest, mi * n + x, mj * n + y, extension
+                )
+                temporary_path = self._cache.temporary_path(tile_path)
+                driver.CreateCopy(temporary_path, tile)
+                tile = None
+
+                # remove any auxiliary file written by GDAL
+                if os.path.exists(temporary_path + ".aux.xml"):
+                    os.remove(temporary_path + ".aux.xml")
+
+                self._cache.commit(tile_path, temporary_path)
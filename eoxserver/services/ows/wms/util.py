@@ -28,7 +28,11 @@
 
 
 import logging
+from itertools import chain
 
+from django.db.models import Q
+
+from eoxserver.core.models import cast_all
 from eoxserver.resources.coverages import models
 from eoxserver.core.decoders import InvalidParameterException
 from eoxserver.core.util.timetools import parse_iso8601
@@ -77,79 +81,116 @@ def lookup_layers(layers, subsets, suffixes=None):
     """ Performs a layer lookup for the given layer names. Applies the given 
         subsets and looks up all layers with the given suffixes. Returns a 
         hierarchy of ``LayerSelection`` objects.
+
+        The lookup is performed set-based: all layer names are resolved with a
+        single query, the collection hierarchies are fetched with two queries
+        and all coverages are cast with one query per coverage type.
     """
     suffix_related_ids = {}
     root_group = LayerSelection(None)
     suffixes = suffixes or (None,)
     logger.debug(str(suffixes))
 
-
+    # resolve the candidate identifiers of all layer names at once
+    candidates = []
     for layer_name in layers:
+        layer_candidates = []
         for suffix in suffixes:
             if not suffix:
-                identifier = layer_name
+                layer_candidates.append((layer_name, suffix))
             elif layer_name.endswith(suffix):
-                identifier = layer_name[:-len(suffix)]
-            else:
-                continue
-            
-            # TODO: nasty, nasty bug... dunno where
-            eo_objects = models.EOObject.objects.filter(
-                identifier=identifier
-            )
-            if len(eo_objects):
-                eo_object = eo_objects[0]
+                layer_candidates.append((layer_name[:-len(suffix)], suffix))
+        candidates.append((layer_name, layer_candidates))
+
+    eo_objects_by_identifier = dict(
+        (eo_object.identifier, eo_object)
+        for eo_object in models.EOObject.objects.filter(identifier__in=set(
+            identifier
+            for _, layer_candidates in candidates
+            for identifier, _ in layer_candidates
+        ))
+    )
+
+    selected = []
+    for layer_name, layer_candidates in candidates:
+        for identifier, suffix in layer_candidates:
+            eo_object = eo_objects_by_identifier.get(identifier)
+            if eo_object is not None:
+                selected.append((eo_object, suffix))
                 break
         else:
             raise LayerNotDefined(layer_name)
 
+    # fetch the contents of all requested collections and their
+    # sub-collections at once
+    children = _lookup_children(
+        [
+            eo_object.pk for eo_object, _ in selected
+            if models.iscollection(eo_object)
+        ], subsets
+    )
+
+    # evaluate the subsets for all directly requested coverages at once
+    matching_ids = set(
+        eo_object.pk for eo_object in subsets.select(
+            eo_object for eo_object, _ in selected
+            if models.iscoverage(eo_object)
+        )
+    )
+
+    # cast all coverages in bulk
+    cast_objects = dict(
+        (coverage.pk, coverage) for coverage in cast_all(
+            eo_object for eo_object in chain(
+                (eo_object for eo_object, _ in selected),
+                chain.from_iterable(children.values())
+            )
+            if models.iscoverage(eo_object)
+        )
+    )
+
+    def recursive_lookup(collection, used_ids):
+        # get all EO objects related to this collection, excluding those
+        # already searched
+        excluded_ids = set(used_ids)
+        selection = LayerSelection()
+
+        # append all retrived EO objects, either as a coverage of the real
+        # type, or as a subgroup.
+        for eo_object in children.get(collection.pk, ()):
+            if eo_object.pk in excluded_ids:
+                continue
+
+            used_ids.add(eo_object.pk)
+
+            if models.iscoverage(eo_object):
+                selection.append(
+                    cast_objects[eo_object.pk], eo_object.identifier
+                )
+            elif models.iscollection(eo_object):
+                selection.extend(recursive_lookup(eo_object, used_ids))
+
+        return selection
+
+    for eo_object, suffix in selected:
         if models.iscollection(eo_object):
             # recursively iterate over all sub-collections and collect all
             # coverages
-
             used_ids = suffix_related_ids.setdefault(suffix, set())
 
-            def recursive_lookup(collection, suffix, used_ids, subsets):
-                # get all EO objects related to this collection, excluding 
-                # those already searched
-                eo_objects = models.EOObject.objects.filter(
-                    collections__in=[collection.pk]
-                ).exclude(
-                    pk__in=used_ids
-                ).order_by("begin_time", "end_time")
-                # apply subsets
-                eo_objects = subsets.filter(eo_objects)
-
-                selection = LayerSelection()
-
-                # append all retrived EO objects, either as a coverage of 
-                # the real type, or as a subgroup.
-                for eo_object in eo_objects:
-                    used_ids.add(eo_object.pk)
-
-                    if models.iscoverage(eo_object):
-                        selection.append(eo_object.cast(), eo_object.identifier)
-                    elif models.iscollection(eo_object):
-                        selection.extend(recursive_lookup(
-                            eo_object, suffix, used_ids, subsets
-                        ))
-                    else: 
-                        pass
-
-                return selection
-
             root_group.append(
                 LayerSelection(
-                    eo_object, suffix,
-                    recursive_lookup(eo_object, suffix, used_ids, subsets)
+                    eo_object, suffix, recursive_lookup(eo_object, used_ids)
                 )
             )
 
         elif models.iscoverage(eo_object):
             # Add a layer selection for the coverage with the suffix
             selection = LayerSelection(None, suffix=suffix)
-            if subsets.matches(eo_object):
-                selection.append(eo_object.cast(), eo_object.identifier)
+            if eo_object.pk in matching_ids:
+                selection.append(
+                    cast_objects[eo_object.pk], eo_object.identifier
+                )
             else:
                 selection.append(None, eo_object.identifier)
 
@@ -158,6 +199,42 @@ def lookup_layers(layers, subsets, suffixes=None):
     return root_group
 
 
+def _lookup_children(collection_ids, subsets):
+    """ Returns a dictionary mapping the IDs of the given collections and all
+        their sub-collections to the lists of their contained EO objects
+        matching the subsets, ordered by time. Using the collection closure
+        table, only two queries are performed regardless of the nesting depth.
+    """
+    children = {}
+    if not collection_ids:
+        return children
+
+    in_hierarchy = (
+        Q(collection__in=collection_ids)
+        | Q(collection__ancestor_links__ancestor__in=collection_ids)
+    )
+
+    parents_by_child = {}
+    for collection_id, eo_object_id in \
+            models.EOObjectToCollectionThrough.objects.filter(
+                in_hierarchy
+            ).distinct().values_list("collection", "eo_object"):
+        parents_by_child.setdefault(eo_object_id, []).append(collection_id)
+        children.setdefault(collection_id, [])
+
+    eo_objects = subsets.filter(
+        models.EOObject.objects.filter(
+            ancestor_links__ancestor__in=collection_ids
+        ).distinct()
+    ).order_by("begin_time", "end_time")
+
+    for eo_object in eo_objects:
+        for collection_id in parents_by_child.get(eo_object.pk, ()):
+            children[collection_id].append(eo_object)
+
+    return children
+
+
 class LayerSelection(list):
     """ Helper class for hierarchical layer selections.
     """
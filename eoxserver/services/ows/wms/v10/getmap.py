@@ -40,6 +40,7 @@ from eoxserver.services.ows.wms.util import (
     lookup_layers, parse_bbox
 )
 from eoxserver.services.ows.wms.interfaces import WMSMapRendererInterface
+from eoxserver.services.ows.wms.tilecache import get_tile_cache
 from eoxserver.services.result import to_http_response
 from eoxserver.services.ows.wms.exceptions import InvalidCRS
 
@@ -73,16 +74,30 @@ class WMS10GetMapHandler(Component):
         # WMS 1.1 knows no swapped axes
         minx, miny, maxx, maxy = bbox
 
-        subsets = Subsets((
-            Trim("x", minx, maxx),
-            Trim("y", miny, maxy),
-        ), crs=srs)
-        
-        root_group = lookup_layers(layers, subsets)
-        
-        result, _ = self.renderer.render(
-            root_group, request.GET.items()
-        )
+        def render(minx, miny, maxx, maxy, request_values):
+            subsets = Subsets((
+                Trim("x", minx, maxx),
+                Trim("y", miny, maxy),
+            ), crs=srs)
+            
+            root_group = lookup_layers(layers, subsets)
+            
+            result, _ = self.renderer.render(
+                root_group, request_values
+            )
+            return result
+
+        result = None
+        tile_cache = get_tile_cache()
+        if tile_cache:
+            result = tile_cache.render(
+                layers, (), srid, (minx, miny, maxx, maxy), False,
+                request.GET.items(), render
+            )
+
+        if result is None:
+            result = render(minx, miny, maxx, maxy, request.GET.items())
+
         return to_http_response(result)
 
 
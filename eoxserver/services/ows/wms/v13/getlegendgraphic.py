@@ -30,6 +30,7 @@ from itertools import chain
 
 from eoxserver.core import Component, env, implements, UniqueExtensionPoint
 from eoxserver.core.decoders import kvp, typelist, InvalidParameterException
+from eoxserver.core.models import cast_all
 from eoxserver.resources.coverages import models
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface
@@ -89,7 +90,7 @@ class WMS13GetLegendGraphicHandler(Component):
                     used_ids.add(eo_object.pk)
 
                     if models.iscoverage(eo_object):
-                        result.append((eo_object.cast(), suffix))
+                        result.append((eo_object, suffix))
                     elif models.iscollection(eo_object):
                         result.extend(
                             recursive_lookup(eo_object, used_ids, suffix)
@@ -101,6 +102,10 @@ class WMS13GetLegendGraphicHandler(Component):
 
             used_ids = set()
             coverages = recursive_lookup(eo_object, used_ids, suffix)
+            coverages = zip(
+                cast_all(coverage for coverage, _ in coverages),
+                (suffix for _, suffix in coverages)
+            )
             collection = eo_object
 
             if coverage_id:
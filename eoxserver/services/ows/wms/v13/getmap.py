@@ -38,6 +38,7 @@ from eoxserver.services.ows.wms.util import (
     lookup_layers, parse_bbox, parse_time, int_or_str
 )
 from eoxserver.services.ows.wms.interfaces import WMSMapRendererInterface
+from eoxserver.services.ows.wms.tilecache import get_tile_cache
 from eoxserver.services.result import to_http_response
 from eoxserver.services.ows.wms.exceptions import InvalidCRS
 
@@ -74,20 +75,34 @@ class WMS13GetMapHandler(Component):
         else:
             minx, miny, maxx, maxy = bbox
 
-        subsets = Subsets((
-            Trim("x", minx, maxx),
-            Trim("y", miny, maxy),
-        ), crs=crs)
-        if time: 
-            subsets.append(time)
-        
         renderer = self.renderer
-        root_group = lookup_layers(layers, subsets, renderer.suffixes)
 
-        result, _ = renderer.render(
-            root_group, request.GET.items(), 
-            time=decoder.time, bands=decoder.dim_bands
-        )
+        def render(minx, miny, maxx, maxy, request_values):
+            subsets = Subsets((
+                Trim("x", minx, maxx),
+                Trim("y", miny, maxy),
+            ), crs=crs)
+            if time: 
+                subsets.append(time)
+            
+            root_group = lookup_layers(layers, subsets, renderer.suffixes)
+
+            result, _ = renderer.render(
+                root_group, request_values, 
+                time=decoder.time, bands=decoder.dim_bands
+            )
+            return result
+
+        result = None
+        tile_cache = get_tile_cache()
+        if tile_cache:
+            result = tile_cache.render(
+                layers, renderer.suffixes, srid, (minx, miny, maxx, maxy),
+                crss.hasSwappedAxes(srid), request.GET.items(), render
+            )
+
+        if result is None:
+            result = render(minx, miny, maxx, maxy, request.GET.items())
 
         return to_http_response(result)
 
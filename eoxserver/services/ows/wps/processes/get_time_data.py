@@ -83,15 +83,14 @@ class GetTimeDataProcess(Component):
         except models.DatasetSeries.DoesNotExist:
             raise InvalidInputValueError("collection", "Invalid collection name '%s'!"%collection)
 
-        # recursive dataset series lookup
-        def _get_children_ids(ds):
-            ds_rct = ds.real_content_type
-            id_list = [ds.id]
-            for child in series.eo_objects.filter(real_content_type=ds_rct):
-                id_list.extend(_get_children_ids(child))
-            return id_list
-
-        series_ids = _get_children_ids(series)
+        # get the dataset series and all its (indirect) sub-series
+        series_ids = [series.id]
+        series_ids.extend(
+            models.CollectionClosure.objects.filter(
+                ancestor=series,
+                descendant__real_content_type=series.real_content_type
+            ).values_list("descendant", flat=True)
+        )
 
         # prepare coverage query set
         coverages_qs = models.Coverage.objects.filter(collections__id__in=series_ids)
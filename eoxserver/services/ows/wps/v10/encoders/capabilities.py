@@ -28,7 +28,6 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
-from eoxserver.core.config import get_eoxserver_config
 from eoxserver.services.ows.component import ServiceComponent, env
 from eoxserver.services.ows.common.config import CapabilitiesConfigReader
 from eoxserver.services.ows.wps.v10.util import (
@@ -70,7 +69,7 @@ class WPS10CapabilitiesXMLEncoder(WPS10BaseXMLEncoder):
 
     @staticmethod
     def encode_capabilities(processes):
-        conf = CapabilitiesConfigReader(get_eoxserver_config())
+        conf = CapabilitiesConfigReader.from_config()
         return WPS("Capabilities",
             OWS("ServiceIdentification",
                 OWS("Title", conf.title),
@@ -30,7 +30,6 @@
 
 from lxml import etree
 from django.utils.timezone import now
-from eoxserver.core.config import get_eoxserver_config
 from eoxserver.services.ows.common.config import CapabilitiesConfigReader
 from eoxserver.core.util.timetools import isoformat
 from eoxserver.services.ows.wps.v10.util import WPS, OWS, ns_xlink, ns_xml
@@ -80,7 +79,7 @@ class WPS10ExecuteResponseXMLEncoder(WPS10BaseXMLEncoder):
 
 def _encode_common_response(process, status_elem, inputs, raw_inputs, resp_doc):
     """Encode common execute response part shared by all specific responses."""
-    conf = CapabilitiesConfigReader(get_eoxserver_config())
+    conf = CapabilitiesConfigReader.from_config()
     url = conf.http_service_url
     dlm = "?" if url[-1] != "?" else ""
     elem = WPS("ExecuteResponse",
@@ -32,8 +32,13 @@ from cStringIO import StringIO
 from uuid import uuid4
 
 from django.http import HttpResponse
+try:
+    from django.http import StreamingHttpResponse
+except ImportError:
+    StreamingHttpResponse = None
 from django.utils.datastructures import SortedDict
 
+from eoxserver.core.decoders import config
 from eoxserver.core.util import multiparttools as mp
 
 
@@ -77,12 +82,15 @@ class ResultItem(object):
 
 
 class ResultFile(ResultItem):
-    """ Class for results that wrap physical files on the disc.
+    """ Class for results that wrap physical files on the disc. Temporary files
+        are deleted after the response, other files are kept.
     """
 
-    def __init__(self, path, content_type=None, filename=None, identifier=None):
+    def __init__(self, path, content_type=None, filename=None, identifier=None,
+                 temporary=True):
         super(ResultFile, self).__init__(content_type, filename, identifier)
         self.path = path
+        self.temporary = temporary
 
     @property
     def data(self):
@@ -106,7 +114,8 @@ class ResultFile(ResultItem):
                 yield data
 
     def delete(self):
-        os.remove(self.path)
+        if self.temporary:
+            os.remove(self.path)
 
 
 class ResultBuffer(ResultItem):
@@ -172,11 +181,43 @@ def get_headers(result_item):
 
 
 
-def to_http_response(result_set, response_type=HttpResponse, boundary=None):
+class ResultConfigReader(config.Reader):
+    section = "services.result"
+    streaming = config.Option(type=bool, default=True)
+    chunk_size = config.Option(type=int, default=65536)
+    sendfile = config.Option(default=None)
+    sendfile_root = config.Option(default=None)
+    sendfile_url = config.Option(default=None)
+
+
+def to_http_response(result_set, response_type=None, boundary=None):
     """ Returns a response for a given result set. The ``response_type`` is the 
-        class to be used. It must be capable to work with iterators.
+        class to be used. It must be capable to work with iterators. By 
+        default, a ``StreamingHttpResponse`` is used if it is available and 
+        streaming is not disabled in the configuration. The items are then 
+        streamed in chunks, without reading them into memory as a whole.
+
+        If a ``sendfile`` header ("X-Sendfile" or "X-Accel-Redirect") is
+        configured, single files within the ``sendfile_root`` directory are
+        passed to the web server instead, unless they are temporary and have
+        to be deleted after the response.
     """
-    
+
+    reader = ResultConfigReader.from_config()
+
+    if len(result_set) == 1 and reader.sendfile and reader.sendfile_root:
+        response = sendfile_response(result_set[0], reader)
+        if response:
+            return response
+
+    if response_type is None:
+        if reader.streaming and StreamingHttpResponse is not None:
+            response_type = StreamingHttpResponse
+        else:
+            response_type = HttpResponse
+
+    chunk_size = reader.chunk_size
+
     # if more than one item is contained in the result set, the content type is
     # multipart
     if len(result_set) > 1:
@@ -204,7 +245,8 @@ def to_http_response(result_set, response_type=HttpResponse, boundary=None):
                         "%s: %s" % (key, value) 
                         for key, value in get_headers(item)
                     ) + mp.CRLFCRLF
-                yield item.data
+                for chunk in item.chunked(chunk_size):
+                    yield chunk
             if boundary:
                 yield boundary_str_end
         finally:
@@ -232,6 +274,38 @@ def to_http_response(result_set, response_type=HttpResponse, boundary=None):
     return response
 
 
+def sendfile_response(result_item, reader):
+    """ Returns a response that lets the web server send the file of the given
+        result item via the configured "X-Sendfile" or "X-Accel-Redirect" 
+        header, or `None` if the item is not a file within the configured 
+        root directory. Temporary files are never passed to the web server,
+        as they could not be deleted after it has sent them.
+    """
+    if not isinstance(result_item, ResultFile) or result_item.temporary:
+        return None
+
+    root = os.path.abspath(reader.sendfile_root)
+    path = os.path.abspath(result_item.path)
+    if not path.startswith(root + os.sep):
+        return None
+
+    response = HttpResponse(
+        "", result_item.content_type or "application/octet-stream"
+    )
+    for key, value in get_headers(result_item):
+        response[key] = value
+
+    if reader.sendfile.lower() == "x-accel-redirect":
+        response["X-Accel-Redirect"] = "%s/%s" % (
+            (reader.sendfile_url or "").rstrip("/"),
+            os.path.relpath(path, root).replace(os.sep, "/")
+        )
+    else:
+        response["X-Sendfile"] = path
+
+    return response
+
+
 def parse_headers(headers):
     """ Convenience function to read the "Content-Type", "Content-Disposition" 
         and "Content-Id" headers.
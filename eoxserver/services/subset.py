@@ -29,15 +29,25 @@
 
 import logging
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from django.db.models import Q
 from django.contrib.gis.geos import Polygon, LineString
 
+from eoxserver.core.util.timetools import to_timestamp
 from eoxserver.resources.coverages import crss
+from eoxserver.resources.coverages.spatialindex import (
+    get_spatial_index, SpatialIndexConfigReader
+)
 from eoxserver.services.exceptions import (
     InvalidAxisLabelException, InvalidSubsettingException
 )
 
 
-__all__ = ["Subsets", "Trim", "Slice"]
+__all__ = ["Subsets", "SubsetPredicate", "Trim", "Slice"]
 
 logger = logging.getLogger(__name__)
 
@@ -115,200 +125,47 @@ class Subsets(list):
         return None
 
 
+    def compile(self, containment="overlaps"):
+        """ Returns a :class:`SubsetPredicate` for the current subsets and the
+            given containment. The predicate of the last call is reused as
+            long as neither the subsets nor the containment change.
+        """
+        key = (containment, self.crs, tuple(
+            (type(subset), subset.axis, getattr(subset, "value", None),
+             getattr(subset, "low", None), getattr(subset, "high", None))
+            for subset in self
+        ))
+        compiled = getattr(self, "_compiled", None)
+        if compiled is None or compiled[0] != key:
+            compiled = (key, SubsetPredicate(self, containment))
+            self._compiled = compiled
+        return compiled[1]
+
+
     def filter(self, queryset, containment="overlaps"):
+        """ Applies the subsets to a queryset of EO objects.
+        """
         if not len(self):
             return queryset
-
-        qs = queryset
-
-        bbox = [None, None, None, None]
-        srid = self.srid
-
-        if srid is None:
-            srid = 4326
-        max_extent = crss.crs_bounds(srid)
-        tolerance = crss.crs_tolerance(srid)
-
-        for subset in self:
-            if isinstance(subset, Slice):
-                is_slice = True
-                value = subset.value
-            elif isinstance(subset, Trim):
-                is_slice = False
-                low = subset.low
-                high = subset.high
-
-            if subset.is_temporal:
-                if is_slice:
-                    qs = qs.filter(
-                        begin_time__lte=value,
-                        end_time__gte=value
-                    )
-
-                else:
-                    if high is not None:
-                        qs = qs.filter(
-                            begin_time__lte=high
-                        )
-                    if low is not None:
-                        qs = qs.filter(
-                            end_time__gte=low
-                        )
-                
-                    # check if the temporal bounds must be strictly contained
-                    if containment == "contains":
-                        if high is not None:
-                            qs = qs.filter(
-                                end_time__lte=high
-                            )
-                        if low is not None:
-                            qs = qs.filter(
-                                begin_time__gte=low
-                            )
-
-            else:
-                if is_slice:
-                    if subset.is_x:
-                        line = LineString(
-                            (value, max_extent[1]),
-                            (value, max_extent[3])
-                        )
-                    else:
-                        line = LineString(
-                            (max_extent[0], value),
-                            (max_extent[2], value)
-                        )
-                    line.srid = srid
-                    if srid != 4326:
-                        line.transform(4326)
-                    qs = qs.filter(footprint__intersects=line)
-
-                else:
-                    if subset.is_x:
-                        bbox[0] = subset.low
-                        bbox[2] = subset.high
-                    else:
-                        bbox[1] = subset.low
-                        bbox[3] = subset.high
-
-
-        if bbox != [None, None, None, None]:
-            bbox = map(
-                lambda v: v[0] if v[0] is not None else v[1], 
-                zip(bbox, max_extent)
-            )
-
-            bbox[0] -= tolerance; bbox[1] -= tolerance
-            bbox[2] += tolerance; bbox[3] += tolerance
-
-            logger.debug(
-                "Applying BBox %s with containment '%s'." % (bbox, containment)
-            )
-
-            poly = Polygon.from_bbox(bbox)
-            poly.srid = srid
-
-            if srid != 4326:
-                poly.transform(4326)
-            if containment == "overlaps":
-                qs = qs.filter(footprint__intersects=poly)
-            elif containment == "contains":
-                qs = qs.filter(footprint__within=poly)
-
-        return qs
+        return self.compile(containment).filter(queryset)
 
 
     def matches(self, eo_object, containment="overlaps"):
+        """ Checks whether or not a single EO object matches the subsets.
+        """
         if not len(self):
             return True
+        return self.compile(containment).matches(eo_object)
 
-        bbox = [None, None, None, None]
-        srid = self.srid
-        if srid is None:
-            srid = 4326
-        max_extent = crss.crs_bounds(srid)
-        tolerance = crss.crs_tolerance(srid)
-
-        footprint = eo_object.footprint
-        begin_time = eo_object.begin_time
-        end_time = eo_object.end_time
-
-        for subset in self:
-            if isinstance(subset, Slice):
-                is_slice = True
-                value = subset.value
-            elif isinstance(subset, Trim):
-                is_slice = False
-                low = subset.low
-                high = subset.high
-
-            if subset.is_temporal:
-                if is_slice:
-                    if begin_time > value or end_time < value:
-                        return False
-                elif low is None and high is not None:
-                    if begin_time > high:
-                        return False
-                elif low is not None and high is None:
-                    if end_time < low:
-                        return False
-                else:
-                    if begin_time > high or end_time < low:
-                        return False
-
-            else:
-                if is_slice:
-                    if subset.is_x:
-                        line = Line(
-                            (value, max_extent[1]),
-                            (value, max_extent[3])
-                        )
-                    else:
-                        line = Line(
-                            (max_extent[0], value),
-                            (max_extent[2], value)
-                        )
-                    line.srid = srid
-                    if srid != 4326:
-                        line.transform(4326)
-
-                    if not line.intersects(footprint):
-                        return False
-                    
-                else:
-                    if subset.is_x:
-                        bbox[0] = subset.low
-                        bbox[2] = subset.high
-                    else:
-                        bbox[1] = subset.low
-                        bbox[3] = subset.high
-
-
-        if bbox != [None, None, None, None]:
-            bbox = map(
-                lambda v: v[0] if v[0] is not None else v[1],
-                zip(bbox, max_extent)
-            )
-
-            bbox[0] -= tolerance; bbox[1] -= tolerance
-            bbox[2] += tolerance; bbox[3] += tolerance
-
-            logger.debug(
-                "Applying BBox %s with containment '%s'." % (bbox, containment)
-            )
-
-            poly = Polygon.from_bbox(bbox)
-            poly.srid = srid
 
-            if srid != 4326:
-                poly.transform(4326)
-            if containment == "overlaps":
-                if not footprint.intersects(poly):
-                    return False
-            elif containment == "contains":
-                if not footprint.within(poly):
-                    return False
-        return True
+    def select(self, eo_objects, containment="overlaps"):
+        """ Returns a list of all EO objects of the given iterable that match
+            the subsets. This is considerably faster than calling
+            :meth:`matches` for each object.
+        """
+        if not len(self):
+            return list(eo_objects)
+        return self.compile(containment).select(eo_objects)
 
 
     def _check_subset(self, subset):
@@ -421,6 +278,307 @@ class Subsets(list):
         return poly
 
 
+class SubsetPredicate(object):
+    """ Compiled form of :class:`Subsets`. The subsetting geometries are
+        created and transformed to WGS84 only once, so that the predicate can
+        be evaluated efficiently for many EO objects.
+
+        When many objects are checked with :meth:`select`, the temporal and
+        bounding box conditions are evaluated for all of them at once using
+        NumPy arrays. The exact geometric checks are only performed for
+        objects that pass these conditions and whose result is not already
+        certain from their bounding box.
+    """
+
+    def __init__(self, subsets, containment="overlaps"):
+        self.containment = containment
+
+        # bounds for the begin and end times of objects
+        self.begin_min = self.begin_max = None
+        self.end_min = self.end_max = None
+
+        # geometries in WGS84
+        self.lines = []
+        self.polygon = None
+
+        srid = subsets.srid
+        if srid is None:
+            srid = 4326
+        max_extent = crss.crs_bounds(srid)
+        tolerance = crss.crs_tolerance(srid)
+
+        bbox = [None, None, None, None]
+
+        for subset in subsets:
+            if subset.is_temporal:
+                if isinstance(subset, Slice):
+                    self.begin_max = self.end_min = subset.value
+                else:
+                    self.begin_max = subset.high
+                    self.end_min = subset.low
+
+                    # check if the temporal bounds must be strictly contained
+                    if containment == "contains":
+                        self.end_max = subset.high
+                        self.begin_min = subset.low
+
+            elif isinstance(subset, Slice):
+                value = subset.value
+                if subset.is_x:
+                    line = LineString(
+                        (value, max_extent[1]), (value, max_extent[3])
+                    )
+                else:
+                    line = LineString(
+                        (max_extent[0], value), (max_extent[2], value)
+                    )
+                line.srid = srid
+                if srid != 4326:
+                    line.transform(4326)
+                self.lines.append(line)
+
+            else:
+                if subset.is_x:
+                    bbox[0] = subset.low
+                    bbox[2] = subset.high
+                else:
+                    bbox[1] = subset.low
+                    bbox[3] = subset.high
+
+        if bbox != [None, None, None, None]:
+            bbox = map(
+                lambda v: v[0] if v[0] is not None else v[1], 
+                zip(bbox, max_extent)
+            )
+
+            bbox[0] -= tolerance; bbox[1] -= tolerance
+            bbox[2] += tolerance; bbox[3] += tolerance
+
+            logger.debug(
+                "Applying BBox %s with containment '%s'." % (bbox, containment)
+            )
+
+            poly = Polygon.from_bbox(bbox)
+            poly.srid = srid
+
+            if srid != 4326:
+                poly.transform(4326)
+            self.polygon = poly
+
+        # only an untransformed polygon is equal to its bounding box
+        self.polygon_is_box = srid == 4326
+
+
+    @property
+    def is_spatial(self):
+        return bool(self.lines) or self.polygon is not None
+
+
+    def filter(self, queryset):
+        """ Applies the predicate to a queryset of EO objects. If the spatial
+            index is enabled, it is used to pre-select the primary keys of
+            candidate objects.
+        """
+        qs = queryset
+
+        index = get_spatial_index()
+        result = index.query(**self.index_query()) if index else None
+        if result is not None:
+            pks, modified = result
+            max_candidates = (
+                SpatialIndexConfigReader.from_config()
+                .spatial_index_max_candidates
+            )
+            if modified is not None and len(pks) <= max_candidates:
+                # objects modified by other processes since the last refresh
+                # of the index are always candidates
+                qs = qs.filter(Q(pk__in=pks) | Q(modified__gte=modified))
+
+        if self.begin_max is not None:
+            qs = qs.filter(begin_time__lte=self.begin_max)
+        if self.end_min is not None:
+            qs = qs.filter(end_time__gte=self.end_min)
+        if self.end_max is not None:
+            qs = qs.filter(end_time__lte=self.end_max)
+        if self.begin_min is not None:
+            qs = qs.filter(begin_time__gte=self.begin_min)
+
+        for line in self.lines:
+            qs = qs.filter(footprint__intersects=line)
+
+        if self.polygon is not None:
+            if self.containment == "overlaps":
+                qs = qs.filter(footprint__intersects=self.polygon)
+            elif self.containment == "contains":
+                qs = qs.filter(footprint__within=self.polygon)
+
+        return qs
+
+
+    def index_query(self):
+        """ Returns the conditions of the predicate as keyword arguments for
+            the query of the spatial index.
+        """
+        intersects = [line.extent for line in self.lines]
+        within = None
+        if self.polygon is not None:
+            if self.containment == "overlaps":
+                intersects.append(self.polygon.extent)
+            elif self.containment == "contains":
+                within = self.polygon.extent
+
+        def timestamp(value):
+            return to_timestamp(value) if value is not None else None
+
+        return {
+            "intersects": intersects,
+            "within": within,
+            "begin_max": timestamp(self.begin_max),
+            "end_min": timestamp(self.end_min),
+            "end_max": timestamp(self.end_max),
+            "begin_min": timestamp(self.begin_min),
+        }
+
+
+    def matches(self, eo_object):
+        """ Checks whether or not a single EO object matches the predicate.
+            Objects lacking the required time or footprint do not match, just
+            like with :meth:`filter`.
+        """
+        begin_time = eo_object.begin_time
+        end_time = eo_object.end_time
+
+        if self.begin_max is not None:
+            if begin_time is None or begin_time > self.begin_max:
+                return False
+        if self.end_min is not None:
+            if end_time is None or end_time < self.end_min:
+                return False
+        if self.end_max is not None:
+            if end_time is None or end_time > self.end_max:
+                return False
+        if self.begin_min is not None:
+            if begin_time is None or begin_time < self.begin_min:
+                return False
+
+        return self._matches_footprint(eo_object.footprint)
+
+
+    def _matches_footprint(self, footprint):
+        if not self.is_spatial:
+            return True
+        elif footprint is None:
+            return False
+
+        for line in self.lines:
+            if not line.intersects(footprint):
+                return False
+
+        if self.polygon is not None:
+            if self.containment == "overlaps":
+                return footprint.intersects(self.polygon)
+            elif self.containment == "contains":
+                return footprint.within(self.polygon)
+        return True
+
+
+    def mask(self, extents, begin_times, end_times):
+        """ Evaluates the temporal and bounding box conditions for arrays of
+            footprint extents (an array of shape (n, 4) in WGS84) and of begin
+            and end times (arrays of POSIX timestamps). Missing values are
+            expressed as NaN. Returns two boolean arrays: the first one flags
+            the objects that possibly match, the second one those that match
+            for certain.
+        """
+        extents = numpy.asarray(extents, dtype=float).reshape(-1, 4)
+        begin_times = numpy.asarray(begin_times, dtype=float)
+        end_times = numpy.asarray(end_times, dtype=float)
+
+        with numpy.errstate(invalid="ignore"):
+            candidates = numpy.ones(len(extents), dtype=bool)
+
+            if self.begin_max is not None:
+                candidates &= begin_times <= to_timestamp(self.begin_max)
+            if self.end_min is not None:
+                candidates &= end_times >= to_timestamp(self.end_min)
+            if self.end_max is not None:
+                candidates &= end_times <= to_timestamp(self.end_max)
+            if self.begin_min is not None:
+                candidates &= begin_times >= to_timestamp(self.begin_min)
+
+            if not self.is_spatial:
+                return candidates, candidates.copy()
+
+            min_x, min_y, max_x, max_y = extents.T
+            certain = numpy.logical_not(numpy.isnan(min_x)) & candidates
+
+            for line in self.lines:
+                l_min_x, l_min_y, l_max_x, l_max_y = line.extent
+                candidates &= (
+                    (min_x <= l_max_x) & (max_x >= l_min_x) &
+                    (min_y <= l_max_y) & (max_y >= l_min_y)
+                )
+                certain[:] = False
+
+            if self.polygon is not None:
+                p_min_x, p_min_y, p_max_x, p_max_y = self.polygon.extent
+                within = (
+                    (min_x >= p_min_x) & (max_x <= p_max_x) &
+                    (min_y >= p_min_y) & (max_y <= p_max_y)
+                )
+                if self.containment == "overlaps":
+                    candidates &= (
+                        (min_x <= p_max_x) & (max_x >= p_min_x) &
+                        (min_y <= p_max_y) & (max_y >= p_min_y)
+                    )
+                elif self.containment == "contains":
+                    candidates &= within
+
+                if self.containment in ("overlaps", "contains"):
+                    if self.polygon_is_box:
+                        certain &= within
+                    else:
+                        certain[:] = False
+
+            certain &= candidates
+
+        return candidates, certain
+
+
+    def select(self, eo_objects):
+        """ Returns a list of all EO objects of the given iterable that match
+            the predicate.
+        """
+        eo_objects = list(eo_objects)
+        if numpy is None or len(eo_objects) < 2:
+            return [
+                eo_object for eo_object in eo_objects
+                if self.matches(eo_object)
+            ]
+
+        candidates, certain = self.mask(
+            [_extent(eo_object.footprint) for eo_object in eo_objects],
+            [to_timestamp(eo_object.begin_time) for eo_object in eo_objects],
+            [to_timestamp(eo_object.end_time) for eo_object in eo_objects]
+        )
+
+        return [
+            eo_object for eo_object, candidate, is_certain
+            in zip(eo_objects, candidates, certain)
+            if candidate and (
+                is_certain or self._matches_footprint(eo_object.footprint)
+            )
+        ]
+
+
+def _extent(footprint):
+    """ Returns the extent of a footprint or NaNs if it is not available.
+    """
+    if footprint is None:
+        return (float("nan"),) * 4
+    return footprint.extent
+
+
 class Subset(object):
     def __init__(self, axis):
         axis = axis.lower()
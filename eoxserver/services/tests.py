@@ -26,12 +26,66 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
+import os
+import shutil
+import tempfile
+import zipfile
+import mimetypes
+from unittest import skipUnless
+from copy import deepcopy
+from datetime import datetime
 from textwrap import dedent
+from cStringIO import StringIO
 
+from lxml import etree
 from django.test import TestCase
+from django.test.client import RequestFactory
+from django.contrib.gis.geos import MultiPolygon, Polygon
+from django.utils.dateparse import parse_datetime
 
+from eoxserver.core import env
+from eoxserver.core import config as eoxs_config
+from eoxserver.core.util.iteratortools import parallel_imap
 from eoxserver.core.util import multiparttools as mp
-from eoxserver.services.result import result_set_from_raw_data
+from eoxserver.core.util.rect import Rect
+from eoxserver.contrib import gdal, osr, mapserver
+from eoxserver.services.result import (
+    result_set_from_raw_data, to_http_response, sendfile_response,
+    ResultBuffer, ResultFile
+)
+from eoxserver.backends.models import DataItem
+from eoxserver.backends.cache import CacheContext
+from eoxserver.resources.coverages import models
+from eoxserver.services.models import WMSRenderOptions
+from eoxserver.services.mapserver.connectors.simple_connector import (
+    SimpleConnector
+)
+from eoxserver.services.mapserver.wms.util import (
+    MapCache, _map_cache, _map_key
+)
+from eoxserver.services.ows.wms.basehandlers import (
+    WMSGetCapabilitiesHandlerBase, CapabilitiesCache, _capabilities_cache
+)
+from eoxserver.services.ows.wms.tilecache import TileCache
+from eoxserver.services.ows.wms.util import lookup_layers, LayerSelection
+from eoxserver.services.ows.wms.exceptions import LayerNotDefined
+from eoxserver.services.ows.wcs.v20.packages.zip import stream_zip
+from eoxserver.services.ows.wcs.v20.geteocoverageset import (
+    iter_package_items, _delete_rendered
+)
+from eoxserver.services.subset import Subsets, Trim, Slice
+from eoxserver.services.exceptions import RenderException
+from eoxserver.services.ows.version import Version
+from eoxserver.services.ows.wcs.v20.util import (
+    ScaleSize, ScaleExtent, ScaleAxis, RangeSubset
+)
+from eoxserver.services.ows.wcs.v20.encoders import WCS20EOXMLEncoder
+from eoxserver.services.mapserver.wcs.coverage_renderer import (
+    RectifiedCoverageMapServerRenderer
+)
+from eoxserver.services.gdal.wcs.rectified_dataset_renderer import (
+    GDALRectifiedDatasetRenderer
+)
 
 
 class MultipartTest(TestCase):
@@ -103,3 +157,977 @@ class ResultSetTestCase(TestCase):
         self.assertEqual(first.identifier, "message-part")
         self.assertEqual(str(second.data), "PGh0bWw+CiAgPGhlYWQ+CiAgPC9oZWFkPgogIDxib2R5PgogICAgPHA+VGhpcyBpcyB0aGUgYm9keSBvZiB0aGUgbWVzc2FnZS48L3A+CiAgPC9ib2R5Pgo8L2h0bWw+Cg==")
 
+
+    def test_to_http_response(self):
+        result_set = [
+            ResultBuffer("a" * 10, "text/plain", identifier="first"),
+            ResultBuffer("b" * 5, "application/octet-stream")
+        ]
+        response = to_http_response(result_set, boundary="frontier")
+        content = "".join(
+            getattr(response, "streaming_content", None) or response.content
+        )
+
+        parsed = [
+            (headers.get("Content-Type"), str(data))
+            for headers, data in mp.iterate(
+                "Content-Type: %s\r\n\r\n%s" 
+                % (response["Content-Type"], content)
+            )
+        ]
+        self.assertEqual([
+                ("multipart/related; boundary=frontier", ""),
+                ("text/plain", "a" * 10),
+                ("application/octet-stream", "b" * 5)
+            ], parsed
+        )
+
+
+    def test_sendfile_response(self):
+        class Reader(object):
+            sendfile = "X-Accel-Redirect"
+            sendfile_root = tempfile.mkdtemp()
+            sendfile_url = "/protected/"
+
+        try:
+            path = os.path.join(Reader.sendfile_root, "result.tif")
+            with open(path, "wb") as f:
+                f.write("data")
+
+            # temporary files are sent and deleted by EOxServer itself
+            item = ResultFile(path, "image/tiff")
+            self.assertIsNone(sendfile_response(item, Reader))
+            item.delete()
+            self.assertFalse(os.path.exists(path))
+
+            with open(path, "wb") as f:
+                f.write("data")
+
+            item = ResultFile(path, "image/tiff", temporary=False)
+            response = sendfile_response(item, Reader)
+            self.assertEqual(
+                response["X-Accel-Redirect"], "/protected/result.tif"
+            )
+            self.assertEqual(response["Content-Type"], "image/tiff")
+            item.delete()
+            self.assertTrue(os.path.exists(path))
+
+        finally:
+            shutil.rmtree(Reader.sendfile_root)
+
+
+class TileCacheTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.tile_cache = TileCache(self.directory, tile_size=256)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_tile_position(self):
+        params = {"format": "image/png", "width": "256", "height": "256"}
+        position = self.tile_cache._get_tile_position
+
+        self.assertEqual(
+            position(4326, (0, -90, 90, 0), params), (90, 2, 0)
+        )
+        self.assertEqual(
+            position(4326, (-22.5, 22.5, 0, 45), params), (22.5, 7, 5)
+        )
+
+        # not aligned to the grid
+        self.assertEqual(position(4326, (1, -90, 91, 0), params), None)
+        # not square
+        self.assertEqual(position(4326, (0, -90, 90, 10), params), None)
+        # unsupported grid
+        self.assertEqual(position(32633, (0, 0, 90, 90), params), None)
+        # wrong size or format
+        self.assertEqual(position(4326, (0, -90, 90, 0), dict(
+            params, width="512"
+        )), None)
+        self.assertEqual(position(4326, (0, -90, 90, 0), dict(
+            params, format="image/tiff"
+        )), None)
+
+
+class StreamZIPTestCase(TestCase):
+    def test_stream_zip(self):
+        contents = [
+            ("a/first.txt", "first" * 1000),
+            ("b/second.txt", "second"),
+            ("c/empty.txt", "")
+        ]
+        for compression in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            data = "".join(stream_zip((
+                (StringIO(content), location)
+                for location, content in contents
+            ), compression, chunk_size=100))
+
+            package = zipfile.ZipFile(StringIO(data))
+            self.assertEqual(package.testzip(), None)
+            self.assertEqual(
+                [(location, package.read(location)) 
+                 for location in package.namelist()], contents
+            )
+
+
+class SubsetPredicateTestCase(TestCase):
+    class EOObject(object):
+        def __init__(self, footprint, begin_time, end_time):
+            self.footprint = footprint
+            self.begin_time = begin_time
+            self.end_time = end_time
+
+    def setUp(self):
+        self.eo_objects = [
+            self.EOObject(
+                MultiPolygon(Polygon.from_bbox((x, 0, x + 10, 10))),
+                datetime(2014, 1, day), datetime(2014, 1, day + 1)
+            )
+            for x, day in ((0, 1), (5, 2), (20, 3), (40, 4))
+        ] + [self.EOObject(None, None, None)]
+
+    def test_select(self):
+        cases = (
+            [Trim("x", 2, 12)],
+            [Trim("x", 0, 30), Trim("t", datetime(2014, 1, 2), None)],
+            [Slice("x", 25)],
+            [Slice("t", datetime(2014, 1, 4, 12))],
+        )
+        expected = {
+            "overlaps": ([0, 1], [0, 1, 2], [2], [3]),
+            "contains": ([], [1, 2], [2], [3])
+        }
+
+        for containment, expected_indices in expected.items():
+            for subsets, indices in zip(cases, expected_indices):
+                subsets = Subsets(subsets)
+                selected = subsets.select(self.eo_objects, containment)
+                self.assertEqual(
+                    selected, [self.eo_objects[i] for i in indices]
+                )
+                self.assertEqual(selected, [
+                    eo_object for eo_object in self.eo_objects
+                    if subsets.matches(eo_object, containment)
+                ])
+
+
+class GDALRectifiedDatasetRendererTestCase(TestCase):
+    class Coverage(object):
+        srid = 4326
+        extent = (0, 0, 100, 50)
+
+    class Params(object):
+        def __init__(self, scalefactor=None, scales=()):
+            self.scalefactor = scalefactor
+            self.scales = scales
+
+    def setUp(self):
+        self.renderer = GDALRectifiedDatasetRenderer(env)
+        self.dataset = gdal.GetDriverByName("MEM").Create("", 100, 50)
+        self.dataset.SetGeoTransform([0, 1, 0, 50, 0, -1])
+
+    def test_source_rect(self):
+        cases = (
+            (None, Rect(0, 0, 100, 50)),
+            # pixel subsets are inclusive
+            (Subsets([Trim("x", 10, 19), Trim("y", 5, 14)]),
+             Rect(10, 5, 10, 10)),
+            (Subsets([Trim("x", 90, None)]), Rect(90, 0, 10, 50)),
+            (Subsets([Trim("x", 10, 20), Trim("y", 30, 40)], "EPSG:4326"),
+             Rect(10, 10, 10, 10)),
+            # partially covered pixels are included, the rest is clipped
+            (Subsets([Trim("x", 10.5, 20.5), Trim("y", 45, 60)],
+                     "EPSG:4326"),
+             Rect(10, 0, 11, 5)),
+        )
+        for subsets, expected in cases:
+            self.assertEqual(
+                self.renderer.get_source_rect(
+                    self.dataset, self.Coverage(), subsets
+                ), expected
+            )
+
+    def test_output_size(self):
+        cases = (
+            (self.Params(), (100, 50)),
+            (self.Params(scalefactor=0.5), (50, 25)),
+            (self.Params(scales=[ScaleSize("x", 20)]), (20, 50)),
+            (self.Params(scales=[ScaleAxis("y", 2)]), (100, 100)),
+            (self.Params(scales=[
+                ScaleExtent("x", 0, 30), ScaleSize("y", 10)
+            ]), (30, 10)),
+            # the output is at least one pixel wide
+            (self.Params(scalefactor=0.001), (1, 1)),
+        )
+        for params, expected in cases:
+            self.assertEqual(
+                self.renderer.get_output_size(params, (100, 50)), expected
+            )
+
+
+@skipUnless(hasattr(gdal, "Warp"), "GDAL 2.1 or newer is required")
+class GDALRectifiedDatasetRenderTestCase(TestCase):
+    class Params(object):
+        version = Version(2, 0)
+        subsets = None
+        format = None
+        interpolation = None
+        rangesubset = None
+        outputcrs = None
+        scalefactor = None
+        scales = ()
+        mediatype = None
+        encoding_params = {}
+
+        def __init__(self, coverage, **kwargs):
+            self.coverage = coverage
+            self.__dict__.update(kwargs)
+
+    def setUp(self):
+        self.renderer = GDALRectifiedDatasetRenderer(env)
+        self.directory = tempfile.mkdtemp()
+
+        range_type = models.RangeType.objects.create(name="RGB")
+        for index, name in enumerate(("red", "green", "blue")):
+            models.Band.objects.create(
+                index=index, name=name, identifier=name, uom="DN",
+                data_type=gdal.GDT_Byte, range_type=range_type
+            )
+
+        def create(identifier, band_counts):
+            coverage = models.RectifiedDataset(
+                identifier=identifier,
+                footprint=MultiPolygon(Polygon.from_bbox((0, 0, 100, 50))),
+                begin_time=parse_datetime("2014-01-01T00:00:00Z"),
+                end_time=parse_datetime("2014-01-01T12:00:00Z"),
+                min_x=0, min_y=0, max_x=100, max_y=50, srid=4326,
+                size_x=100, size_y=50, range_type=range_type
+            )
+            coverage.full_clean()
+            coverage.save()
+
+            # fill band n with the value n * 10
+            value = 0
+            for i, band_count in enumerate(band_counts):
+                path = os.path.join(
+                    self.directory, "%s_%d.tif" % (identifier, i)
+                )
+                ds = gdal.GetDriverByName("GTiff").Create(
+                    path, 100, 50, band_count
+                )
+                ds.SetGeoTransform([0, 1, 0, 50, 0, -1])
+                ds.SetProjection(osr.SpatialReference(4326).wkt)
+                for band_index in range(1, band_count + 1):
+                    value += 10
+                    ds.GetRasterBand(band_index).Fill(value)
+                ds = None
+
+                DataItem.objects.create(
+                    dataset=coverage, location=path, format="image/tiff",
+                    semantic="bands[%d:%d]" % (
+                        value / 10 - band_count + 1, value / 10
+                    )
+                )
+            return coverage
+
+        self.coverage = create("rectified-1", (3,))
+        self.multi_file_coverage = create("rectified-2", (2, 1))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def render(self, coverage, **kwargs):
+        """ Renders the coverage and returns the parsed description, the
+            output size, the extent and the band values.
+        """
+        vsimem_files = set(gdal.ReadDir("/vsimem/") or ())
+        result_set = self.renderer.render(self.Params(coverage, **kwargs))
+
+        description = None
+        if len(result_set) > 1:
+            description = etree.fromstring(result_set[0].data)
+
+        ds = gdal.Open(result_set[-1].path)
+        gt = ds.GetGeoTransform()
+        size = (ds.RasterXSize, ds.RasterYSize)
+        extent = (
+            gt[0], gt[3] + size[1] * gt[5], gt[0] + size[0] * gt[1], gt[3]
+        )
+        values = [
+            ds.GetRasterBand(i).ComputeRasterMinMax()[0]
+            for i in range(1, ds.RasterCount + 1)
+        ]
+        ds = None
+
+        # no temporary files other than the result are left in /vsimem/
+        self.assertEqual(
+            set(gdal.ReadDir("/vsimem/") or ()) - vsimem_files,
+            set([os.path.basename(result_set[-1].path)])
+        )
+        for result_item in result_set:
+            result_item.delete()
+        self.assertEqual(set(gdal.ReadDir("/vsimem/") or ()), vsimem_files)
+
+        return description, size, extent, values
+
+    def test_render(self):
+        for coverage in (self.coverage, self.multi_file_coverage):
+            _, size, extent, values = self.render(coverage)
+            self.assertEqual(size, (100, 50))
+            self.assertEqual(extent, (0, 0, 100, 50))
+            self.assertEqual(values, [10, 20, 30])
+
+    def test_render_subset(self):
+        _, size, extent, values = self.render(self.coverage,
+            subsets=Subsets(
+                [Trim("x", 10, 20), Trim("y", 30, 40)], "EPSG:4326"
+            )
+        )
+        self.assertEqual(size, (10, 10))
+        self.assertEqual(extent, (10, 30, 20, 40))
+
+        _, size, extent, _ = self.render(self.coverage,
+            subsets=Subsets([Trim("x", 10, 19), Trim("y", 5, 14)]),
+            scalefactor=0.5
+        )
+        self.assertEqual(size, (5, 5))
+        self.assertEqual(extent, (10, 35, 20, 45))
+
+    def test_render_band_subset(self):
+        for coverage in (self.coverage, self.multi_file_coverage):
+            _, _, _, values = self.render(coverage,
+                rangesubset=RangeSubset(["blue", "red"])
+            )
+            self.assertEqual(values, [30, 10])
+
+    def test_render_multipart(self):
+        description, size, extent, _ = self.render(self.coverage,
+            subsets=Subsets(
+                [Trim("x", 10, 20), Trim("y", 30, 40)], "EPSG:4326"
+            ),
+            rangesubset=RangeSubset(["green"]),
+            mediatype="multipart/related"
+        )
+        nsmap = {
+            "gml": "http://www.opengis.net/gml/3.2",
+            "swe": "http://www.opengis.net/swe/2.0"
+        }
+        self.assertEqual(size, (10, 10))
+        self.assertEqual(
+            description.xpath(
+                "gml:domainSet/gml:RectifiedGrid/gml:limits/gml:GridEnvelope/"
+                "gml:high/text()", namespaces=nsmap
+            ), ["9 9"]
+        )
+        self.assertEqual(
+            description.xpath(
+                "gml:domainSet/gml:RectifiedGrid/gml:origin/gml:Point/"
+                "gml:pos/text()", namespaces=nsmap
+            ), ["40.00000000 10.00000000"]
+        )
+        self.assertEqual(
+            description.xpath("//swe:field/@name", namespaces=nsmap),
+            ["green"]
+        )
+        self.assertEqual(
+            description.xpath("gml:rangeSet/gml:File/gml:mimeType/text()",
+                namespaces=nsmap
+            ), ["image/tiff"]
+        )
+
+    def test_format_options(self):
+        result_set = self.renderer.render(self.Params(self.coverage,
+            format="image/tiff;COMPRESS=LZW"
+        ))
+        ds = gdal.Open(result_set[0].path)
+        self.assertEqual(
+            ds.GetMetadata("IMAGE_STRUCTURE").get("COMPRESSION"), "LZW"
+        )
+        ds = None
+        result_set[0].delete()
+
+        with self.assertRaises(RenderException):
+            self.renderer.render(self.Params(self.coverage,
+                format="image/tiff;COMPRESS"
+            ))
+
+    def test_native_format(self):
+        self.assertEqual(
+            self.renderer.get_native_format(self.coverage), "image/tiff"
+        )
+
+        # formats that cannot be written fall back to GeoTIFF
+        DataItem.objects.filter(dataset=self.coverage).update(
+            format="application/x-unwritable"
+        )
+        self.assertEqual(
+            self.renderer.get_native_format(self.coverage), "image/tiff"
+        )
+
+
+def lookup_layers_recursive(layers, subsets, suffixes=None):
+    """ The former, per-collection recursive layer lookup. Used as a reference
+        for the set-based ``lookup_layers``.
+    """
+    suffix_related_ids = {}
+    root_group = LayerSelection(None)
+    suffixes = suffixes or (None,)
+
+    def recursive_lookup(collection, used_ids):
+        eo_objects = models.EOObject.objects.filter(
+            collections__in=[collection.pk]
+        ).exclude(
+            pk__in=used_ids
+        ).order_by("begin_time", "end_time")
+        eo_objects = subsets.filter(eo_objects)
+
+        selection = LayerSelection()
+        for eo_object in eo_objects:
+            used_ids.add(eo_object.pk)
+            if models.iscoverage(eo_object):
+                selection.append(eo_object.cast(), eo_object.identifier)
+            elif models.iscollection(eo_object):
+                selection.extend(recursive_lookup(eo_object, used_ids))
+        return selection
+
+    for layer_name in layers:
+        for suffix in suffixes:
+            if not suffix:
+                identifier = layer_name
+            elif layer_name.endswith(suffix):
+                identifier = layer_name[:-len(suffix)]
+            else:
+                continue
+
+            eo_objects = models.EOObject.objects.filter(identifier=identifier)
+            if len(eo_objects):
+                eo_object = eo_objects[0]
+                break
+        else:
+            raise LayerNotDefined(layer_name)
+
+        if models.iscollection(eo_object):
+            used_ids = suffix_related_ids.setdefault(suffix, set())
+            root_group.append(
+                LayerSelection(
+                    eo_object, suffix, recursive_lookup(eo_object, used_ids)
+                )
+            )
+        elif models.iscoverage(eo_object):
+            selection = LayerSelection(None, suffix=suffix)
+            if subsets.matches(eo_object):
+                selection.append(eo_object.cast(), eo_object.identifier)
+            else:
+                selection.append(None, eo_object.identifier)
+            root_group.append(selection)
+
+    return root_group
+
+
+class LookupLayersTestCase(TestCase):
+    def setUp(self):
+        range_type = models.RangeType.objects.create(name="RGB")
+
+        def create(Class, identifier, x, day):
+            obj = Class(
+                identifier=identifier,
+                footprint=MultiPolygon(Polygon.from_bbox((x, 0, x + 10, 10))),
+                begin_time=parse_datetime("2014-01-%02dT00:00:00Z" % day),
+                end_time=parse_datetime("2014-01-%02dT12:00:00Z" % day),
+                min_x=x, min_y=0, max_x=x + 10, max_y=10, srid=4326,
+                size_x=100, size_y=100, range_type=range_type
+            )
+            obj.identifier = identifier
+            obj.full_clean()
+            obj.save()
+            return obj
+
+        Rectified = models.RectifiedDataset
+        self.rectified_1 = create(Rectified, "rectified-1", 0, 3)
+        self.rectified_2 = create(Rectified, "rectified-2", 5, 2)
+        self.rectified_3 = create(Rectified, "rectified-3", 40, 1)
+        self.mosaic = create(models.RectifiedStitchedMosaic, "mosaic-1", 0, 2)
+        self.series = models.DatasetSeries(identifier="series-1")
+        self.series.full_clean()
+        self.series.save()
+
+        # series-1 -> (mosaic-1 -> (rectified-1, rectified-2), rectified-3)
+        self.mosaic.insert(self.rectified_1)
+        self.mosaic.insert(self.rectified_2)
+        self.series.insert(self.mosaic)
+        self.series.insert(self.rectified_3)
+
+    def walk(self, selection):
+        return [
+            (
+                tuple(collection.identifier for collection in collections),
+                (type(eo_object), eo_object.identifier)
+                if eo_object is not None else None,
+                name, suffix
+            )
+            for collections, eo_object, name, suffix in selection.walk()
+        ]
+
+    def test_lookup_layers(self):
+        suffixes = (None, "_outlines")
+        cases = (
+            ["series-1"],
+            ["mosaic-1", "series-1_outlines"],
+            ["series-1", "mosaic-1"],
+            ["rectified-3", "rectified-1_outlines", "mosaic-1_outlines"],
+        )
+        subsets_cases = (
+            Subsets([]),
+            Subsets([Trim("x", 0, 20)], "EPSG:4326"),
+            Subsets([Trim("t", parse_datetime("2014-01-02T06:00:00Z"), None)]),
+        )
+
+        for layers in cases:
+            for subsets in subsets_cases:
+                expected = lookup_layers_recursive(layers, subsets, suffixes)
+                self.assertEqual(
+                    self.walk(lookup_layers(layers, subsets, suffixes)),
+                    self.walk(expected)
+                )
+
+    def test_lookup_layers_queries(self):
+        layers = ["series-1", "rectified-1_outlines", "mosaic-1"]
+        # one query for the names, two for the hierarchy and one cast query
+        # per coverage type
+        with self.assertNumQueries(5):
+            lookup_layers(layers, Subsets([]), (None, "_outlines"))
+
+    def test_lookup_layers_not_defined(self):
+        for layers in (["unknown"], ["series-1", "rectified-1_unknown"]):
+            with self.assertRaises(LayerNotDefined):
+                lookup_layers(layers, Subsets([]), (None, "_outlines"))
+            with self.assertRaises(LayerNotDefined):
+                lookup_layers_recursive(
+                    layers, Subsets([]), (None, "_outlines")
+                )
+
+
+class ConfigMixIn(object):
+    """ Mix-in to override options of the EOxServer configuration for the
+        duration of each test.
+    """
+
+    config = {}
+
+    def setUp(self):
+        super(ConfigMixIn, self).setUp()
+        config = deepcopy(eoxs_config.get_eoxserver_config())
+        for section, options in self.config.items():
+            if not config.has_section(section):
+                config.add_section(section)
+            for option, value in options.items():
+                config.set(section, option, value)
+
+        self._original_config = (
+            eoxs_config._cached_config, eoxs_config._next_check_time
+        )
+        eoxs_config._cached_config = config
+        eoxs_config._next_check_time = float("inf")
+
+    def tearDown(self):
+        eoxs_config._cached_config, eoxs_config._next_check_time = \
+            self._original_config
+        super(ConfigMixIn, self).tearDown()
+
+
+class MapCacheTestCase(ConfigMixIn, TestCase):
+    config = {
+        "services.ows.wms": {"map_cache_size": "2"},
+        "services.ows": {"update_sequence": "1"}
+    }
+
+    class EOObject(object):
+        def __init__(self, pk):
+            self.pk = pk
+
+    def selection(self, *pks):
+        selection = LayerSelection(self.EOObject(100), "_outlines")
+        for pk in pks:
+            selection.append(self.EOObject(pk), "coverage-%d" % pk)
+        root = LayerSelection()
+        root.append(selection)
+        return root
+
+    def test_map_key(self):
+        key = _map_key(MapCache, self.selection(1, 2), {})
+
+        self.assertEqual(key, _map_key(MapCache, self.selection(1, 2), {}))
+        self.assertEqual(key[0], _map_cache.version)
+        self.assertEqual(key[1], "1")
+        self.assertEqual(key[3], (
+            ((100,), 1, "coverage-1", "_outlines"),
+            ((100,), 2, "coverage-2", "_outlines"),
+        ))
+
+        # the layers, the bands, the component and the update sequence are
+        # all part of the key
+        self.assertNotEqual(key, _map_key(MapCache, self.selection(2, 1), {}))
+        self.assertNotEqual(
+            key, _map_key(MapCache, self.selection(1, 2), {"bands": [1]})
+        )
+        self.assertNotEqual(key, _map_key(object, self.selection(1, 2), {}))
+
+        eoxs_config._cached_config = deepcopy(eoxs_config._cached_config)
+        eoxs_config._cached_config.set("services.ows", "update_sequence", "2")
+        self.assertNotEqual(
+            key, _map_key(MapCache, self.selection(1, 2), {})
+        )
+
+    def test_hits_and_eviction(self):
+        cache = MapCache()
+        self.assertTrue(cache.enabled)
+
+        keys = [(cache.version, i) for i in range(3)]
+        cache.put(keys[0], "a")
+        cache.put(keys[1], "b")
+        self.assertEqual(cache.get(keys[0]), "a")
+
+        # the least recently used template is evicted
+        cache.put(keys[2], "c")
+        self.assertEqual(cache.get(keys[1]), None)
+        self.assertEqual(cache.get(keys[0]), "a")
+        self.assertEqual(cache.get(keys[2]), "c")
+
+        # templates prepared before an invalidation are discarded
+        cache.invalidate()
+        self.assertEqual(cache.get(keys[0]), None)
+        cache.put(keys[0], "a")
+        self.assertEqual(cache.get(keys[0]), None)
+
+        eoxs_config._cached_config = deepcopy(eoxs_config._cached_config)
+        eoxs_config._cached_config.set(
+            "services.ows.wms", "map_cache_size", "0"
+        )
+        self.assertFalse(cache.enabled)
+        cache.put((cache.version, 0), "a")
+        self.assertEqual(cache.get((cache.version, 0)), None)
+
+    def test_invalidation(self):
+        def assertInvalidates(func):
+            version = _map_cache.version
+            result = func()
+            self.assertTrue(_map_cache.version > version)
+            return result
+
+        range_type = models.RangeType.objects.create(name="RGB")
+        coverage = assertInvalidates(
+            lambda: models.RectifiedDataset.objects.create(
+                identifier="rectified-1", range_type=range_type,
+                min_x=0, min_y=0, max_x=10, max_y=10, srid=4326,
+                size_x=100, size_y=100
+            )
+        )
+        data_item = assertInvalidates(
+            lambda: DataItem.objects.create(
+                dataset=coverage, location="rectified-1.tif",
+                semantic="bands[1:3]"
+            )
+        )
+        render_options = assertInvalidates(
+            lambda: WMSRenderOptions.objects.create(
+                coverage=coverage, default_red=1
+            )
+        )
+        assertInvalidates(render_options.delete)
+        assertInvalidates(data_item.delete)
+        assertInvalidates(coverage.delete)
+
+        # unrelated models do not reset the cache
+        version = _map_cache.version
+        range_type.delete()
+        self.assertEqual(_map_cache.version, version)
+
+
+class CapabilitiesCacheTestCase(ConfigMixIn, TestCase):
+    config = {
+        "services.ows.wms": {"capabilities_cache": "True"},
+        "services.ows": {"update_sequence": "1"}
+    }
+
+    class Renderer(object):
+        def __init__(self):
+            self.calls = 0
+
+        def render(self, collections, coverages, request_values):
+            self.calls += 1
+            return [
+                ResultBuffer("<Capabilities/>", "text/xml")
+            ], "text/xml"
+
+    def setUp(self):
+        super(CapabilitiesCacheTestCase, self).setUp()
+        _capabilities_cache.invalidate()
+
+        class Handler(WMSGetCapabilitiesHandlerBase):
+            renderer = self.Renderer()
+
+        self.handler = Handler()
+        self.renderer = Handler.renderer
+        self.factory = RequestFactory()
+
+    def get_capabilities(self, **params):
+        params.update(service="WMS", request="GetCapabilities")
+        response = self.handler.handle(self.factory.get("/ows", params))
+        self.assertEqual(response.content, "<Capabilities/>")
+
+    def test_hits(self):
+        self.get_capabilities()
+        self.get_capabilities()
+        self.assertEqual(self.renderer.calls, 1)
+
+        # the parameter names are case insensitive
+        self.handler.handle(self.factory.get("/ows", {
+            "SERVICE": "WMS", "REQUEST": "GetCapabilities"
+        }))
+        self.assertEqual(self.renderer.calls, 1)
+
+        # other parameters or update sequences result in new documents
+        self.get_capabilities(version="1.1.1")
+        self.assertEqual(self.renderer.calls, 2)
+
+        eoxs_config._cached_config = deepcopy(eoxs_config._cached_config)
+        eoxs_config._cached_config.set("services.ows", "update_sequence", "2")
+        self.get_capabilities()
+        self.assertEqual(self.renderer.calls, 3)
+
+    def test_disabled(self):
+        eoxs_config._cached_config = deepcopy(eoxs_config._cached_config)
+        eoxs_config._cached_config.set(
+            "services.ows.wms", "capabilities_cache", "False"
+        )
+        self.get_capabilities()
+        self.get_capabilities()
+        self.assertEqual(self.renderer.calls, 2)
+
+    def test_bounded(self):
+        cache = CapabilitiesCache(max_entries=2)
+        for i in range(3):
+            cache.put(i, "result-%d" % i, cache.version)
+        self.assertEqual(cache.get(0), None)
+        self.assertEqual(cache.get(2), "result-2")
+
+        # results rendered before an invalidation are discarded
+        version = cache.version
+        cache.invalidate()
+        cache.put(0, "result-0", version)
+        self.assertEqual(cache.get(0), None)
+
+    def test_invalidation(self):
+        def assertInvalidates(func):
+            self.get_capabilities()
+            calls = self.renderer.calls
+            result = func()
+            self.get_capabilities()
+            self.assertEqual(self.renderer.calls, calls + 1)
+            return result
+
+        range_type = models.RangeType.objects.create(name="RGB")
+        coverage = assertInvalidates(
+            lambda: models.RectifiedDataset.objects.create(
+                identifier="rectified-1", range_type=range_type,
+                min_x=0, min_y=0, max_x=10, max_y=10, srid=4326,
+                size_x=100, size_y=100
+            )
+        )
+        series = assertInvalidates(
+            lambda: models.DatasetSeries.objects.create(identifier="series-1")
+        )
+        assertInvalidates(lambda: series.insert(coverage))
+        assertInvalidates(lambda: series.remove(coverage))
+        assertInvalidates(series.delete)
+
+        # changes unrelated to the EO objects keep the cached document
+        calls = self.renderer.calls
+        DataItem.objects.create(
+            dataset=coverage, location="rectified-1.tif", semantic="bands[1]"
+        )
+        self.get_capabilities()
+        self.assertEqual(self.renderer.calls, calls)
+
+
+class IterPackageItemsTestCase(TestCase):
+    class Coverage(object):
+        def __init__(self, identifier):
+            self.identifier = identifier
+
+    class ResultItem(object):
+        def __init__(self, filename=None, content_type="text/xml"):
+            self.filename = filename
+            self.content_type = content_type
+            self.data_file = StringIO("data")
+            self.size = 4
+            self.deleted = False
+
+        def delete(self):
+            self.deleted = True
+
+    def setUp(self):
+        self.result_items = []
+
+    def render(self, coverage):
+        result_set = [
+            self.ResultItem("image.tif", "image/tiff"),
+            self.ResultItem("image.tif", "image/tiff"),
+            self.ResultItem(),
+        ]
+        self.result_items.extend(result_set)
+        return coverage, result_set
+
+    def test_iter_package_items(self):
+        coverages = [self.Coverage("coverage-1"), self.Coverage("coverage-2")]
+        items = list(iter_package_items(
+            self.render(coverage) for coverage in coverages
+        ))
+
+        ext = mimetypes.guess_extension("text/xml")
+        self.assertEqual([location for _, _, location in items], [
+            "coverage-1/image.tif", "coverage-1/coverage-1" + ext,
+            "coverage-2/image.tif", "coverage-2/coverage-2" + ext,
+        ])
+        self.assertTrue(all(item.deleted for item in self.result_items))
+
+    def test_abandoned(self):
+        coverages = [self.Coverage("coverage-%d" % i) for i in range(20)]
+        rendered = parallel_imap(
+            self.render, coverages, workers=2, discard=_delete_rendered
+        )
+        items = iter_package_items(rendered)
+        next(items)
+        items.close()
+
+        # the consumed as well as the rendered but unconsumed results are
+        # released, the remaining coverages are not rendered at all
+        self.assertTrue(len(self.result_items) < 20 * 3)
+        self.assertTrue(all(item.deleted for item in self.result_items))
+
+
+class RectifiedDatasetDescriptionTestCase(TestCase):
+    class Map(object):
+        """ Mimics a map after a GetCoverage request was dispatched: MapServer
+            rewrites the size and the extent, which refers to the centers of
+            the corner pixels.
+        """
+        class Extent(object):
+            def __init__(self, minx, miny, maxx, maxy):
+                self.minx, self.miny, self.maxx, self.maxy = (
+                    minx, miny, maxx, maxy
+                )
+
+        def __init__(self, width, height, extent):
+            self.width, self.height = width, height
+            self.extent = self.Extent(*extent)
+
+    def setUp(self):
+        self.renderer = RectifiedCoverageMapServerRenderer(env)
+        self.coverage = models.RectifiedDataset(
+            identifier="rectified-1",
+            footprint=MultiPolygon(Polygon.from_bbox((0, 0, 100, 50))),
+            begin_time=parse_datetime("2014-01-01T00:00:00Z"),
+            end_time=parse_datetime("2014-01-01T12:00:00Z"),
+            min_x=0, min_y=0, max_x=100, max_y=50, srid=4326,
+            size_x=100, size_y=50,
+            range_type=models.RangeType.objects.create(name="RGB")
+        )
+        self.coverage.full_clean()
+        self.coverage.save()
+
+    def encode_domain_set(self, map_, subset_polygon=None):
+        size, extent = self.renderer.get_output_grid(map_)
+        encoder = WCS20EOXMLEncoder()
+        description = encoder.encode_rectified_dataset(
+            self.coverage, [], "cid:coverage/rectified-1.tif", "image/tiff",
+            (4326, size, extent, subset_polygon)
+        )
+        nsmap = {"gml": "http://www.opengis.net/gml/3.2"}
+        grid = description.xpath("gml:domainSet/gml:RectifiedGrid",
+            namespaces=nsmap
+        )[0]
+        return (
+            grid.xpath("gml:limits/gml:GridEnvelope/gml:high/text()",
+                namespaces=nsmap
+            )[0],
+            grid.xpath("gml:origin/gml:Point/gml:pos/text()",
+                namespaces=nsmap
+            )[0],
+            grid.xpath("gml:offsetVector/text()", namespaces=nsmap)
+        )
+
+    def test_output_grid(self):
+        cases = (
+            (self.Map(100, 50, (0.5, 0.5, 99.5, 49.5)),
+             ((100, 50), (0, 0, 100, 50))),
+            (self.Map(10, 20, (10.5, 20.5, 19.5, 39.5)),
+             ((10, 20), (10, 20, 20, 40))),
+            # a scaled output of the same subset
+            (self.Map(5, 10, (11, 21, 19, 39)),
+             ((5, 10), (10, 20, 20, 40))),
+        )
+        for map_, expected in cases:
+            self.assertEqual(self.renderer.get_output_grid(map_), expected)
+
+    def test_domain_set(self):
+        # the whole coverage matches its native grid; EPSG:4326 is encoded
+        # in latitude/longitude order
+        self.assertEqual(
+            self.encode_domain_set(self.Map(100, 50, (0.5, 0.5, 99.5, 49.5))),
+            ("99 49", "50.00000000 0.00000000", [
+                "0.00000000 1.00000000", "-1.00000000 0.00000000"
+            ])
+        )
+
+        # the subset x=10,20 y=20,40
+        subset_polygon = Polygon.from_bbox((10, 20, 20, 40))
+        subset_polygon.srid = 4326
+        self.assertEqual(
+            self.encode_domain_set(
+                self.Map(10, 20, (10.5, 20.5, 19.5, 39.5)), subset_polygon
+            ),
+            ("9 19", "40.00000000 10.00000000", [
+                "0.00000000 1.00000000", "-1.00000000 0.00000000"
+            ])
+        )
+
+        # the same subset scaled to half of the size
+        self.assertEqual(
+            self.encode_domain_set(
+                self.Map(5, 10, (11, 21, 19, 39)), subset_polygon
+            ),
+            ("4 9", "40.00000000 10.00000000", [
+                "0.00000000 2.00000000", "-2.00000000 0.00000000"
+            ])
+        )
+
+
+class SimpleConnectorTestCase(TestCase):
+    def setUp(self):
+        self.connector = SimpleConnector(env)
+        self.layer = mapserver.Layer("ref")
+
+    def test_rectified_item(self):
+        coverage = models.ReferenceableDataset(identifier="ref")
+        data_items = [
+            DataItem(location="/data/ref.tif", semantic="bands[1:3]"),
+            DataItem(
+                location="/data/ref.tif.eoxs_rectified_native.vrt",
+                semantic="rectified"
+            ),
+            DataItem(location="/data/ref.xml", semantic="metadata"),
+        ]
+        self.assertTrue(self.connector.supports(data_items))
+
+        with CacheContext():
+            self.connector.connect(coverage, data_items, self.layer)
+
+        # the VRT rectified at registration is used instead of a temporary one
+        self.assertEqual(
+            self.layer.data, "/data/ref.tif.eoxs_rectified_native.vrt"
+        )
+        self.assertEqual(self.layer.metadata.get("eoxs_ref_data"), None)
+
+        self.connector.disconnect(coverage, data_items, self.layer)
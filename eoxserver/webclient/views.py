@@ -36,7 +36,6 @@ from django.conf import settings
 from django.template import RequestContext
 
 from eoxserver import get_version
-from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.decoders import config, enum
 from eoxserver.core.util.timetools import isoformat
 from eoxserver.resources.coverages import models
@@ -83,7 +82,7 @@ def webclient(request, identifier):
     # zoom to Europe if we don't have a proper extent
     if extent == (0,0,1,1):
         extent = (-10,30,34,72)
-    reader = WebclientConfigReader(get_eoxserver_config())
+    reader = WebclientConfigReader.from_config()
 
     return render_to_response(
         'webclient/webclient.html', {
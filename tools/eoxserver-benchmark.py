@@ -0,0 +1,463 @@
+#!/usr/bin/python
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+
+""" Micro-benchmarks of performance critical code paths. Each benchmark
+    compares the current implementation with a reference of the previous
+    approach and prints the mean time per call.
+
+    Examples:
+
+    # run all benchmarks
+    eoxserver-benchmark.py
+
+    # run the CRS benchmarks only with more repetitions
+    eoxserver-benchmark.py --number 10000 crss
+
+    # compare the spatial index with a full scan of one million objects
+    eoxserver-benchmark.py --size 1000000 spatialindex
+
+    The spatial index benchmarks require the settings of an EOxServer
+    instance, the "spatialindex-db" benchmark uses the EO objects registered
+    in its database, e.g.:
+
+    DJANGO_SETTINGS_MODULE=instance.settings \\
+        eoxserver-benchmark.py spatialindex spatialindex-db
+
+    The "getcoverage" benchmark renders a registered rectified coverage with
+    the MapServer and the GDAL based renderer. As each call renders a whole
+    image, fewer calls should be used:
+
+    DJANGO_SETTINGS_MODULE=instance.settings \\
+        eoxserver-benchmark.py --number 10 --coverage MER_FRS_1P getcoverage
+
+    The "preprocess" benchmark pre-processes a synthetic product set one file
+    after the other versus with a pool of processes, and a single product
+    with one versus multiple threads:
+
+    eoxserver-benchmark.py --number 1 --products 16 preprocess
+"""
+
+import sys
+import argparse
+import timeit
+import atexit
+import shutil
+import tempfile
+from os.path import join
+from multiprocessing import cpu_count
+
+
+def setup_django():
+    """ Sets up Django for benchmarks requiring an EOxServer instance.
+    """
+    import django
+    if hasattr(django, "setup"):
+        django.setup()
+
+
+def benchmark_crss(options):
+    """ Parsing of CRS identifiers and lookup of spatial references as done
+        for each WMS/WCS request.
+    """
+    from eoxserver.contrib import osr
+    from eoxserver.resources.coverages import crss
+
+    parsers = (crss.fromShortCode, crss.fromURN, crss.fromURL)
+    identifiers = ("EPSG:4326", "EPSG:3857", "EPSG:32633")
+
+    def parse_uncached():
+        for identifier in identifiers:
+            # former behaviour of validateEPSGCode
+            epsg = crss._gerexShortCode.match(identifier).group(1)
+            osr.SpatialReference().ImportFromEPSG(int(epsg))
+
+    def parse_cached():
+        for identifier in identifiers:
+            crss.parseEPSGCode(identifier, parsers)
+
+    def layer_projection_uncached():
+        # former behaviour of Extent.spatial_reference, accessed twice per
+        # layer
+        for _ in range(2):
+            sr = osr.SpatialReference()
+            sr.ImportFromEPSG(32633)
+        sr.srid, sr.proj
+
+    def layer_projection_cached():
+        sr = crss.get_spatial_reference(32633)
+        sr.srid, crss.get_proj4(sr.srid)
+
+    def transformation_uncached():
+        src = osr.SpatialReference(32633)
+        dst = osr.SpatialReference(4326)
+        osr.CoordinateTransformation(src.sr, dst.sr).TransformPoint(
+            500000.0, 5000000.0
+        )
+
+    def transformation_cached():
+        crss.get_transformation(32633, 4326).TransformPoint(
+            500000.0, 5000000.0
+        )
+
+    return [
+        ("parse CRS identifiers", parse_uncached, parse_cached),
+        ("layer projection", layer_projection_uncached,
+         layer_projection_cached),
+        ("coordinate transformation", transformation_uncached,
+         transformation_cached),
+    ]
+
+
+def _random_queries(numpy, random, count=16):
+    """ Creates spatio-temporal queries for small areas and time spans.
+    """
+    queries = []
+    for _ in range(count):
+        x = random.uniform(-180, 179)
+        y = random.uniform(-90, 89)
+        begin = random.uniform(0, 365 * 86400)
+        queries.append({
+            "intersects": [(x, y, x + 1, y + 1)],
+            "begin_max": begin + 7 * 86400,
+            "end_min": begin,
+        })
+    return queries
+
+
+def benchmark_spatialindex(options):
+    """ Selection of objects by bounding box and time from the in-process
+        index versus a (vectorised) scan over all objects, which is a lower
+        bound for a database without a spatial index.
+    """
+    setup_django()
+    import numpy
+    from eoxserver.resources.coverages.spatialindex import STRTree
+
+    size = options.size
+    random = numpy.random.RandomState(0)
+
+    # footprints of up to 2 degrees at random locations and times
+    x = random.uniform(-180, 178, size)
+    y = random.uniform(-90, 88, size)
+    extents = numpy.column_stack([
+        x, y, x + random.uniform(0, 2, size), y + random.uniform(0, 2, size)
+    ])
+    begin_times = random.uniform(0, 365 * 86400, size)
+    end_times = begin_times + random.uniform(0, 3600, size)
+
+    start = timeit.default_timer()
+    tree = STRTree(numpy.arange(size), extents, begin_times, end_times)
+    print "  built the index of %d objects in %.2f s" % (
+        size, timeit.default_timer() - start
+    )
+
+    queries = _random_queries(numpy, random)
+    state = {"i": 0}
+
+    def next_query():
+        state["i"] += 1
+        return queries[state["i"] % len(queries)]
+
+    def scan():
+        query = next_query()
+        min_x, min_y, max_x, max_y = query["intersects"][0]
+        mask = (
+            (extents[:, 0] <= max_x) & (extents[:, 2] >= min_x) &
+            (extents[:, 1] <= max_y) & (extents[:, 3] >= min_y) &
+            (begin_times <= query["begin_max"]) &
+            (end_times >= query["end_min"])
+        )
+        return numpy.nonzero(mask)[0]
+
+    def indexed():
+        return tree.query(**next_query())
+
+    return [
+        ("select %d objects" % size, scan, indexed),
+    ]
+
+
+def benchmark_spatialindex_db(options):
+    """ Database only versus index assisted selection of the EO objects of
+        the configured instance.
+    """
+    setup_django()
+    import numpy
+    from django.contrib.gis.geos import Polygon
+    from eoxserver.resources.coverages.models import EOObject
+    from eoxserver.resources.coverages.spatialindex import SpatialIndex
+
+    index = SpatialIndex()
+    index.refresh(force=True)
+    print "  indexed %d objects" % len(index)
+
+    random = numpy.random.RandomState(0)
+    queries = _random_queries(numpy, random)
+    state = {"i": 0}
+
+    def next_query():
+        state["i"] += 1
+        return queries[state["i"] % len(queries)]
+
+    def database_filter(qs, query):
+        return qs.filter(
+            footprint__intersects=Polygon.from_bbox(query["intersects"][0]),
+        )
+
+    def database_only():
+        query = next_query()
+        return list(database_filter(
+            EOObject.objects.all(), query
+        ).values_list("pk", flat=True))
+
+    def index_assisted():
+        query = next_query()
+        pks = index.query(intersects=query["intersects"])
+        return list(database_filter(
+            EOObject.objects.filter(pk__in=pks), query
+        ).values_list("pk", flat=True))
+
+    return [
+        ("select by bounding box", database_only, index_assisted),
+    ]
+
+
+def benchmark_getcoverage(options):
+    """ WCS 2.0 GetCoverage requests of a rectified coverage rendered by
+        dispatching them to MapServer versus processing them with GDAL.
+    """
+    setup_django()
+    from eoxserver.core import env, initialize
+    from eoxserver.resources.coverages import models
+    from eoxserver.services.subset import Subsets, Trim
+    from eoxserver.services.ows.wcs.v20.parameters import (
+        WCS20CoverageRenderParams
+    )
+    from eoxserver.services.mapserver.wcs.coverage_renderer import (
+        RectifiedCoverageMapServerRenderer
+    )
+    from eoxserver.services.gdal.wcs.rectified_dataset_renderer import (
+        GDALRectifiedDatasetRenderer
+    )
+
+    initialize()
+
+    if options.coverage:
+        coverage = models.RectifiedDataset.objects.get(
+            identifier=options.coverage
+        )
+    else:
+        coverage = models.RectifiedDataset.objects.all()[0]
+
+    print "  using coverage '%s' (%d x %d pixels)" % (
+        (coverage.identifier,) + coverage.size
+    )
+
+    # the central quarter of the coverage
+    minx, miny, maxx, maxy = coverage.extent
+    dx, dy = (maxx - minx) / 4, (maxy - miny) / 4
+    subsets = Subsets([
+        Trim("x", minx + dx, maxx - dx), Trim("y", miny + dy, maxy - dy)
+    ], crs="http://www.opengis.net/def/crs/EPSG/0/%d" % coverage.srid)
+
+    requests = [
+        ("full coverage", WCS20CoverageRenderParams(
+            coverage, Subsets([]), format="image/tiff"
+        )),
+        ("subset", WCS20CoverageRenderParams(
+            coverage, subsets, format="image/tiff"
+        )),
+        ("subset in EPSG:4326", WCS20CoverageRenderParams(
+            coverage, subsets, format="image/tiff", 
+            outputcrs="http://www.opengis.net/def/crs/EPSG/0/4326"
+        )),
+    ]
+
+    def render(renderer, params):
+        def func():
+            for item in renderer.render(params):
+                for chunk in item.chunked(65536):
+                    pass
+                item.delete()
+        return func
+
+    mapserver = RectifiedCoverageMapServerRenderer(env)
+    gdal = GDALRectifiedDatasetRenderer(env)
+
+    return [
+        (label, render(mapserver, params), render(gdal, params))
+        for label, params in requests
+    ]
+
+
+def _create_products(directory, count, size):
+    """ Creates a set of synthetic RGB products with a no-data border and 
+        returns their filenames.
+    """
+    import numpy
+    from eoxserver.contrib import gdal, osr
+
+    random = numpy.random.RandomState(0)
+    sr = osr.SpatialReference()
+    sr.ImportFromEPSG(4326)
+
+    # a rotated square of valid data, as typical for satellite scenes
+    y, x = numpy.mgrid[0:size, 0:size]
+    valid = (abs(x - size / 2) + abs(y - size / 2)) < size / 2
+
+    filenames = []
+    for i in range(count):
+        filename = join(directory, "product_%d.tif" % i)
+        ds = gdal.GetDriverByName("GTiff").Create(
+            filename, size, size, 3, gdal.GDT_UInt16, ["TILED=YES"]
+        )
+        ds.SetProjection(sr.ExportToWkt())
+        ds.SetGeoTransform([i, 1.0 / size, 0, 10, 0, -1.0 / size])
+        for index in range(1, 4):
+            data = random.randint(1, 4096, (size, size)).astype(numpy.uint16)
+            data[~valid] = 0
+            ds.GetRasterBand(index).WriteArray(data)
+        ds = None
+        filenames.append(filename)
+
+    return filenames
+
+
+def benchmark_preprocess(options):
+    """ Pre-processing of a synthetic product set sequentially versus in a
+        pool of processes, and of a single product tile-wise with one versus
+        multiple threads.
+    """
+    from eoxserver.processing.preprocessing import (
+        WMSPreProcessor, process_batch
+    )
+    from eoxserver.processing.preprocessing.format import get_format_selection
+
+    processes = options.processes or cpu_count()
+    directory = tempfile.mkdtemp(prefix="eoxs_benchmark")
+    atexit.register(shutil.rmtree, directory, True)
+
+    inputs = _create_products(directory, options.products, options.image_size)
+    filenames = [
+        (filename, filename[:-4] + "_proc.tif") for filename in inputs
+    ]
+    print "  using %d products of %d x %d pixels and %d processes" % (
+        len(inputs), options.image_size, options.image_size, processes
+    )
+
+    format_selection = get_format_selection("GTiff")
+    preprocessor = WMSPreProcessor(format_selection)
+
+    def batch(processes):
+        def func():
+            for _, _, error in process_batch(preprocessor, filenames,
+                                             processes=processes):
+                if error:
+                    raise Exception(error)
+        return func
+
+    def tiled(workers):
+        tiled_preprocessor = WMSPreProcessor(
+            format_selection, overviews=False, 
+            tile_size=WMSPreProcessor.DEFAULT_TILE_SIZE, workers=workers
+        )
+        def func():
+            tiled_preprocessor.process(
+                inputs[0], filenames[0][1], generate_metadata=False
+            )
+        return func
+
+    return [
+        ("batch of %d products" % len(inputs), batch(1), batch(processes)),
+        ("single product tiles", tiled(1), tiled(processes)),
+    ]
+
+
+BENCHMARKS = {
+    "crss": benchmark_crss,
+    "getcoverage": benchmark_getcoverage,
+    "preprocess": benchmark_preprocess,
+    "spatialindex": benchmark_spatialindex,
+    "spatialindex-db": benchmark_spatialindex_db,
+}
+
+
+def measure(func, number, repeat):
+    """ Returns the best mean time per call in microseconds.
+    """
+    return min(timeit.repeat(func, number=number, repeat=repeat)) \
+        / number * 1e6
+
+
+def main(args):
+    parser = argparse.ArgumentParser(add_help=True, description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--number", type=int, default=1000,
+                        help="Number of calls per measurement.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of measurements, the best one is used.")
+    parser.add_argument("--size", type=int, default=100000,
+                        help="Number of objects for synthetic data sets.")
+    parser.add_argument("--coverage", default=None,
+                        help="Identifier of the coverage to render.")
+    parser.add_argument("--products", type=int, default=8,
+                        help="Number of products of synthetic product sets.")
+    parser.add_argument("--image-size", dest="image_size", type=int, 
+                        default=2048,
+                        help="Width and height of synthetic products.")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Number of processes or threads for parallel "
+                             "processing. Defaults to the number of CPUs.")
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark",
+                        help="The benchmarks to run. Available: %s"
+                             % ", ".join(sorted(BENCHMARKS)))
+
+    parsed = parser.parse_args(args)
+
+    for name in parsed.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error("Unknown benchmark '%s'." % name)
+
+    for name in parsed.benchmarks or sorted(BENCHMARKS):
+        print "%s:" % name
+        for label, before, after in BENCHMARKS[name](parsed):
+            # warm up caches
+            after()
+
+            time_before = measure(before, parsed.number, parsed.repeat)
+            time_after = measure(after, parsed.number, parsed.repeat)
+            print "  %-30s %10.2f us -> %10.2f us (%.1fx)" % (
+                label, time_before, time_after,
+                time_before / time_after if time_after else float("inf")
+            )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -39,7 +39,8 @@ from eoxserver.core.util.timetools import getDateTime
 from eoxserver.core.util.xmltools import DOMElementToXML
 from eoxserver.processing.preprocessing.util import  check_file_existence
 from eoxserver.processing.preprocessing import (
-    WMSPreProcessor, RGBA, ORIG_BANDS, NativeMetadataFormatEncoder
+    WMSPreProcessor, RGBA, ORIG_BANDS, NativeMetadataFormatEncoder, 
+    process_batch
 )
 from eoxserver.processing.preprocessing.format import (
     get_format_selection, GeoTIFFFormatSelection
@@ -99,6 +100,16 @@ def main(args):
                             
     # reading arguments from a file (1 line per argument), with overrides
     eoxserver-preprocess.py @args.txt --crs=3035 --no-tiling input.tif
+    
+    # processing a large image tile-wise with bounded memory usage
+    eoxserver-preprocess.py --tile-size 2048 --no-metadata input.tif
+    
+    # processing a large image tile-wise using 4 threads
+    eoxserver-preprocess.py --threads 4 --no-metadata input.tif
+    
+    # processing all files listed in batch.txt (one input file and optional
+    # output basename per line) with 8 concurrent processes
+    eoxserver-preprocess.py --batch batch.txt --processes 8 --no-metadata
     """)
     
     #===========================================================================
@@ -226,6 +237,33 @@ def main(args):
                         help="Additional GDAL dataset creation options. "
                              "See http://www.gdal.org/frmt_gtiff.html")
     
+    parser.add_argument("--footprint-accuracy", dest="footprint_accuracy",
+                        type=float,
+                        help="The accuracy of the generated footprint in "
+                             "pixels. Defaults to 2 pixels.")
+    
+    parser.add_argument("--tile-size", dest="tile_size", type=int,
+                        help="Process the image tile-wise in tiles of the "
+                             "given size in pixels, using temporary files "
+                             "instead of holding the image in memory. "
+                             "Recommended for large images.")
+    parser.add_argument("--scratch-dir", dest="scratch_dir",
+                        help="The directory for temporary files when "
+                             "processing tile-wise. Defaults to the system's "
+                             "temporary directory.")
+    
+    parser.add_argument("--threads", dest="workers", type=int,
+                        help="The number of threads to process the tiles of "
+                             "an image with. Implies tile-wise processing.")
+    
+    parser.add_argument("--batch", dest="batch_filename",
+                        help="Process all files listed in the given file "
+                             "concurrently. Each line contains an input file "
+                             "and optionally the output basename.")
+    parser.add_argument("--processes", dest="processes", type=int,
+                        help="The number of concurrent processes for --batch. "
+                             "Defaults to the number of CPUs.")
+    
     parser.add_argument("--traceback", action="store_true", default=False)
     
     parser.add_argument("--force", "-f", dest="force", action="store_true",
@@ -236,7 +274,7 @@ def main(args):
                         default=1,
                         help="Set the verbosity (0, 1, 2). Default is 1.")
     
-    parser.add_argument("input_filename", metavar="infile", nargs=1,
+    parser.add_argument("input_filename", metavar="infile", nargs="?",
                         help="The input raster file to be processed.")
     parser.add_argument("output_basename", metavar="outfiles_basename",
                         nargs="?", 
@@ -259,9 +297,6 @@ def main(args):
         parser.error("Enter the full metadata with --begin-time, --end-time "
                      "and --coverage-id.")
     
-    # hack to flatten the list
-    values["input_filename"] = values["input_filename"][0]
-    
     georef_crs = values.pop("georef_crs", None)
     
     if "extent" in values:
@@ -273,6 +308,23 @@ def main(args):
     if "palette_file" in values and not "color_index" in values:
         parser.error("--pct can only be used with --indexed")
     
+    if "scratch_dir" in values and not "tile_size" in values:
+        parser.error("--scratch-dir can only be used with --tile-size")
+    
+    batch_filename = values.pop("batch_filename", None)
+    processes = values.pop("processes", None)
+    
+    if batch_filename:
+        if "input_filename" in values or "output_basename" in values:
+            parser.error("--batch is mutually exclusive with <infile> and "
+                         "<outfiles_basename>.")
+        if "generate_metadata" not in values:
+            parser.error("--batch requires --no-metadata.")
+    elif "input_filename" not in values:
+        parser.error("Either <infile> or --batch is required.")
+    elif processes:
+        parser.error("--processes can only be used with --batch.")
+    
     # Extract format and execution specific values
     format_values = _extract(values, ("tiling", "compression", "jpeg_quality", 
                                       "zlevel", "creation_options"))
@@ -301,15 +353,31 @@ def main(args):
         format_selection = get_format_selection("GTiff", **format_values)
 
 
-        # TODO: make 'tif' dependant on format selection
-        # check files exist
-        if not output_basename:
-            output_filename = splitext(input_filename)[0] + "_proc" + format_selection.extension
-            output_md_filename = splitext(input_filename)[0] + "_proc.xml"
+        if batch_filename:
+            preprocessor = WMSPreProcessor(format_selection, **values)
+            filenames = _read_batch_file(batch_filename, format_selection, 
+                                         force)
+            
+            failed = 0
+            for input_filename, result, error in process_batch(
+                    preprocessor, filenames, exec_values.get("geo_reference"),
+                    False, processes):
+                if error:
+                    failed += 1
+                    sys.stderr.write("%s: %s\n" % (input_filename, error))
+                else:
+                    logging.info("Processed '%s'." % input_filename)
+            
+            if failed:
+                sys.stderr.write("Pre-processing of %d of %d files failed.\n" 
+                                 % (failed, len(filenames)))
+                return 1
+            return
         
-        else:
-            output_filename = output_basename + format_selection.extension
-            output_md_filename = output_basename + ".xml"
+        # check files exist
+        output_filename, output_md_filename = _get_output_filenames(
+            input_filename, output_basename, format_selection
+        )
 
         if not force:
             check_file_existence(output_filename)
@@ -338,6 +406,43 @@ def main(args):
         if other_values["traceback"]:
             traceback.print_exc()
         sys.stderr.write("%s: %s\n" % (type(e).__name__, str(e)))
+        return 1
+
+
+def _get_output_filenames(input_filename, output_basename, format_selection):
+    """ Returns the filenames of the processed image and the metadata file.
+    """
+    
+    # TODO: make 'tif' dependant on format selection
+    if not output_basename:
+        output_basename = splitext(input_filename)[0] + "_proc"
+    
+    return (output_basename + format_selection.extension, 
+            output_basename + ".xml")
+
+
+def _read_batch_file(batch_filename, format_selection, force):
+    """ Reads the input files and optional output basenames from a batch file
+        and returns a list of input and output filename tuples.
+    """
+    
+    filenames = []
+    with open(batch_filename) as f:
+        for line in f:
+            parts = line.split()
+            if not parts or parts[0].startswith("#"):
+                continue
+            
+            output_filename, _ = _get_output_filenames(
+                parts[0], parts[1] if len(parts) > 1 else None, 
+                format_selection
+            )
+            if not force:
+                check_file_existence(output_filename)
+            
+            filenames.append((parts[0], output_filename))
+    
+    return filenames
 
 
 def _parse_datetime(input_str):
@@ -461,4 +566,4 @@ def _extract(dct, keys):
 
 
 if __name__ == "__main__":
-    main(sys.argv[1:])
+    sys.exit(main(sys.argv[1:]))